@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+
+class AttendanceMatrix:
+	"""
+	Compact participant x week attendance history.
+
+	Every cell is a bitmask of the event types attended that week: bit i is set when the participant
+	attended at least one event of type event_types[i]. The bitmasks are stored in a dense uint16 array,
+	or uint32 when there are more than 16 event types.
+	"""
+	PARTICIPANT = 'Participant'
+
+	def __init__(self, codes: np.ndarray, participants, weeks, event_types) -> None:
+		"""
+		:param codes: (participants x weeks) array of event type bitmasks
+		:param participants: names of the participants, one per row
+		:param weeks: labels of the weeks, one per column
+		:param event_types: event type of each bit
+		"""
+		self.event_types = list(event_types)
+		self.codes = np.asarray(codes, dtype=self.get_dtype(len(self.event_types)))
+		self.participants = pd.Index(participants, name=self.PARTICIPANT)
+		self.weeks = pd.Index(weeks)
+
+	@staticmethod
+	def get_dtype(num_event_types: int):
+		if num_event_types <= 16:
+			return np.uint16
+		if num_event_types <= 32:
+			return np.uint32
+		raise ValueError(f'too many event types ({num_event_types}) for an attendance bitmask, at most 32 supported')
+
+	@property
+	def shape(self):
+		return self.codes.shape
+
+	@classmethod
+	def empty(cls, event_types, participants=(), weeks=()):
+		codes = np.zeros((len(participants), len(weeks)), dtype=cls.get_dtype(len(event_types)))
+		return cls(codes, participants, weeks, event_types)
+
+	@classmethod
+	def from_long(cls, participants, weeks, event_types, all_event_types=None, all_participants=None, all_weeks=None):
+		"""
+		Build the matrix from a long table with one row per attended event.
+
+		:param participants: participant name of each row
+		:param weeks: week label of each row
+		:param event_types: event type of each row
+		:param all_event_types: event type of each bit, default: sorted unique event_types
+		:param all_participants: row labels of the matrix, default: unique participants in order of appearance
+		:param all_weeks: column labels of the matrix, default: unique weeks in order of appearance
+		"""
+		participants = np.asarray(participants, dtype=object)
+		weeks = np.asarray(weeks, dtype=object)
+		if all_event_types is None:
+			all_event_types = sorted(pd.unique(np.asarray(event_types, dtype=object)))
+		if all_participants is None:
+			all_participants = pd.unique(participants)
+		if all_weeks is None:
+			all_weeks = pd.unique(weeks)
+
+		matrix = cls.empty(all_event_types, all_participants, all_weeks)
+		type_codes = pd.Categorical(event_types, categories=matrix.event_types).codes
+		if (type_codes < 0).any():
+			raise ValueError(f'unknown event types: {set(np.asarray(event_types)[type_codes < 0])}')
+
+		rows = matrix.participants.get_indexer(participants)
+		cols = matrix.weeks.get_indexer(weeks)
+		keep = (rows >= 0) & (cols >= 0)
+		bits = np.left_shift(1, type_codes[keep].astype(np.int64)).astype(matrix.codes.dtype)
+		np.bitwise_or.at(matrix.codes, (rows[keep], cols[keep]), bits)
+		return matrix
+
+	@classmethod
+	def from_frame(cls, attendance_df: pd.DataFrame, all_event_types=None):
+		"""
+		Build the matrix from the DataFrame representation, where cells are lists of event types (or NaN).
+		"""
+		num_weeks = attendance_df.shape[1]
+		long_df = pd.DataFrame({
+			'participant': np.repeat(attendance_df.index.to_numpy(), num_weeks),
+			'week': np.tile(attendance_df.columns.to_numpy(), attendance_df.shape[0]),
+			'event_type': attendance_df.to_numpy(dtype=object).ravel(),
+		})
+		long_df = long_df.explode('event_type').dropna(subset=['event_type'])
+		return cls.from_long(
+			long_df['participant'], long_df['week'], long_df['event_type'],
+			all_event_types=all_event_types,
+			all_participants=attendance_df.index,
+			all_weeks=attendance_df.columns)
+
+	def to_frame(self) -> pd.DataFrame:
+		"""
+		Adapter to the DataFrame representation: participants as rows, weeks as columns,
+		cells are lists of the attended event types (each type listed once) or NaN.
+		Cells with the same bitmask share the same list object.
+		"""
+		cells = self.decode(self.codes.ravel(), missing=np.nan).reshape(self.shape)
+		return pd.DataFrame(cells, index=self.participants, columns=self.weeks)
+
+	def decode(self, masks, missing=None) -> np.ndarray:
+		"""
+		Decode bitmasks into lists of event types.
+
+		:param masks: array of bitmasks
+		:param missing: value used for an empty bitmask
+		:return: object array with the same shape as masks
+		"""
+		masks = np.asarray(masks)
+		unique_masks, inverse = np.unique(masks, return_inverse=True)
+		decoded = np.empty(len(unique_masks), dtype=object)
+		for i, mask in enumerate(unique_masks):
+			decoded[i] = [
+				event_type for bit, event_type in enumerate(self.event_types) if mask & (1 << bit)
+			] if mask else missing
+		return decoded[inverse.reshape(masks.shape)]
+
+	def get_bit(self, event_type) -> int:
+		"""
+		:return: bitmask of event_type, 0 if the event type is unknown
+		"""
+		if event_type not in self.event_types:
+			return 0
+		return 1 << self.event_types.index(event_type)
+
+	def attended(self) -> np.ndarray:
+		"""
+		:return: (participants x weeks) uint8 matrix, 1 if the participant attended any event that week
+		"""
+		return (self.codes != 0).view(np.uint8)
+
+	def union(self, num_weeks=None) -> np.ndarray:
+		"""
+		:param num_weeks: only combine the first num_weeks columns, None means every week
+		:return: bitmask of the event types each participant attended over the weeks
+		"""
+		return np.bitwise_or.reduce(self.codes[:, :num_weeks], axis=1)
+
+	def select(self, participants=None, weeks=None):
+		"""
+		Select rows and columns by label. Unknown participants and weeks are returned as empty attendance.
+		"""
+		participants = self.participants if participants is None else pd.Index(participants).unique()
+		weeks = self.weeks if weeks is None else pd.Index(weeks)
+		rows = self.participants.get_indexer(participants)
+		cols = self.weeks.get_indexer(weeks)
+
+		matrix = self.empty(self.event_types, participants, weeks)
+		valid_rows = np.flatnonzero(rows >= 0)
+		valid_cols = np.flatnonzero(cols >= 0)
+		matrix.codes[np.ix_(valid_rows, valid_cols)] = self.codes[np.ix_(rows[valid_rows], cols[valid_cols])]
+		return matrix
+
+	def add_weeks(self, other):
+		"""
+		Combine with the columns of another matrix sharing the same event types,
+		keeping the weeks sorted with the most recent first.
+		"""
+		if other.event_types != self.event_types:
+			raise ValueError('cannot combine attendance matrices with different event types')
+		participants = self.participants.append(other.participants.difference(self.participants, sort=False))
+		weeks = self.weeks.append(other.weeks)
+		codes = np.concatenate([
+			self.select(participants=participants).codes,
+			other.select(participants=participants).codes
+		], axis=1)
+		week_order = np.argsort(weeks.to_numpy(dtype=object))[::-1]
+		return AttendanceMatrix(codes[:, week_order], participants, weeks[week_order], self.event_types)
+
+	def push_week(self, week, participants, event_types, num_weeks=None):
+		"""
+		Add the attendance of a new most recent week and drop the oldest weeks, without rebuilding
+		the rest of the matrix. Participants attending for the first time are added as rows.
+
+		:param week: label of the new week
+		:param participants: participant of each attended event of the new week
+		:param event_types: event type of each attended event of the new week
+		:param num_weeks: number of weeks kept (at least 1), default: the current number of weeks
+		"""
+		if num_weeks is None:
+			num_weeks = self.shape[1]
+		participants = np.asarray(participants, dtype=object)
+		type_codes = pd.Categorical(event_types, categories=self.event_types).codes
+		if (type_codes < 0).any():
+			raise ValueError(f'unknown event types: {set(np.asarray(event_types)[type_codes < 0])}')
+
+		all_participants = self.participants.append(
+			pd.Index(pd.unique(participants)).difference(self.participants, sort=False))
+		codes = np.zeros((len(all_participants), num_weeks), dtype=self.codes.dtype)
+		codes[:self.shape[0], 1:] = self.codes[:, :num_weeks - 1]
+		bits = np.left_shift(1, type_codes.astype(np.int64)).astype(self.codes.dtype)
+		np.bitwise_or.at(codes[:, 0], all_participants.get_indexer(participants), bits)
+		weeks = pd.Index([week]).append(self.weeks[:num_weeks - 1])
+		return AttendanceMatrix(codes, all_participants, weeks, self.event_types)
@@ -0,0 +1,201 @@
+"""
+Run the clinic lotteries of several configurations and lottery windows in one go, e.g. to backfill or
+re-simulate many weeks, or to run the lotteries of several Discord servers together.
+
+Every .csv file is parsed once and its events and attendance history are shared by all windows,
+the lotteries of the windows are computed in parallel by a pool of worker processes.
+Batch runs only compute and report the lotteries, nothing is published.
+
+Usage:
+    python batch_lottery.py <yaml_filename> [<yaml_filename> ...] [--weeks N | --start-dates DATE [DATE ...]]
+                            [--workers N] [--seed S] [--output <yaml_filename>]
+"""
+import argparse
+import datetime
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import yaml
+
+from clinic_lottery import ClinicLottery, process_yaml_file
+from history import EventParticipationTracker
+from sesh import START_DATE, EVENT_TYPE, RSVPER_LINK, ATTENDEES, WAITLIST
+from sesh_util import extract_server_and_event_id, convert_date_str_to_obj
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# csv filename -> (SeshData, clinic events, EventParticipationTracker), set in every worker process
+_shared_data = {}
+
+
+def get_windows(config: dict, start_dates=None, weeks=None) -> list:
+    """
+    Start dates of the lottery windows to run for config.
+
+    :param config: lottery configuration, see process_yaml_file()
+    :param start_dates: explicit list of start dates (datetime.date), takes precedence over weeks
+    :param weeks: number of consecutive windows from config['start_date'], each recurring_interval_in_days long
+    :return: list of datetime.date
+    """
+    if start_dates:
+        return list(start_dates)
+    start_date = config['start_date']
+    if isinstance(start_date, datetime.datetime):
+        start_date = start_date.date()
+    return [start_date + i * config['recurring_interval_in_days'] for i in range(weeks or 1)]
+
+
+def load_shared_data(configs: list) -> dict:
+    """
+    Parse the .csv file of every configuration once and build its attendance history.
+
+    The full export is read (history_window_in_days is ignored) since the windows share the data,
+    and the attendance history of every week is built up front so that the workers only read it.
+
+    :return: dict csv filename -> (SeshData, clinic events, EventParticipationTracker)
+    """
+    shared_data = {}
+    for config in configs:
+        csv_filename = config['csv_filename']
+        if csv_filename in shared_data:
+            continue
+        sesh_data = ClinicLottery.load_sesh_data({**config, 'history_window_in_days': None})
+        clinic_events = ClinicLottery.load_clinic_events(sesh_data)
+        attendance_tracker = EventParticipationTracker(clinic_events, bulk=True)
+        attendance_tracker.generate_all_weeks()
+        shared_data[csv_filename] = (sesh_data, clinic_events, attendance_tracker)
+    return shared_data
+
+
+def _init_worker(shared_data: dict) -> None:
+    global _shared_data
+    _shared_data = shared_data
+
+
+def summarize_lotteries(clinic_lottery: ClinicLottery) -> list:
+    """
+    Report the outcome of every lottery of a ClinicLottery.
+
+    :return: list of dicts with the event, the seed of its lottery and the names of its attendees and waitlist,
+             in lottery order
+    """
+    events = []
+    for lottery_event, lottery, seed_sequence in clinic_lottery.lotteries:
+        server_id, event_id = extract_server_and_event_id(lottery_event[RSVPER_LINK])
+        events.append({
+            'event_type': lottery_event[EVENT_TYPE],
+            'event_date': str(lottery_event[START_DATE]),
+            'server_id': server_id,
+            'event_id': event_id,
+            'seed': ClinicLottery.describe_seed(seed_sequence),
+            ATTENDEES: lottery.get_attendees(),
+            WAITLIST: lottery.get_waitlist(),
+        })
+    return events
+
+
+def run_window(config: dict, start_date: datetime.date, seed_sequence: np.random.SeedSequence) -> dict:
+    """
+    Compute the lotteries of config for the window starting at start_date, on the shared data of the process.
+
+    :param seed_sequence: SeedSequence the seeds of the lotteries of the window are spawned from
+    :return: dict with the csv filename, the start date and the events of the window (empty if the window has
+             no clinics, e.g. a holiday week), or the error if it failed
+    """
+    csv_filename = config['csv_filename']
+    result = {'csv_filename': csv_filename, 'start_date': str(start_date)}
+    sesh_data, clinic_events, attendance_tracker = _shared_data[csv_filename]
+    try:
+        lottery_events = ClinicLottery.select_lottery_events(
+            clinic_events, config['events'], start_date, config['recurring_interval_in_days'])
+        if len(lottery_events) == 0:
+            result['events'] = []
+            return result
+        clinic_lottery = ClinicLottery(
+            {**config, 'start_date': start_date},
+            sesh_data=sesh_data,
+            clinic_events=clinic_events,
+            attendance_tracker=attendance_tracker,
+            publish=False,
+            seed_sequence=seed_sequence
+        )
+        result['events'] = summarize_lotteries(clinic_lottery)
+    except Exception as e:
+        logger.error(f'Lottery of {csv_filename} starting {start_date} failed: {e!r}')
+        result['error'] = repr(e)
+    return result
+
+
+def run_batch(configs: list, start_dates=None, weeks=None, max_workers=None, seed=None) -> list:
+    """
+    Compute the lotteries of every configuration and window.
+
+    :param configs: list of lottery configurations, see process_yaml_file()
+    :param start_dates: start dates of the windows shared by all configurations, see get_windows()
+    :param weeks: number of windows per configuration from its start_date, see get_windows()
+    :param max_workers: number of worker processes, default: number of CPUs, 1 runs in this process
+    :param seed: seed of the batch, every window gets its own seed spawned from it, so the results do not depend
+                 on the number of workers or the order the windows run in, None for fresh entropy
+    :return: list of window results (see run_window()), in the order of configs and windows
+    """
+    shared_data = load_shared_data(configs)
+    windows = [
+        (config, start_date)
+        for config in configs
+        for start_date in get_windows(config, start_dates=start_dates, weeks=weeks)
+    ]
+    seed_sequence = np.random.SeedSequence(seed)
+    logger.info(f'Batch seed: {seed_sequence.entropy}')
+    jobs = [
+        (config, start_date, window_seed_sequence)
+        for (config, start_date), window_seed_sequence in zip(windows, seed_sequence.spawn(len(windows)))
+    ]
+
+    if max_workers == 1:
+        _init_worker(shared_data)
+        return [run_window(*job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(shared_data,)) as pool:
+        futures = [pool.submit(run_window, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def print_results(results: list) -> None:
+    for result in results:
+        print(f"{result['csv_filename']}, window starting {result['start_date']}:")
+        if 'error' in result:
+            print(f"    failed: {result['error']}")
+            continue
+        if not result['events']:
+            print('    no clinics')
+        for event in result['events']:
+            print(f"    {event['event_type']} on {event['event_date']} (event ID: {event['event_id']})")
+            print(f"        {ATTENDEES}: {', '.join(event[ATTENDEES])}")
+            print(f"        {WAITLIST}: {', '.join(event[WAITLIST])}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description="Run the clinic lotteries of several configurations and weeks.")
+    parser.add_argument('filenames', type=str, nargs='+', help='The paths to the yaml configuration files')
+    windows = parser.add_mutually_exclusive_group()
+    windows.add_argument('--weeks', type=int, default=1,
+                         help="Number of consecutive lottery windows from each configuration's start_date")
+    windows.add_argument('--start-dates', type=convert_date_str_to_obj, nargs='+',
+                         help='Start dates of the lottery windows (YYYY-MM-DD), used for every configuration')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--output', type=str, default=None, help='Write the results to this yaml file')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the batch')
+
+    args = parser.parse_args()
+    configs = [process_yaml_file(filename) for filename in args.filenames]
+    results = run_batch(configs, start_dates=args.start_dates, weeks=args.weeks, max_workers=args.workers,
+                        seed=args.seed)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            yaml.dump(results, f, sort_keys=False)
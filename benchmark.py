@@ -0,0 +1,459 @@
+"""
+Micro-benchmarks for the lottery hot paths.
+
+Each benchmark times the previous implementation against the current one on synthetic data.
+
+Usage:
+    python benchmark.py [benchmark_name ...]
+"""
+import argparse
+import collections
+import datetime
+import os
+import re
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from attendance_matrix import AttendanceMatrix
+from clinic_lottery import ClinicLottery
+from lottery import Lottery
+from lottery_simulator import LotterySimulator
+from participant_registry import ParticipantRegistry
+from sesh import SeshData, EVENT_NAME, START_DATE, RSVPER_NAMES, SESH_CLINIC_EVENT_TOKEN
+from sesh_cache import SeshSnapshotCache
+from sesh_util import (
+    SeshEventTypeClassifier, SeshRSVPParser, BEG_CLINIC, ADV_BEG_CLINIC, INT_CLINIC, ADV_INT_CLINIC,
+    DUPR_MATCHES, GETTING_STARTED, BALL_MACHINE_SESSION, OTHER
+)
+
+CLINIC_TYPES = [BEG_CLINIC, ADV_BEG_CLINIC, INT_CLINIC, ADV_INT_CLINIC]
+
+
+def make_attendance_df(num_participants, num_weeks, attendance_rate=0.3, seed=0):
+    """
+    Build a synthetic attendance history shaped like EventParticipationTracker.get_history():
+    participants as rows, weeks (most recent first) as columns, lists of event types or NaN as cells.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f'Participant {i}' for i in range(num_participants)]
+    weeks = [f'week {i:03d}' for i in range(num_weeks)]
+    attended = rng.random((num_participants, num_weeks)) < attendance_rate
+    event_types = rng.integers(0, len(CLINIC_TYPES), size=(num_participants, num_weeks))
+    cells = np.full((num_participants, num_weeks), np.nan, dtype=object)
+    for i, j in zip(*np.nonzero(attended)):
+        cells[i, j] = [CLINIC_TYPES[event_types[i, j]]]
+    return pd.DataFrame(cells, index=pd.Index(names), columns=weeks)
+
+
+def report(name, legacy_seconds, current_seconds):
+    print(f'{name}: legacy {legacy_seconds * 1000:.2f} ms, '
+          f'current {current_seconds * 1000:.2f} ms, '
+          f'speedup {legacy_seconds / current_seconds:.1f}x')
+
+
+def legacy_priority_score(attendance_df):
+    """Lottery.compute_priority scoring before vectorization (per-cell lambda and DataFrame product)."""
+    num_past_events = attendance_df.shape[1]
+    bool_attendance_df = attendance_df.map(lambda x: len(x) > 0 if isinstance(x, list) else 0)
+    max_weight = 2 ** (num_past_events - 1)
+    weights = [max_weight * (0.5 ** col_idx) for col_idx in range(num_past_events)]
+    return (bool_attendance_df * weights).sum(axis=1).to_numpy(dtype=np.float64)
+
+
+def current_priority_score(attendance_df):
+    attendance = AttendanceMatrix.from_frame(attendance_df)
+    return attendance.attended() @ Lottery.get_attendance_weights(attendance_df.shape[1])
+
+
+def bench_priority(number=5):
+    attendance_df = make_attendance_df(num_participants=5000, num_weeks=40)
+    assert np.array_equal(legacy_priority_score(attendance_df), current_priority_score(attendance_df))
+    legacy = timeit.timeit(lambda: legacy_priority_score(attendance_df), number=number) / number
+    current = timeit.timeit(lambda: current_priority_score(attendance_df), number=number) / number
+    report('priority (5000 participants x 40 weeks)', legacy, current)
+
+
+def legacy_deprioritize(priority_df, participants, priority):
+    """Lottery.deprioritize_participants before vectorization (list membership and a .loc write per hit)."""
+    if len(participants) == 0:
+        return
+    event_participants = priority_df.index.tolist()
+    for participant in event_participants:
+        if participant in participants:
+            priority_df.loc[participant] = priority
+
+
+def bench_deprioritize(number=1):
+    attendance_df = make_attendance_df(num_participants=5000, num_weeks=4)
+    names = attendance_df.index.tolist()
+    excluded = names[::5] + [f'Not Signed Up {i}' for i in range(1000)]
+    multi_signup = names[1::5] + names[2::25]
+    lottery = Lottery(event_type=INT_CLINIC, attendance_df=attendance_df, max_num_attendees=16)
+    priority_df = lottery.compute_priority()
+
+    def run_legacy():
+        df = priority_df.copy()
+        legacy_deprioritize(df, excluded, Lottery.EXCLUDED_PRIORITY)
+        legacy_deprioritize(df, multi_signup, Lottery.MULTI_SIGNUP_PRIORITY)
+        return df
+
+    def run_current():
+        lottery.priority_df = priority_df.copy()
+        lottery.deprioritize_participants([
+            (excluded, Lottery.EXCLUDED_PRIORITY),
+            (multi_signup, Lottery.MULTI_SIGNUP_PRIORITY),
+        ])
+        return lottery.priority_df
+
+    pd.testing.assert_frame_equal(run_legacy(), run_current())
+    legacy = timeit.timeit(run_legacy, number=number) / number
+    current = timeit.timeit(run_current, number=number) / number
+    report('deprioritize (5000 participants, 2000 excluded names)', legacy, current)
+
+
+def bench_attendance_matrix(number=5):
+    attendance_df = make_attendance_df(num_participants=5000, num_weeks=40)
+    attendance = AttendanceMatrix.from_frame(attendance_df)
+    frame_bytes = attendance_df.memory_usage(deep=True).sum()
+    matrix_bytes = attendance.codes.nbytes
+    print(f'attendance matrix memory: DataFrame {frame_bytes / 1e6:.1f} MB, bitmask {matrix_bytes / 1e6:.2f} MB')
+    legacy = timeit.timeit(lambda: legacy_priority_score(attendance_df), number=number) / number
+    current = timeit.timeit(
+        lambda: attendance.attended() @ Lottery.get_attendance_weights(attendance.shape[1]), number=number) / number
+    report('priority from bitmask matrix (5000 participants x 40 weeks)', legacy, current)
+
+
+def legacy_classify(event_name):
+    """SeshEventTypeClassifier.classify before the compiled single-pass pattern."""
+    if re.search(r'Advanced Intermediate Clinic', event_name, re.IGNORECASE):
+        return ADV_INT_CLINIC
+    elif re.search(r'Intermediate Clinic', event_name, re.IGNORECASE):
+        return INT_CLINIC
+    elif re.search(r'Advanced Beginner Clinic', event_name, re.IGNORECASE):
+        return ADV_BEG_CLINIC
+    elif re.search(r'Beginner Clinic', event_name, re.IGNORECASE):
+        return BEG_CLINIC
+    elif re.search(r'Round Robin - \d\.\d+ to \d\.\d+', event_name, re.IGNORECASE):
+        return re.findall(r'Round Robin - \d\.\d+ to \d\.\d+', event_name, re.IGNORECASE)[0]
+    elif re.search(r'DUPR Matches', event_name, re.IGNORECASE):
+        return DUPR_MATCHES
+    elif re.search(r'Getting Started', event_name, re.IGNORECASE):
+        return GETTING_STARTED
+    elif re.search(r'Ball Machine Session\s*\([0-9.,\s]+\)', event_name, re.IGNORECASE):
+        return BALL_MACHINE_SESSION
+    else:
+        return OTHER
+
+
+EVENT_NAMES = [
+    'Advanced Intermediate Clinic (3.5)',
+    'Intermediate Clinic (3.25)',
+    'Advanced Beginner Clinic (2.75 to 3.0)',
+    'Beginner Clinic (2.0 to 2.5)',
+    'CANCELLED - Intermediate Clinic(3.25) - HOLIDAY WK',
+    'Round Robin - 3.25 to 3.75',
+    'Round Robin - 2.5 to 3.0',
+    'Round Robins - NO EVENT THIS WEEK',
+    'DUPR Matches 2.75 to 3.75',
+    'Getting Started',
+    'Ball Machine Session (3.0, 3.25)',
+    'Ball Machine Session(All levels)',
+    'Youth Pickleball Meetup',
+    'Sunday Early Worms Ladder',
+]
+
+
+def bench_classify(number=3):
+    rng = np.random.default_rng(0)
+    event_names = pd.Series(rng.choice(EVENT_NAMES, size=50000))
+    assert event_names.map(legacy_classify).equals(SeshEventTypeClassifier.classify_many(event_names))
+    legacy = timeit.timeit(lambda: event_names.apply(legacy_classify), number=number) / number
+    current = timeit.timeit(lambda: SeshEventTypeClassifier.classify_many(event_names), number=number) / number
+    report('classify (50000 event names)', legacy, current)
+    print(f'classify throughput: {len(event_names) / current:,.0f} event names/s')
+
+
+def legacy_parse_rsvpers(rsvpers_str):
+    """SeshRSVPParser.parse before precompiled patterns and memoization."""
+    if not isinstance(rsvpers_str, str):
+        return {}
+    result = {}
+    sections = re.findall(SeshRSVPParser.section_pattern, rsvpers_str, flags=re.VERBOSE)
+    for section_header, section_value in sections:
+        cleaned_section_value = section_value.strip(' ,"')
+        full_names = re.split(r'\s*,\s*', cleaned_section_value)
+        result[section_header] = [
+            re.sub(SeshRSVPParser.nickname_pattern, ' ', name.strip())
+            for name in full_names if len(name) > 0 and not name.isspace()
+        ]
+    return result
+
+
+def regex_parse_rsvpers(rsvpers_str):
+    """SeshRSVPParser.parse with the reference section regex instead of the section scanner, without memoization."""
+    if not isinstance(rsvpers_str, str):
+        return {}
+    result = {}
+    for section_header, section_value in SeshRSVPParser.find_sections_regex(rsvpers_str):
+        full_names = SeshRSVPParser.name_separator_regex.split(section_value.strip(' ,"'))
+        result[section_header] = SeshRSVPParser.remove_nicknames(full_names)
+    return result
+
+
+def make_rsvpers_strs(num_rows, num_names=2000, seed=0):
+    """Synthetic 'rsvpers' column of a Sesh export, one distinct string per event."""
+    rng = np.random.default_rng(seed)
+    names = [f'First{i} "Nick{i}" Last{i}' if i % 7 == 0 else f'First{i} Last{i}' for i in range(num_names)]
+
+    def section(header, size):
+        return f'"{header}: {",".join(rng.choice(names, size=size, replace=False))}"'
+
+    return pd.Series([
+        ','.join([section('Lottery', rng.integers(0, 20)), section('Attendees', rng.integers(0, 24)),
+                  section('Attendees Waitlist', rng.integers(0, 12))])
+        for _ in range(num_rows)
+    ])
+
+
+def bench_parse_rsvpers(number=1):
+    rsvpers_strs = make_rsvpers_strs(num_rows=50000)
+    assert rsvpers_strs.map(legacy_parse_rsvpers).equals(SeshRSVPParser.parse_many(rsvpers_strs))
+    assert rsvpers_strs.map(regex_parse_rsvpers).equals(SeshRSVPParser.parse_many(rsvpers_strs))
+    SeshRSVPParser._parse_sections.cache_clear()
+    legacy = timeit.timeit(lambda: rsvpers_strs.map(legacy_parse_rsvpers), number=number) / number
+    regex = timeit.timeit(lambda: rsvpers_strs.map(regex_parse_rsvpers), number=number) / number
+    cold = timeit.timeit(lambda: SeshRSVPParser.parse_many(rsvpers_strs), number=1)
+    warm = timeit.timeit(lambda: SeshRSVPParser.parse_many(rsvpers_strs), number=number) / number
+    report('parse rsvpers (50000 rows, cold cache)', legacy, cold)
+    report('parse rsvpers (50000 rows, warm cache)', legacy, warm)
+    # the scanner of find_sections() against its reference regular expression, both without memoization
+    report('parse rsvpers (50000 rows, section scanner vs regex)', regex, cold)
+
+
+def write_sesh_export(csv_filename, num_rows, seed=0):
+    """Synthetic Sesh export with events spread over ten years."""
+    rng = np.random.default_rng(seed)
+    start_dates = pd.Timestamp('2015-01-05 18:00') + pd.to_timedelta(rng.integers(0, 3650, size=num_rows), unit='D')
+    pd.DataFrame({
+        EVENT_NAME: rng.choice(EVENT_NAMES, size=num_rows),
+        START_DATE: start_dates.strftime('%Y-%m-%d %H:%M'),
+        RSVPER_NAMES: make_rsvpers_strs(num_rows=num_rows, seed=seed),
+        'rsvper_link': 'https://sesh.fyi/dashboard/1/events/edit/1',
+        'edit_link': 'edit', 'discord_link': 'discord', 'channel': 'channel', 'author': 'author',
+    }).to_csv(csv_filename, index=False)
+
+
+def bench_sesh_ingest(number=1):
+    num_rows = 50000
+    window = dict(start_date=datetime.date(2024, 8, 1), end_date=datetime.date(2024, 12, 31),
+                  event_type_pattern=SESH_CLINIC_EVENT_TOKEN, chunksize=10000)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_filename = os.path.join(tmp_dir, 'events.csv')
+        write_sesh_export(csv_filename, num_rows)
+        SeshRSVPParser._parse_sections.cache_clear()
+        legacy = timeit.timeit(lambda: SeshData(csv_filename), number=number) / number
+        SeshRSVPParser._parse_sections.cache_clear()
+        current = timeit.timeit(lambda: SeshData(csv_filename, **window), number=number) / number
+    report(f'sesh ingest ({num_rows} rows over 10 years, full read vs 5 month clinic window)', legacy, current)
+
+
+def bench_sesh_cache(number=3):
+    num_rows = 50000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_filename = os.path.join(tmp_dir, 'events.csv')
+        write_sesh_export(csv_filename, num_rows)
+        cache = SeshSnapshotCache(os.path.join(tmp_dir, 'cache'))
+        SeshRSVPParser._parse_sections.cache_clear()
+        cold = timeit.timeit(lambda: SeshData(csv_filename, cache=cache), number=1)
+        pd.testing.assert_frame_equal(SeshData(csv_filename).df, SeshData(csv_filename, cache=cache).df)
+        warm = timeit.timeit(lambda: SeshData(csv_filename, cache=cache), number=number) / number
+    report(f'sesh export ({num_rows} rows, cold parse vs warm snapshot)', cold, warm)
+
+
+def make_open_play_lottery(num_participants, max_num_attendees, seed=0):
+    return Lottery(event_type=CLINIC_TYPES[0], attendance_df=make_attendance_df(num_participants, 3, seed=seed),
+                   max_num_attendees=max_num_attendees, rng=np.random.default_rng(seed))
+
+
+def legacy_select(lottery, exclude_from_lottery):
+    """Lottery.select_and_sort_attendees before the top-K path: sorted wide table and a per-row group column."""
+    lottery.priority_df = lottery.compute_priority()
+    lottery.flags_df = lottery.compute_flags([], num_recent_sessions=None)
+    lottery.deprioritize_participants([(exclude_from_lottery, Lottery.EXCLUDED_PRIORITY)])
+    participant_df = pd.concat(
+        [lottery.flags_df, lottery.priority_df, lottery.attendance_df],
+        axis=1,
+        keys=[Lottery.FLAGS_COL_NAME, Lottery.PRIORITY_COL_NAME, Lottery.ATTENDANCE_COL_NAME])
+    participant_df.sort_values(by=(Lottery.PRIORITY_COL_NAME, Lottery.SCORE_COL_NAME), inplace=True)
+    participant_df = participant_df.reset_index()
+    participant_df[Lottery.GROUP_COL_NAME] = [
+        'Attendees' if i <= lottery.max_num_attendees else 'Attendees Waitlist'
+        for i in range(1, len(participant_df) + 1)
+    ]
+    return participant_df.iloc[:lottery.max_num_attendees, 0].tolist()
+
+
+def current_select(lottery, exclude_from_lottery):
+    lottery.select_and_sort_attendees(exclude_from_lottery=exclude_from_lottery, all_participants=[])
+    return lottery.get_attendees()
+
+
+def bench_select(number=20):
+    num_participants, max_num_attendees = 800, 16
+    lottery = make_open_play_lottery(num_participants, max_num_attendees)
+    exclude_from_lottery = [f'Participant {i}' for i in range(0, num_participants, 50)]
+    legacy = timeit.timeit(lambda: legacy_select(lottery, exclude_from_lottery), number=number) / number
+    current = timeit.timeit(lambda: current_select(lottery, exclude_from_lottery), number=number) / number
+    report(f'attendee selection ({num_participants} RSVPs, {max_num_attendees} places)', legacy, current)
+
+
+def legacy_attendee_list(lottery):
+    """Lottery.get_attendee_list() before LotteryResult: the names were read from the assembled report table."""
+    return lottery.get_participant_df()[Lottery.PTCPNT_COL_NAME].tolist()
+
+
+def current_attendee_list(lottery):
+    lottery._result = None
+    return lottery.get_attendee_list()
+
+
+def bench_attendee_list(number=50):
+    num_participants, max_num_attendees = 800, 16
+    lottery = make_open_play_lottery(num_participants, max_num_attendees)
+    lottery.select_and_sort_attendees(exclude_from_lottery=[], all_participants=[])
+    legacy = timeit.timeit(lambda: legacy_attendee_list(lottery), number=number) / number
+    current = timeit.timeit(lambda: current_attendee_list(lottery), number=number) / number
+    report(f'ranked names for the dashboard ({num_participants} RSVPs)', legacy, current)
+
+
+def legacy_merge_flags(lottery):
+    """ClinicLottery.merge_flags before vectorization, one row at a time."""
+    merged_flags_col = []
+    for idx, row in lottery.participant_df.iterrows():
+        new_flag = []
+        level_switch_flag = row[(lottery.FLAGS_COL_NAME, 'level_switch')]
+        multi_signup_from = row[(lottery.FLAGS_COL_NAME, 'multi_signup_from')]
+        if level_switch_flag and len(level_switch_flag) > 0:
+            new_flag.append(level_switch_flag)
+        if row[(lottery.FLAGS_COL_NAME, 'multi_signup')] is True:
+            new_flag.append(f'multi:{multi_signup_from}' if multi_signup_from else 'multi')
+        merged_flags_col.append(','.join(new_flag))
+    return merged_flags_col
+
+
+def legacy_report(lottery):
+    """The Sheets and the csv outputs each selected the columns and merged the flags of the table."""
+    for _ in range(2):
+        output_columns = [(lottery.PTCPNT_COL_NAME, ''), (lottery.PRIORITY_COL_NAME, lottery.SCORE_COL_NAME)]
+        output_columns += [
+            col for col in lottery.participant_df.columns
+            if isinstance(col, tuple) and col[0] == lottery.ATTENDANCE_COL_NAME
+        ]
+        output_df = lottery.participant_df[output_columns].copy()
+        output_df[('Flags', '')] = legacy_merge_flags(lottery)
+        output_columns.insert(1, ('Flags', ''))
+        output_df = output_df[output_columns]
+    return output_df
+
+
+def bench_report(number=20):
+    num_participants = 800
+    lottery = make_open_play_lottery(num_participants, 16)
+    registry = ParticipantRegistry()
+    registry.register('Clinic-B', entrants=[f'Participant {i}' for i in range(0, num_participants, 3)])
+    lottery.select_and_sort_attendees(exclude_from_lottery=[], all_participants=registry)
+    lottery.participant_df
+    legacy = timeit.timeit(lambda: legacy_report(lottery), number=number) / number
+    current = timeit.timeit(lambda: ClinicLottery.build_report(lottery), number=number) / number
+    report(f'lottery report for Sheets and csv ({num_participants} RSVPs)', legacy, current)
+
+
+def legacy_simulate(attendance_df, max_num_attendees, num_trials):
+    """Win probabilities by running the whole Lottery num_trials times."""
+    wins = collections.Counter()
+    for _ in range(num_trials):
+        lottery = Lottery(event_type=CLINIC_TYPES[0], attendance_df=attendance_df, max_num_attendees=max_num_attendees)
+        lottery.select_and_sort_attendees(exclude_from_lottery=[], all_participants=[])
+        wins.update(lottery.participant_df[Lottery.PTCPNT_COL_NAME].iloc[:max_num_attendees])
+    return wins
+
+
+def bench_simulate(number=1):
+    num_participants, num_trials = 500, 1000000
+    legacy_num_trials = 100
+    attendance_df = make_attendance_df(num_participants, num_weeks=3)
+    simulator = LotterySimulator.from_lottery(Lottery(
+        event_type=CLINIC_TYPES[0], attendance_df=attendance_df, max_num_attendees=16))
+    legacy = timeit.timeit(lambda: legacy_simulate(attendance_df, 16, legacy_num_trials), number=number) / number
+    current = timeit.timeit(lambda: simulator.simulate(num_trials, seed=0), number=number) / number
+    # the legacy loop is timed on fewer trials and extrapolated
+    report(f'win probabilities ({num_participants} participants, {num_trials} trials)',
+           legacy * num_trials / legacy_num_trials, current)
+
+
+def legacy_track_rsvpers(entrants_per_lottery):
+    """
+    ClinicLottery.track_rsvpers before the registry: a list with a linear membership test per name.
+
+    Returns the names of all entrants and the number of entries by someone who entered an earlier lottery.
+    """
+    all_rsvper_names = []
+    num_multi_signups = 0
+    for entrants in entrants_per_lottery:
+        num_multi_signups += sum(name in all_rsvper_names for name in entrants)
+        for name in entrants:
+            if name not in all_rsvper_names:
+                all_rsvper_names.append(name)
+    return all_rsvper_names, num_multi_signups
+
+
+def current_track_rsvpers(entrants_per_lottery):
+    registry = ParticipantRegistry()
+    num_multi_signups = 0
+    for lottery_idx, entrants in enumerate(entrants_per_lottery):
+        num_multi_signups += sum(name in registry for name in entrants)
+        registry.register(CLINIC_TYPES[lottery_idx % len(CLINIC_TYPES)], entrants)
+    return list(registry), num_multi_signups
+
+
+def bench_track_rsvpers(number=3):
+    num_lotteries, num_entrants = 8, 2000
+    rng = np.random.default_rng(0)
+    entrants_per_lottery = [
+        [f'Participant {i}' for i in rng.choice(num_lotteries * num_entrants // 2, size=num_entrants, replace=False)]
+        for _ in range(num_lotteries)
+    ]
+    assert legacy_track_rsvpers(entrants_per_lottery) == current_track_rsvpers(entrants_per_lottery)
+    legacy = timeit.timeit(lambda: legacy_track_rsvpers(entrants_per_lottery), number=number) / number
+    current = timeit.timeit(lambda: current_track_rsvpers(entrants_per_lottery), number=number) / number
+    report(f'cross-lottery tracking ({num_lotteries} lotteries x {num_entrants} entrants)', legacy, current)
+
+
+BENCHMARKS = {
+    'priority': bench_priority,
+    'deprioritize': bench_deprioritize,
+    'attendance_matrix': bench_attendance_matrix,
+    'classify': bench_classify,
+    'parse_rsvpers': bench_parse_rsvpers,
+    'sesh_ingest': bench_sesh_ingest,
+    'sesh_cache': bench_sesh_cache,
+    'simulate': bench_simulate,
+    'track_rsvpers': bench_track_rsvpers,
+    'select': bench_select,
+    'attendee_list': bench_attendee_list,
+    'report': bench_report,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run lottery micro-benchmarks.')
+    parser.add_argument('names', nargs='*', help=f'Benchmarks to run (default: all): {", ".join(BENCHMARKS)}')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(unknown)}')
+    for benchmark_name in args.names or BENCHMARKS:
+        BENCHMARKS[benchmark_name]()
@@ -3,6 +3,8 @@ import argparse
 import os
 import sys
 
+import numpy as np
+import pandas as pd
 import yaml
 
 
@@ -18,20 +20,36 @@ def represent_inline_list(dumper, data):
 yaml.add_representer(InlineList, represent_inline_list)
 
 
-from sesh import SeshData, START_DATE, RSVPER_NAMES, EVENT_TYPE, LOTTERY, ATTENDEES, RSVPER_LINK
+from sesh import (
+    SeshData, START_DATE, RSVPER_NAMES, EVENT_TYPE, LOTTERY, ATTENDEES, RSVPER_LINK, SESH_CLINIC_EVENT_TOKEN
+)
 from sesh_util import extract_server_and_event_id
 from sesh_util import convert_date_str_to_obj
-from gsheet_util import write_df_to_google_sheet, read_spreadsheet_to_df
+from gsheet_util import SheetsSession, read_spreadsheet_to_df
+from publisher import Publisher
 
 from lottery import Lottery
+from participant_registry import ParticipantRegistry
 from history import EventParticipationTracker
+from history_store import AttendanceHistoryStore
+from sesh_cache import SeshSnapshotCache
 from logging_config import configure_logging
 from whosin import coach_huddle_whosin
 from sesh_dashboard.event import SeshDashboardEvent
 
 
 class ClinicLottery:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, sesh_data=None, clinic_events=None, attendance_tracker=None, publish=True,
+                 seed_sequence=None):
+        """
+        :param config: lottery configuration, see process_yaml_file()
+        :param sesh_data: parsed Sesh export shared between runs, default: loaded from config['csv_filename']
+        :param clinic_events: clinic events of sesh_data shared between runs, see load_clinic_events()
+        :param attendance_tracker: EventParticipationTracker over clinic_events shared between runs
+        :param publish: write the outputs (Google Sheet, dashboard yaml, whosin), False only computes the lotteries
+        :param seed_sequence: numpy.random.SeedSequence the seed of every lottery is spawned from,
+                              default: built from config['seed'], or fresh entropy when there is no seed
+        """
         self.csv_filename = config['csv_filename']
         self.output_dir = config['output_dir']
         self.start_date = config['start_date']
@@ -39,44 +57,87 @@ class ClinicLottery:
         self.event_configs = config['events']
         self.exclude_from_lottery = config['exclude_from_lottery']
 
-        # track participants across clinic lotteries
-        self.all_rsvper_names = []
-
-        self.sesh_data = SeshData(self.csv_filename)
-        self.clinic_events = self.sesh_data.get_clinic_events()
-
-        # todo: remove_cancelled_event has to take an additional argument,
-        # which is a link to a google sheet which keeps track of all the cancelled events
-        self.clinic_events = self.sesh_data.remove_canceled_event(self.clinic_events)
-
-        # self.clinic_events[RSVPER_NAMES] = self.clinic_events[RSVPER_NAMES, ATTENDEES]
-        clinic_attendance_tracker = EventParticipationTracker(self.clinic_events)
+        # track participants across clinic lotteries: which earlier lotteries each of them entered and won
+        self.participant_registry = ParticipantRegistry()
+
+        # every lottery draws from its own generator, spawned in lottery order, so a run is reproducible from
+        # the recorded seed whatever runs before, after or next to it
+        if seed_sequence is None:
+            seed_sequence = np.random.SeedSequence(config.get('seed'))
+        self.seed_sequence = seed_sequence
+        print(f'seed: {self.seed_sequence.entropy}')
+
+        self.sesh_data = sesh_data if sesh_data is not None else self.load_sesh_data(config)
+        self.clinic_events = clinic_events if clinic_events is not None else self.load_clinic_events(self.sesh_data)
+
+        if attendance_tracker is None:
+            # optionally persist the attendance history on disk, so each run only ingests the new events
+            history_store = None
+            if config.get('history_store'):
+                history_store = AttendanceHistoryStore(config['history_store'])
+
+            # self.clinic_events[RSVPER_NAMES] = self.clinic_events[RSVPER_NAMES, ATTENDEES]
+            attendance_tracker = EventParticipationTracker(
+                self.clinic_events,
+                store=history_store,
+                ingest_until=self.start_date
+            )
+        self.attendance_tracker = attendance_tracker
 
         self.lottery_events = self.get_lottery_events(
             start_date=self.start_date,
             recurring_interval_in_days=self.recurring_interval_in_days
         )
+        self.output_filename = self.get_output_filename()
 
-        output_filename = self.get_output_filename()
-        # output_filename = 'test'
+        # list of (lottery event, Lottery, SeedSequence of the lottery) in lottery order
+        self.lotteries = self.run_lotteries()
 
-        whosin_filename = f'{self.output_dir}/whosin.txt'
-        if os.path.exists(whosin_filename):
-            os.remove(whosin_filename)
+        if publish:
+            self.publish(max_concurrency=config.get('publish_concurrency', 4))
 
-        sesh_dashboard_data_filename = f'{self.output_dir}/Clinic_sesh_dashboard_data.yaml'
-        if os.path.exists(sesh_dashboard_data_filename):
-            os.remove(sesh_dashboard_data_filename)
+    @staticmethod
+    def load_sesh_data(config: dict) -> SeshData:
+        # optionally keep the parsed Sesh export in sesh_cache_dir, so later runs on the same export skip parsing
+        sesh_cache = None
+        if config.get('sesh_cache_dir'):
+            sesh_cache = SeshSnapshotCache(config['sesh_cache_dir'])
+
+        # optionally only ingest the clinic events from history_window_in_days before start_date up to the
+        # end of the lottery period, reading the .csv file in chunks of csv_chunksize rows
+        if config.get('history_window_in_days'):
+            return SeshData(
+                config['csv_filename'],
+                start_date=config['start_date'] - datetime.timedelta(days=config['history_window_in_days']),
+                end_date=config['start_date'] + config['recurring_interval_in_days'],
+                event_type_pattern=SESH_CLINIC_EVENT_TOKEN,
+                chunksize=config.get('csv_chunksize', 10000),
+                cache=sesh_cache
+            )
+        return SeshData(config['csv_filename'], cache=sesh_cache)
+
+    @staticmethod
+    def load_clinic_events(sesh_data: SeshData) -> pd.DataFrame:
+        clinic_events = sesh_data.get_clinic_events()
+
+        # todo: remove_cancelled_event has to take an additional argument,
+        # which is a link to a google sheet which keeps track of all the cancelled events
+        return sesh_data.remove_canceled_event(clinic_events)
 
-        for idx, lottery_event in self.lottery_events.iterrows():
+    def run_lotteries(self) -> list:
+        """
+        Compute the lottery of every event in the lottery period, in lottery order.
+
+        :return: list of (lottery event, Lottery, SeedSequence of the lottery)
+        """
+        lotteries = []
+        event_seed_sequences = self.seed_sequence.spawn(len(self.lottery_events))
+        for (idx, lottery_event), event_seed_sequence in zip(self.lottery_events.iterrows(), event_seed_sequences):
             event_type = lottery_event[EVENT_TYPE]
-            event_date = lottery_event[START_DATE]
-            rsvper_link = lottery_event[RSVPER_LINK]
-            server_id, event_id = extract_server_and_event_id(rsvper_link)
-            print(f'server ID: {server_id}, event ID: {event_id}')
             print(lottery_event)
             # get rsvper names -- people who have entered lottery
-            rsvper_names = lottery_event[RSVPER_NAMES, LOTTERY]
+            # (copied, the list in the shared clinic events must not be modified)
+            rsvper_names = list(lottery_event[RSVPER_NAMES, LOTTERY])
             print(f'rsvper_names: {rsvper_names}')
 
             # todo: sometimes users enter their names in the attendee list by mistake
@@ -88,6 +149,7 @@ class ClinicLottery:
 
             max_num_attendees = lottery_event['max_attendee_count']
             num_past_sessions = lottery_event['num_past_sessions']
+            level_switch_sessions = lottery_event['level_switch_sessions']
 
             latest_events = self.sesh_data.get_latest_events(
                 before_event_date=lottery_event[START_DATE],
@@ -95,63 +157,112 @@ class ClinicLottery:
                 max_sessions=num_past_sessions)
             latest_dates = latest_events[START_DATE].to_list()
 
-            clinic_attendance_df = clinic_attendance_tracker.get_history(
+            clinic_attendance = self.attendance_tracker.get_history_matrix(
                 attendee_names=rsvper_names,
                 dates=latest_dates
             )
             lottery = Lottery(
                 event_type=event_type,
-                attendance_df=clinic_attendance_df,
-                max_num_attendees=max_num_attendees
+                attendance_df=clinic_attendance,
+                max_num_attendees=max_num_attendees,
+                rng=np.random.default_rng(event_seed_sequence)
             )
             lottery.select_and_sort_attendees(
                 exclude_from_lottery=self.exclude_from_lottery,
-                all_participants=self.all_rsvper_names)
+                all_participants=self.participant_registry,
+                num_recent_sessions=level_switch_sessions)
 
-            attendee_names = lottery.participant_df[Lottery.PTCPNT_COL_NAME].tolist()
+            attendee_names = lottery.get_attendees()
             print('attendee names:', attendee_names)
 
-            self.track_rsvpers(rsvper_names)
+            self.participant_registry.register(event_type, entrants=rsvper_names, winners=attendee_names)
+            lotteries.append((lottery_event, lottery, event_seed_sequence))
+        return lotteries
 
-            self.write_table_to_gsheet(
-                lottery=lottery,
-                sheet_name=output_filename,
-                table_name=f'{event_type}_{event_date}'
-            )
+    def publish(self, max_concurrency=4):
+        """
+        Write the lottery tables to the Google Sheet, the dashboard data to yaml and the coaches' whosin text.
+        """
+        # every lottery table of this run is written to the spreadsheet at once
+        self.sheets_session = SheetsSession(sheet_name=self.output_filename)
 
-            self.write_event_data_to_file(
-                server_id=server_id,
-                event_id=event_id,
-                lottery_list=other_rsvper_names,
-                attendee_list=attendee_names,
-                filename=sesh_dashboard_data_filename
-            )
+        whosin_filename = f'{self.output_dir}/whosin.txt'
+        if os.path.exists(whosin_filename):
+            os.remove(whosin_filename)
 
-        coach_huddle_whosin(self.lottery_events, write_to_csv=whosin_filename)
+        sesh_dashboard_data_filename = f'{self.output_dir}/Clinic_sesh_dashboard_data.yaml'
+        if os.path.exists(sesh_dashboard_data_filename):
+            os.remove(sesh_dashboard_data_filename)
+
+        # the outputs are published in the background:
+        # each output has its own ordered queue and the outputs are written concurrently
+        with Publisher(max_concurrency=max_concurrency) as publisher:
+            for lottery_event, lottery, seed_sequence in self.lotteries:
+                event_type = lottery_event[EVENT_TYPE]
+                event_date = lottery_event[START_DATE]
+                server_id, event_id = extract_server_and_event_id(lottery_event[RSVPER_LINK])
+                print(f'server ID: {server_id}, event ID: {event_id}')
+
+                # the table is built once and shared by every output
+                report_df = self.build_report(lottery)
+                self.write_table_to_gsheet(
+                    report_df=report_df,
+                    table_name=f'{event_type}_{event_date}',
+                    seed_sequence=seed_sequence
+                )
+
+                publisher.submit(
+                    'dashboard_yaml',
+                    self.write_event_data_to_file,
+                    server_id=server_id,
+                    event_id=event_id,
+                    lottery_list=list(lottery_event[RSVPER_NAMES, ATTENDEES]),
+                    attendee_list=report_df[Lottery.PTCPNT_COL_NAME].tolist(),
+                    filename=sesh_dashboard_data_filename,
+                    seed_sequence=seed_sequence
+                )
+
+            publisher.submit('sheets', self.sheets_session.commit)
+            publisher.submit('whosin', coach_huddle_whosin, self.lottery_events, write_to_csv=whosin_filename)
 
     def get_lottery_events(self,
                            start_date: datetime.date,
                            recurring_interval_in_days: datetime.timedelta):
+        return self.select_lottery_events(
+            self.clinic_events, self.event_configs, start_date, recurring_interval_in_days)
 
+    @staticmethod
+    def select_lottery_events(clinic_events: pd.DataFrame,
+                              event_configs: dict,
+                              start_date: datetime.date,
+                              recurring_interval_in_days: datetime.timedelta) -> pd.DataFrame:
+        """
+        Clinic events from start_date for recurring_interval_in_days with their lottery settings, in lottery order.
+        """
         end_date = start_date + recurring_interval_in_days
 
-        lottery_events = self.clinic_events[
-            (self.clinic_events[START_DATE] >= start_date) &
-            (self.clinic_events[START_DATE] < end_date)
+        lottery_events = clinic_events[
+            (clinic_events[START_DATE] >= start_date) &
+            (clinic_events[START_DATE] < end_date)
             ].copy()
 
         lottery_order = []
         max_attendee_count = []
         num_past_sessions = []
+        level_switch_sessions = []
         for idx, event in lottery_events.iterrows():
             event_type = event[EVENT_TYPE]
-            event_config = self.event_configs[event_type]
+            event_config = event_configs[event_type]
             lottery_order.append(event_config['lottery']['order'])
             max_attendee_count.append(event_config['lottery']['max_attendee_count'])
             num_past_sessions.append(event_config['attendance_history']['num_past_sessions'])
+            # optional: only flag level switches within the most recent n sessions
+            level_switch_sessions.append(event_config['attendance_history'].get('level_switch_sessions'))
 
         lottery_events['lottery_order'] = lottery_order
         lottery_events['num_past_sessions'] = num_past_sessions
+        lottery_events['level_switch_sessions'] = pd.Series(
+            level_switch_sessions, index=lottery_events.index, dtype=object)
         lottery_events['max_attendee_count'] = max_attendee_count
         # lottery_events[RSVPER_NAMES] = lottery_events[RSVPER_NAMES, LOTTERY]
         lottery_events = lottery_events.dropna(subset=[RSVPER_NAMES])
@@ -167,101 +278,75 @@ class ClinicLottery:
         return output_filename
 
     @staticmethod
-    def merge_flags(lottery):
-        # Join the sub-columns with a comma
-        merged_flags_col = []
-
-        for idx, row in lottery.participant_df.iterrows():
-            new_flag = []
-            level_switch_flag = row[(lottery.FLAGS_COL_NAME, 'level_switch')]
-            multi_signup_flag = row[(lottery.FLAGS_COL_NAME, 'multi_signup')]
-            if level_switch_flag and len(level_switch_flag) > 0:
-                new_flag.append(row[(lottery.FLAGS_COL_NAME, 'level_switch')])
-            if multi_signup_flag is True:
-                new_flag.append('multi')
-            merged_flags = ','.join(new_flag)
-            merged_flags_col.append(merged_flags)
-        return merged_flags_col
-
-    def track_rsvpers(self, rsvper_names):
-        for name in rsvper_names:
-            if name not in self.all_rsvper_names:
-                self.all_rsvper_names.append(name)
-
-    def write_table_to_gsheet(self, lottery, sheet_name, table_name):
-        output_columns = [
-            (lottery.PTCPNT_COL_NAME, ''),
-            (lottery.PRIORITY_COL_NAME, lottery.SCORE_COL_NAME)
-        ]
-
-        # Check which of them exist in the DataFrame
+    def merge_flags(lottery) -> pd.Series:
+        """
+        Flags of every participant of the report table joined into one string, e.g. 'AB,multi:B(won)':
+        the other levels attended, and 'multi' with the earlier lotteries entered for a multiple signup.
+        """
+        flags_df = lottery.participant_df[lottery.FLAGS_COL_NAME]
+        level_switch = flags_df['level_switch'].fillna('').astype(str)
+        multi_signup_from = pd.Series('', index=flags_df.index)
+        if 'multi_signup_from' in flags_df:
+            multi_signup_from = flags_df['multi_signup_from'].fillna('').astype(str)
+        multi_signup = ('multi:' + multi_signup_from).where(multi_signup_from != '', 'multi')
+        multi_signup = multi_signup.where(flags_df['multi_signup'].eq(True), '')
+        return (level_switch + ',' + multi_signup).str.strip(',')
+
+    @classmethod
+    def build_report(cls, lottery) -> pd.DataFrame:
+        """
+        The lottery table shared by every output: participant, merged flags, priority score and attendance
+        history of every participant, in lottery order (indexed from 1).
+        """
+        participant_df = lottery.participant_df
         attendance_columns = [
-            col for col in lottery.participant_df.columns
+            col for col in participant_df.columns
             if isinstance(col, tuple) and col[0] == lottery.ATTENDANCE_COL_NAME
         ]
+        report_df = participant_df[
+            [(lottery.PTCPNT_COL_NAME, ''), (lottery.PRIORITY_COL_NAME, lottery.SCORE_COL_NAME)] + attendance_columns
+        ].copy()
+        report_df.insert(1, (lottery.FLAGS_COL_NAME, ''), cls.merge_flags(lottery))
+        return report_df
 
-        output_columns = output_columns + attendance_columns
-
-        output_df = lottery.participant_df[output_columns].copy()
-        flags_col = self.merge_flags(lottery)
-
-        flags_col_name = ('Flags', '')
-        output_df[flags_col_name] = flags_col
-        insert_after_col_name = (lottery.PTCPNT_COL_NAME, '')
-        insert_after = output_columns.index(insert_after_col_name)
-        insert_at = insert_after + 1
-
-        output_columns.insert(insert_at, flags_col_name)
-
-        write_df_to_google_sheet(
-            df=output_df[output_columns],
-            sheet_name=sheet_name,
-            worksheet_title=table_name
+    @staticmethod
+    def describe_seed(seed_sequence: np.random.SeedSequence) -> str:
+        """
+        The seed of a lottery as recorded in the outputs, e.g. 'seed=42 spawn_key=[0]': the lottery is reproduced
+        by np.random.default_rng(np.random.SeedSequence(42, spawn_key=[0])), or by running with --seed 42.
+        """
+        return f'seed={seed_sequence.entropy} spawn_key={list(seed_sequence.spawn_key)}'
+
+    def write_table_to_gsheet(self, report_df, table_name, seed_sequence=None):
+        notes = None
+        if seed_sequence is not None:
+            notes = [['Seed', self.describe_seed(seed_sequence)]]
+        self.sheets_session.add_table(
+            df=report_df,
+            worksheet_title=table_name,
+            notes=notes
         )
 
-    def write_table_to_csv(self, lottery, table_name, csv_filename):
-        # self.logger.info("Writing the lottery participants' statistics to a csv file")
-        output_columns = [
-            (lottery.PTCPNT_COL_NAME, ''),
-            (lottery.PRIORITY_COL_NAME, lottery.SCORE_COL_NAME)
-        ]
-
-        # Check which of them exist in the DataFrame
-        attendance_columns = [
-            col for col in lottery.participant_df.columns
-            if isinstance(col, tuple) and col[0] == lottery.ATTENDANCE_COL_NAME
-        ]
-
-        output_columns = output_columns + attendance_columns
-
-        output_df = lottery.participant_df[output_columns].copy()
-        flags_col = self.merge_flags(lottery)
-
-        flags_col_name = ('Flags', '')
-        output_df[flags_col_name] = flags_col
-        insert_after_col_name = (lottery.PTCPNT_COL_NAME, '')
-        insert_after = output_columns.index(insert_after_col_name)
-        insert_at = insert_after + 1
-
-        output_columns.insert(insert_at, flags_col_name)
-
+    @staticmethod
+    def write_table_to_csv(report_df, table_name, csv_filename):
         with open(csv_filename, "a") as file:
             file.write(f"\n{table_name}\n")
 
-        output_df[output_columns].to_csv(
-            csv_filename, mode='a', header=True, index=True
-        )
-        file.close()
-
-    def write_event_data_to_file(self, server_id, event_id, lottery_list, attendee_list, filename):
+        report_df.to_csv(csv_filename, mode='a', header=True, index=True)
+
+    def write_event_data_to_file(self, server_id, event_id, lottery_list, attendee_list, filename,
+                                 seed_sequence=None):
+        event_data = {
+            'server_id': server_id,
+            'event_id': event_id,
+            'add_to_lottery': InlineList(lottery_list),
+            'add_to_attendee': InlineList(attendee_list),
+        }
+        if seed_sequence is not None:
+            event_data['seed'] = seed_sequence.entropy
+            event_data['spawn_key'] = InlineList(seed_sequence.spawn_key)
         with open(filename, "a") as f:
-            yaml.dump(
-                {
-                    'server_id': server_id,
-                    'event_id': event_id,
-                    'add_to_lottery': InlineList(lottery_list),
-                    'add_to_attendee': InlineList(attendee_list),
-                }, f, sort_keys=False)
+            yaml.dump(event_data, f, sort_keys=False)
             f.write('---\n')  # optional but recommended to separate documents
 
     def upload_attendees_to_sesh_dashboard(self, server_id, event_id, lottery_list, attendee_list):
@@ -323,10 +408,14 @@ if __name__ == "__main__":
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Process a file provided as a command-line argument.")
     parser.add_argument('filename', type=str, help='The path to the file to be processed')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the lotteries, overrides the seed of the yaml file')
 
     # Parse the arguments
     args = parser.parse_args()
     config = process_yaml_file(args.filename)
+    if args.seed is not None:
+        config['seed'] = args.seed
     late_cancel_or_absence = read_spreadsheet_to_df(
         spreadsheet_name='PAPC Clinic No show and late cancel')
 
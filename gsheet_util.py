@@ -1,20 +1,33 @@
+from numbers import Real
+
 import pandas as pd
 import gspread
+from gspread.utils import absolute_range_name
 from gspread_dataframe import get_as_dataframe, set_with_dataframe
 from oauth2client.service_account import ServiceAccountCredentials
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 
 
-def move_file_to_folder(
-        file_id, folder_id,
-        credentials_path="config/papclottery-aabf0d892e93.json"
-    ):
+DEFAULT_CREDENTIALS_PATH = 'config/papclottery-aabf0d892e93.json'
+DEFAULT_FOLDER_ID = '1YoXHGt9cj9121Sk16N0z_efpb75Xh0tC'  # The target folder ID from Drive URL
+
 
+def build_drive_service(credentials_path=DEFAULT_CREDENTIALS_PATH):
     # Set up Drive API
     scopes = ['https://www.googleapis.com/auth/drive']
     creds = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-    drive_service = build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds)
+
+
+def move_file_to_folder(
+        file_id, folder_id,
+        credentials_path=DEFAULT_CREDENTIALS_PATH,
+        drive_service=None
+    ):
+
+    if drive_service is None:
+        drive_service = build_drive_service(credentials_path)
 
     # Retrieve existing parents
     file = drive_service.files().get(fileId=file_id, fields='parents').execute()
@@ -31,6 +44,15 @@ def move_file_to_folder(
     print(f"Moved file {file_id} to folder {folder_id}")
 
 
+def authorize(credentials_path=DEFAULT_CREDENTIALS_PATH):
+    scope = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive"
+    ]
+    credentials = ServiceAccountCredentials.from_json_keyfile_name(credentials_path, scope)
+    return gspread.authorize(credentials)
+
+
 def get_or_create_spreadsheet(client, spreadsheet_name):
     try:
         spreadsheet = client.open(spreadsheet_name)
@@ -101,12 +123,167 @@ def read_spreadsheet_to_df(
         raise
 
 
+def get_cell_value(value):
+    """
+    Representation of a DataFrame value in a USER_ENTERED values request, following gspread_dataframe.
+    """
+    if pd.isnull(value) is True:
+        return ""
+    if isinstance(value, Real):
+        # numpy scalars are not JSON serializable
+        return value.item() if hasattr(value, 'item') else value
+    value = str(value)
+    # a leading apostrophe would be taken as the text escape character
+    return f"'{value}" if value.startswith("'") else value
+
+
+def get_sheet_values(df):
+    """
+    Rows of values of a DataFrame including its header, one header row per level of MultiIndex columns.
+    """
+    num_levels = df.columns.nlevels
+    header = [
+        [get_cell_value(column[level] if num_levels > 1 else column) for column in df.columns]
+        for level in range(num_levels)
+    ]
+    return header + [[get_cell_value(value) for value in row] for row in df.itertuples(index=False, name=None)]
+
+
+class SheetsSession:
+    """
+    Writes all the tables of a run to one Google spreadsheet with a fixed number of requests.
+
+    The client is authorized once and the spreadsheet and its sheet properties are looked up once.
+    Tables added with add_table() are staged locally. commit() then sends them in two requests:
+    one batch_update that adds the missing worksheets, grows small grids and clears the old content,
+    and one values_batch_update that writes every table. The spreadsheet is moved into the folder once.
+    """
+    MIN_ROWS = 1000
+    MIN_COLS = 26
+
+    def __init__(self,
+                 sheet_name,
+                 credentials_path=DEFAULT_CREDENTIALS_PATH,
+                 folder_id=DEFAULT_FOLDER_ID,
+                 client=None,
+                 drive_service=None):
+        """
+        :param sheet_name: name of the Google Sheet (not the file ID), created if it does not exist
+        :param credentials_path: path to the service account JSON credentials
+        :param folder_id: Drive folder the spreadsheet is moved to on commit, None to leave it where it is
+        :param client: authorized gspread client, default: authorized from credentials_path on first use
+        :param drive_service: Drive API service, default: built from credentials_path on first use
+        """
+        self.sheet_name = sheet_name
+        self.credentials_path = credentials_path
+        self.folder_id = folder_id
+        self._client = client
+        self._drive_service = drive_service
+        self._spreadsheet = None
+        self._sheet_properties = None   # worksheet title -> sheet properties
+        self.tables = {}    # worksheet title -> (DataFrame, notes), staged until commit
+        self.moved = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = authorize(self.credentials_path)
+        return self._client
+
+    @property
+    def drive_service(self):
+        if self._drive_service is None:
+            self._drive_service = build_drive_service(self.credentials_path)
+        return self._drive_service
+
+    @property
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = get_or_create_spreadsheet(self.client, self.sheet_name)
+        return self._spreadsheet
+
+    @property
+    def sheet_properties(self) -> dict:
+        if self._sheet_properties is None:
+            metadata = self.spreadsheet.fetch_sheet_metadata()
+            self._sheet_properties = {
+                sheet['properties']['title']: sheet['properties'] for sheet in metadata['sheets']
+            }
+        return self._sheet_properties
+
+    def add_table(self, df, worksheet_title='Sheet1', notes=None):
+        """
+        Stage df to replace the content of worksheet_title on commit. Adding a title again replaces its table.
+
+        :param notes: rows of values written below the table after an empty row, e.g. [['Seed', '...']]
+        """
+        self.tables[worksheet_title] = (df, notes)
+
+    def commit(self):
+        """
+        Write all the staged tables and move the spreadsheet into the folder.
+        """
+        if not self.tables:
+            return
+
+        sheet_properties = self.sheet_properties
+        next_sheet_id = max([properties['sheetId'] for properties in sheet_properties.values()], default=0) + 1
+        requests = []
+        data = []
+        for worksheet_title, (df, notes) in self.tables.items():
+            values = get_sheet_values(df)
+            if notes:
+                values += [['']] + [[get_cell_value(value) for value in row] for row in notes]
+            num_rows, num_cols = len(values), max(len(row) for row in values)
+            properties = sheet_properties.get(worksheet_title)
+            if properties is None:
+                print(f"Worksheet '{worksheet_title}' not found. Creating...")
+                properties = {
+                    'sheetId': next_sheet_id,
+                    'title': worksheet_title,
+                    'gridProperties': {
+                        'rowCount': max(self.MIN_ROWS, num_rows), 'columnCount': max(self.MIN_COLS, num_cols)
+                    }
+                }
+                next_sheet_id += 1
+                requests.append({'addSheet': {'properties': properties}})
+                sheet_properties[worksheet_title] = properties
+            else:
+                grid = properties['gridProperties']
+                if grid['rowCount'] < num_rows or grid['columnCount'] < num_cols:
+                    grid['rowCount'] = max(grid['rowCount'], num_rows)
+                    grid['columnCount'] = max(grid['columnCount'], num_cols)
+                    requests.append({'updateSheetProperties': {
+                        'properties': {'sheetId': properties['sheetId'], 'gridProperties': grid},
+                        'fields': 'gridProperties(rowCount,columnCount)'
+                    }})
+                # Clear existing content
+                requests.append({'updateCells': {
+                    'range': {'sheetId': properties['sheetId']}, 'fields': 'userEnteredValue'
+                }})
+            data.append({'range': absolute_range_name(worksheet_title, 'A1'), 'values': values})
+
+        self.spreadsheet.batch_update({'requests': requests})
+        self.spreadsheet.values_batch_update(body={'valueInputOption': 'USER_ENTERED', 'data': data})
+        print(f"Data written to {self.sheet_name} > {', '.join(self.tables)}")
+        self.tables = {}
+
+        if self.folder_id is not None and not self.moved:
+            move_file_to_folder(
+                file_id=self.spreadsheet.id,
+                folder_id=self.folder_id,
+                drive_service=self.drive_service
+            )
+            self.moved = True
+
+
 def write_df_to_google_sheet(
         df, sheet_name,
         worksheet_title='Sheet1',
-        credentials_path='config/papclottery-aabf0d892e93.json'):
+        credentials_path=DEFAULT_CREDENTIALS_PATH):
     """
-    Writes a pandas DataFrame to a Google Sheet
+    Writes a pandas DataFrame to a Google Sheet.
+    To write several tables, add them to one SheetsSession instead, which writes them all at once.
 
     Args:
         df (pd.DataFrame): The DataFrame to write.
@@ -117,31 +294,9 @@ def write_df_to_google_sheet(
     Returns:
 
     """
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    credentials = ServiceAccountCredentials.from_json_keyfile_name(credentials_path, scope)
-    client = gspread.authorize(credentials)
-
-    # Open the spreadsheet and worksheet
-    # 1️⃣ Create the spreadsheet
-    sheet = get_or_create_spreadsheet(client, sheet_name)
-    worksheet = get_or_create_worksheet(sheet, worksheet_title)
-
-    # Clear existing content
-    worksheet.clear()
-
-    # Write DataFrame to sheet
-    set_with_dataframe(worksheet, df)
-    print(f"Data written to {sheet_name} > {worksheet_title}")
-
-    # 2️⃣ Move it to folder
-    spreadsheet_id = sheet.id
-    move_file_to_folder(
-        file_id=spreadsheet_id,
-        folder_id='1YoXHGt9cj9121Sk16N0z_efpb75Xh0tC',  # The target folder ID from Drive URL
-    )
+    session = SheetsSession(sheet_name, credentials_path=credentials_path)
+    session.add_table(df, worksheet_title)
+    session.commit()
 
 
 def append_df_to_google_sheet(
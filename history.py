@@ -1,23 +1,46 @@
 import datetime
 import pandas as pd
 from sesh import START_DATE, RSVPER_NAMES, EVENT_TYPE, ATTENDEES
+from attendance_matrix import AttendanceMatrix
 
 
 class EventParticipationTracker:
 	PARTICIPANT = 'Participant'
-	HISTORY = 'History'
 
-	def __init__(self, events_df) -> None:
+	def __init__(self, events_df, store=None, ingest_until=None, bulk=False) -> None:
 		"""
 		Initialize the EventEntryTracker with a DataFrame of events.
 
 		:param events_df: 	DataFrame with 'event_name' (name of event), 'start_date' column (date)
 							and 'Attendees' column (list of attendee names).
+		:param store:		optional AttendanceHistoryStore; when given, events are ingested into the
+							persisted store and history lookups are served from it.
+		:param ingest_until: only events before this date are ingested into the store
+		:param bulk:		when True, the first history request buckets every event into its week at once,
+							building the full participant x week matrix in a single pass.
 		"""
 		self.events_df = events_df.copy()
-		df_index = pd.Index([], name=self.PARTICIPANT)
-		self.df = pd.DataFrame(index=df_index)
+		self.event_types = sorted(self.events_df[EVENT_TYPE].dropna().unique())
+		self.matrix = AttendanceMatrix.empty(self.event_types)
 		self.flags = None
+		self.bulk = bulk
+		self._bulk_generated = False
+		self._attended_df = None
+
+		self.store = store
+		if self.store is not None:
+			self.store.ingest(self.events_df, until=ingest_until)
+
+	@property
+	def df(self) -> pd.DataFrame:
+		"""
+		The cached history in the DataFrame representation (lists of event types as cells).
+		"""
+		return self.matrix.to_frame()
+
+	@staticmethod
+	def _get_week_label(date_range) -> str:
+		return f"{date_range[0].date()} to {date_range[-1].date()}"
 
 	@staticmethod
 	def _get_week_date_range(event_date):
@@ -32,33 +55,99 @@ class EventParticipationTracker:
 		week_range = pd.date_range(start=start_of_week, periods=7)
 		return week_range
 
+	@staticmethod
+	def _get_week_labels(event_dates: pd.Series) -> pd.Series:
+		"""
+		Vectorized version of the week label used as history column name, e.g. '2024-10-21 to 2024-10-27'.
+
+		:param event_dates: Series of datetime.date objects
+		:return: Series of week labels (Monday to Sunday) with the same index
+		"""
+		event_dates = pd.to_datetime(event_dates)
+		start_of_week = event_dates - pd.to_timedelta(event_dates.dt.weekday, unit='D')
+		end_of_week = start_of_week + pd.Timedelta(days=6)
+		return start_of_week.dt.strftime('%Y-%m-%d') + ' to ' + end_of_week.dt.strftime('%Y-%m-%d')
+
+	@classmethod
+	def _explode_attendees(cls, events_df, event_keys=None) -> pd.DataFrame:
+		"""
+		Explode the attendee lists of events into one row per (event, attendee).
+
+		:param event_keys: optional Series indexed like events_df, added as an 'event' column
+		:return: DataFrame with columns [START_DATE, EVENT_TYPE, PARTICIPANT] (and 'event'), in the order of events_df
+		"""
+		attendees = events_df[RSVPER_NAMES, ATTENDEES]
+		attendees = attendees[attendees.map(lambda x: isinstance(x, list))]
+		attended_df = pd.DataFrame({
+			START_DATE: events_df.loc[attendees.index, START_DATE],
+			EVENT_TYPE: events_df.loc[attendees.index, EVENT_TYPE],
+			cls.PARTICIPANT: attendees,
+		})
+		if event_keys is not None:
+			attended_df['event'] = event_keys.loc[attendees.index]
+		attended_df = attended_df.explode(cls.PARTICIPANT).dropna(subset=[cls.PARTICIPANT])
+		return attended_df.reset_index(drop=True)
+
+	def _get_attended_df(self) -> pd.DataFrame:
+		"""
+		Long table of (event, attendee) rows with the week label of every event, computed once and cached.
+		"""
+		if self._attended_df is None:
+			attended_df = self._explode_attendees(self.events_df)
+			attended_df['week'] = self._get_week_labels(attended_df[START_DATE])
+			self._attended_df = attended_df
+		return self._attended_df
+
+	def _generate_history_for_weeks(self, week_labels=None) -> None:
+		"""
+		Bucket the events into weeks and add one column per week to the history in a single pass.
+
+		:param week_labels: labels of the weeks to generate, None means every week with events
+		"""
+		attended_df = self._get_attended_df()
+		if week_labels is None:
+			week_labels = attended_df['week'].unique()
+		# weeks without any attendee still get a column, so they are cached as well
+		week_labels = [label for label in dict.fromkeys(week_labels) if label not in self.matrix.weeks]
+		attended_df = attended_df[attended_df['week'].isin(week_labels)]
+
+		matrix = AttendanceMatrix.from_long(
+			participants=attended_df[self.PARTICIPANT],
+			weeks=attended_df['week'],
+			event_types=attended_df[EVENT_TYPE],
+			all_event_types=self.event_types,
+			all_weeks=week_labels
+		)
+		self.matrix = self.matrix.add_weeks(matrix)
+
 	def _generate_history_for_date_range(self, date_range) -> None:
-		# Initialize an empty dictionary to hold attendance records for each attendee
-		attendance_data = {}
-
-		date_range_label = f"{date_range[0].date()} to {date_range[-1].date()}"
-
-		events_in_date_range = self.events_df[
-			(self.events_df[START_DATE] >= date_range[0].date()) &
-			(self.events_df[START_DATE] <= date_range[-1].date())
-			]
-
-		for idx, event in events_in_date_range.iterrows():
-			attendees_in_event = event[RSVPER_NAMES, ATTENDEES]
-			if not isinstance(attendees_in_event, list):
-				continue
-			# Update the attendance data dictionary
-			for attendee in attendees_in_event:
-				if attendee not in attendance_data:
-					attendance_data[attendee] = {}
-				if date_range_label not in attendance_data[attendee]:
-					attendance_data[attendee][date_range_label] = []
-				attendance_data[attendee][date_range_label].append(event[EVENT_TYPE])
-
-		# Convert the attendance data dictionary to a DataFrame
-		df = pd.DataFrame.from_dict(attendance_data, orient='index')
-		self.df = pd.concat([self.df, df], axis=1, join='outer')
-		self.df = self.df[sorted(self.df.columns, reverse=True)]
+		self._generate_history_for_weeks([self._get_week_label(date_range)])
+
+	def _get_week_labels_for_dates(self, dates) -> list:
+		"""
+		Labels of the weeks containing dates, most recent first, generating the weeks that are not cached yet.
+		"""
+		dates = sorted(dates, reverse=True)
+		date_range_labels = [
+			self._get_week_label(self._get_week_date_range(event_date)) for event_date in dates
+		]
+
+		if self.bulk:
+			self.generate_all_weeks()
+
+		missing_labels = [label for label in date_range_labels if label not in self.matrix.weeks]
+		if len(missing_labels) > 0:
+			self._generate_history_for_weeks(missing_labels)
+		return date_range_labels
+
+	def generate_all_weeks(self) -> None:
+		"""
+		Build the history of every week with events up front, e.g. before sharing the tracker with worker
+		processes, so that later history requests only read the matrix.
+		"""
+		if not self._bulk_generated:
+			self._generate_history_for_weeks()
+			self._bulk_generated = True
 
 	def _generate_history(self, dates) -> pd.DataFrame:
 		"""
@@ -66,41 +155,24 @@ class EventParticipationTracker:
 
 		:return: DataFrame where rows are attendees, columns are weekly attendance (True/False).
 		"""
+		week_labels = self._get_week_labels_for_dates(dates)
+		return self.matrix.select(weeks=week_labels).to_frame()
 
-		dates = sorted(dates, reverse=True)
-		date_range_labels = []
-
-		for event_date in dates:
-			date_range = self._get_week_date_range(event_date)
-			date_range_label = f"{date_range[0].date()} to {date_range[-1].date()}"
-			date_range_labels.append(date_range_label)
-
-			if date_range_label not in self.df.columns:
-				self._generate_history_for_date_range(date_range)
+	def get_history_matrix(self, dates, attendee_names) -> AttendanceMatrix:
+		"""
+		Get the attendance history of attendee_names for the weeks containing dates.
 
-		attendance_df = self.df[date_range_labels].copy()
-		return attendance_df
+		:return: AttendanceMatrix where rows are attendees and columns are weeks (most recent first).
+		"""
+		if self.store is not None:
+			return self.store.get_history_matrix(dates, attendee_names)
+		week_labels = self._get_week_labels_for_dates(dates)
+		return self.matrix.select(participants=attendee_names, weeks=week_labels)
 
 	def get_history(self, dates, attendee_names):
 		"""
 		Get the attendance history DataFrame.
 
-		:return: DataFrame where rows are attendees, columns are weekly attendance (True/False).
+		:return: DataFrame where rows are attendees, columns are weekly attendance (lists of event types).
 		"""
-		df = self._generate_history(dates)
-		df.columns = pd.MultiIndex.from_product([[self.HISTORY], df.columns])
-		return self._get_small_df(df, attendee_names)
-
-	@classmethod
-	def _get_small_df(cls, attendance_df, attendee_names):
-		# Identify any missing attendees and add them with default (False) attendance records
-		existing_attendees = set(attendance_df.index)
-		missing_attendees = list(set(attendee_names) - existing_attendees)
-
-		# Filter the attendance_df to include only specified attendee names
-		attendance_df = attendance_df[attendance_df.index.isin(attendee_names)]
-
-		# Create a DataFrame for missing attendees with all attendance as empty list
-		# Reindex the DataFrame with the new indices
-		attendance_df = attendance_df.reindex(attendance_df.index.tolist() + missing_attendees)
-		return attendance_df[cls.HISTORY]
+		return self.get_history_matrix(dates, attendee_names).to_frame()
@@ -0,0 +1,169 @@
+import datetime
+import logging
+import sqlite3
+
+import pandas as pd
+from sesh import START_DATE, EVENT_TYPE, EVENT_NAME, RSVPER_LINK
+from history import EventParticipationTracker
+from attendance_matrix import AttendanceMatrix
+
+
+class AttendanceHistoryStore:
+	"""
+	Attendance history persisted on local disk in a SQLite database.
+
+	Each row of the attendance table records one participant attending one event (keyed by its Sesh link),
+	together with the label of the week (Monday to Sunday) the event took place in. A high-water mark records
+	the date of the newest event ingested, so each run only ingests events newer than it, plus the events of
+	the last reingest_days before it: their rows are replaced, so events entered in Sesh after the fact
+	(e.g. a second clinic on the same day) and changed RSVPs are picked up by the next run.
+	"""
+	HIGH_WATER_MARK = 'high_water_mark'
+
+	def __init__(self, db_filename: str, reingest_days: int = 14) -> None:
+		"""
+		:param db_filename: path of the SQLite database file, created if it does not exist
+		:param reingest_days: 	the events dated up to this many days before the high-water mark are ingested
+								again on every run
+		"""
+		self.logger = logging.getLogger(self.__class__.__name__)
+		self.db_filename = db_filename
+		self.reingest_days = reingest_days
+		self.connection = sqlite3.connect(db_filename)
+		with self.connection:
+			columns = [row[1] for row in self.connection.execute("PRAGMA table_info(attendance)")]
+			if columns and 'event' not in columns:
+				# rows of an older store cannot be matched to their events, start over from the export
+				self.logger.warning(f'Rebuilding {db_filename}: its attendance rows have no event key')
+				self.connection.execute("DROP TABLE attendance")
+				self.connection.execute("DROP TABLE IF EXISTS meta")
+			self.connection.execute("""
+				CREATE TABLE IF NOT EXISTS attendance (
+					event TEXT NOT NULL,
+					week TEXT NOT NULL,
+					participant TEXT NOT NULL,
+					event_type TEXT NOT NULL,
+					start_date TEXT NOT NULL
+				)""")
+			self.connection.execute(
+				"CREATE INDEX IF NOT EXISTS attendance_week_participant ON attendance (week, participant)")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS attendance_event ON attendance (event)")
+			self.connection.execute(
+				"CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+	def close(self) -> None:
+		self.connection.close()
+
+	@property
+	def high_water_mark(self):
+		"""
+		:return: datetime.date of the newest ingested event, or None if nothing has been ingested yet
+		"""
+		row = self.connection.execute(
+			"SELECT value FROM meta WHERE key = ?", (self.HIGH_WATER_MARK,)).fetchone()
+		return None if row is None else datetime.date.fromisoformat(row[0])
+
+	@staticmethod
+	def get_event_keys(events_df: pd.DataFrame) -> pd.Series:
+		"""
+		Key of every event of events_df: its Sesh link, or its date, type and name if it has no link.
+
+		:return: Series of strings indexed like events_df
+		"""
+		keys = events_df[START_DATE].astype(str) + '|' + events_df[EVENT_TYPE].astype(str)
+		if EVENT_NAME in events_df:
+			keys += '|' + events_df[EVENT_NAME].astype(str)
+		if RSVPER_LINK in events_df:
+			keys = events_df[RSVPER_LINK].where(events_df[RSVPER_LINK].notna(), keys)
+		return keys
+
+	def ingest(self, events_df: pd.DataFrame, until=None) -> int:
+		"""
+		Add the attendance of events dated after the high-water mark to the store, and replace the attendance
+		of the events dated up to reingest_days before it.
+
+		:param events_df: DataFrame of events as returned by SeshData.get_clinic_events()
+		:param until: 	only ingest events before this date (events in the lottery week are not final yet),
+						None means every event in events_df is final
+		:return: number of attendance rows written
+		"""
+		if isinstance(until, datetime.datetime):
+			until = until.date()
+
+		high_water_mark = self.high_water_mark
+		event_dates = events_df[START_DATE]
+		is_new = event_dates.notna()
+		if high_water_mark is not None:
+			is_new &= event_dates > high_water_mark - datetime.timedelta(days=self.reingest_days)
+		if until is not None:
+			is_new &= event_dates < until
+		new_events_df = events_df[is_new]
+		event_keys = self.get_event_keys(new_events_df)
+
+		attended_df = EventParticipationTracker._explode_attendees(new_events_df, event_keys=event_keys)
+		attended_df['week'] = EventParticipationTracker._get_week_labels(attended_df[START_DATE])
+		rows = zip(
+			attended_df['event'],
+			attended_df['week'],
+			attended_df[EventParticipationTracker.PARTICIPANT],
+			attended_df[EVENT_TYPE],
+			attended_df[START_DATE].map(datetime.date.isoformat),
+		)
+
+		# the mark only moves up to the newest event actually ingested, not to until: events before until
+		# that are not in events_df yet (e.g. added to Sesh late) are still ingested by the next run
+		if len(new_events_df) > 0:
+			new_high_water_mark = new_events_df[START_DATE].max()
+		else:
+			new_high_water_mark = high_water_mark
+
+		with self.connection:
+			# the attendance of an event is replaced as a whole, dropping the participants no longer attending
+			self.connection.executemany(
+				"DELETE FROM attendance WHERE event = ?", ((event_key,) for event_key in event_keys.unique()))
+			self.connection.executemany(
+				"INSERT INTO attendance (event, week, participant, event_type, start_date) VALUES (?, ?, ?, ?, ?)",
+				rows)
+			if new_high_water_mark is not None:
+				self.connection.execute(
+					"INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+					(self.HIGH_WATER_MARK, new_high_water_mark.isoformat()))
+
+		self.logger.info(
+			f'Ingested {len(attended_df)} attendance records of {len(new_events_df)} events '
+			f'into {self.db_filename} (high-water mark: {new_high_water_mark})')
+		return len(attended_df)
+
+	def get_history_matrix(self, dates, attendee_names) -> AttendanceMatrix:
+		"""
+		Get the attendance history of attendee_names for the weeks containing dates.
+
+		:return: AttendanceMatrix where rows are attendees and columns are weeks (most recent first).
+		"""
+		week_labels = list(dict.fromkeys(
+			EventParticipationTracker._get_week_labels(pd.Series(sorted(dates, reverse=True), dtype=object))))
+		attendee_names = pd.Index(attendee_names).unique()
+
+		placeholders = ','.join('?' * len(week_labels))
+		attended_df = pd.read_sql_query(
+			f"SELECT participant, week, event_type FROM attendance WHERE week IN ({placeholders})",
+			self.connection,
+			params=week_labels)
+		attended_df = attended_df[attended_df['participant'].isin(attendee_names)]
+
+		return AttendanceMatrix.from_long(
+			participants=attended_df['participant'],
+			weeks=attended_df['week'],
+			event_types=attended_df['event_type'],
+			all_participants=attendee_names,
+			all_weeks=week_labels
+		)
+
+	def get_history(self, dates, attendee_names) -> pd.DataFrame:
+		"""
+		Get the attendance history of attendee_names for the weeks containing dates.
+
+		:return: 	DataFrame where rows are attendees, columns are weeks (most recent first)
+					and cells are lists of attended event types (NaN if none).
+		"""
+		return self.get_history_matrix(dates, attendee_names).to_frame()
@@ -41,13 +41,14 @@ def configure_logging():
     logger.addHandler(handler)
 
 
-def log_dataframe_info(df: pd.DataFrame, df_name: str = "DataFrame"):
+def log_dataframe_info(df: pd.DataFrame, df_name: str = "DataFrame", elapsed_seconds: float = None):
     """
     Logs the shape and column names of a DataFrame, dynamically reflecting the caller's class name.
 
     Args:
         df (pd.DataFrame): The DataFrame to log information about.
         df_name (str): Name of the DataFrame for logging.
+        elapsed_seconds (float): Optional time it took to load the DataFrame.
     """
     # Dynamically get the caller's class name
     frame = inspect.currentframe().f_back
@@ -58,4 +59,5 @@ def log_dataframe_info(df: pd.DataFrame, df_name: str = "DataFrame"):
 
     logger.info(f"{df_name} shape: {df.shape}")
     logger.info(f"{df_name} columns: {list(df.columns)}")
-
+    if elapsed_seconds is not None:
+        logger.info(f"{df_name} loaded in {elapsed_seconds:.3f} s")
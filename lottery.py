@@ -2,6 +2,55 @@ import pandas as pd
 import numpy as np
 import logging
 from sesh import ATTENDEES, WAITLIST
+from attendance_matrix import AttendanceMatrix
+from participant_registry import ParticipantRegistry
+
+
+class LotteryResult:
+	"""
+	Outcome of a lottery: the ranked names, groups and scores as arrays, in lottery order.
+
+	The wide report DataFrame (participant_df) is only assembled on first access and then cached,
+	so callers that only need the names never build it.
+
+	result = lottery.get_result()
+	result.names							# ['Alice', 'Bob', ...], attendees then waitlist
+	result.get_names(ATTENDEES)				# ['Alice', ...]
+	result.participant_df					# the report table, built now
+	"""
+	def __init__(self, names, groups, scores, build_participant_df) -> None:
+		"""
+		:param names: participant names in lottery order
+		:param groups: ATTENDEES or WAITLIST for every name, None if no attendees were selected
+		:param scores: priority scores in lottery order
+		:param build_participant_df: function of this result returning the report DataFrame
+		"""
+		self.names = names
+		self.groups = groups
+		self.scores = scores
+		self._build_participant_df = build_participant_df
+		self._participant_df = None
+
+	def get_names(self, group=None) -> list:
+		"""
+		:param group: ATTENDEES or WAITLIST, None for everyone
+		"""
+		if group is None:
+			return self.names.tolist()
+		return self.names[self.groups == group].tolist()
+
+	@property
+	def participant_df(self) -> pd.DataFrame:
+		if self._participant_df is None:
+			self._participant_df = self._build_participant_df(self)
+		return self._participant_df
+
+	@participant_df.setter
+	def participant_df(self, participant_df):
+		self._participant_df = participant_df
+
+	def __len__(self) -> int:
+		return len(self.names)
 
 
 class Lottery:
@@ -12,11 +61,16 @@ class Lottery:
 	FLAGS_COL_NAME = 'Flags'
 	ATTENDANCE_COL_NAME = 'Attendance'
 
+	# fixed scores given to deprioritized participants, placing them behind everyone else
+	EXCLUDED_PRIORITY = 200
+	MULTI_SIGNUP_PRIORITY = 100
+
 	def __init__(
 			self,
 			event_type: str,
-			attendance_df: pd.DataFrame,
-			max_num_attendees: int
+			attendance_df,
+			max_num_attendees: int,
+			rng=None
 	) -> None:
 		"""
 		Computes a priority score for each participant based on his/her attendance
@@ -24,8 +78,11 @@ class Lottery:
 		Flags individuals who are signing up for multiple lotteries and changing their levels
 
 		:param event_type: string representing the type of event, such as "Clinic-AB"
-		:param attendance_df: DataFrame with attendees as rows and weekly attendance as columns (True/False).
+		:param attendance_df: 	AttendanceMatrix, or DataFrame with attendees as rows, weekly attendance as columns
+								and lists of attended event types as cells.
 		:param max_num_attendees: int representing the maximum number of attendees
+		:param rng: numpy.random.Generator drawing the randomization of the priority scores,
+					default: the global NumPy random state
 		"""
 
 		self.logger = logging.getLogger(self.__class__.__name__)
@@ -33,15 +90,32 @@ class Lottery:
 		# filter attendance_df based on person_names
 		self.event_type = event_type
 		self.max_num_attendees = max_num_attendees
+		self.rng = rng if rng is not None else np.random
 
 		self.priority_df = None  # This will store the DataFrame with priority scores
 		self.flags_df = None
+		self.attendee_positions = None  # rows of priority_df of the attendees, by ascending score
+		self.waitlist_positions = None  # rows of priority_df of the waitlist, unsorted
+
+		if isinstance(attendance_df, AttendanceMatrix):
+			self.attendance = attendance_df
+			self._attendance_df = None
+		else:
+			self.attendance = AttendanceMatrix.from_frame(attendance_df)
+			self._attendance_df = attendance_df
+		self.num_participants = self.attendance.shape[0]
+		self.num_past_events = self.attendance.shape[1]
 
-		self.attendance_df = attendance_df
-		self.num_participants = self.attendance_df.shape[0]
-		self.num_past_events = self.attendance_df.shape[1]
+		self._result = None
 
-		self.participant_df = None
+	@property
+	def attendance_df(self) -> pd.DataFrame:
+		"""
+		Attendance history in the DataFrame representation, only materialized when needed for the report.
+		"""
+		if self._attendance_df is None:
+			self._attendance_df = self.attendance.to_frame()
+		return self._attendance_df
 
 	def compute_priority(self):
 		"""
@@ -53,104 +127,210 @@ class Lottery:
 		- 	Adds a small random number between 0 and 1 to each score to randomize attendees with similar scores.
 		- 	Creates a new DataFrame (priority_df) to store each attendee's priority score, sorted in ascending order.
 		"""
-		# Weighted sum of attendance (True counts as 1, False counts as 0) across columns to get the attendance score
-		# Lower scores mean higher priority
-		bool_attendance_df = self.attendance_df.map(lambda x: len(x) > 0 if isinstance(x, list) else 0)
-		max_weight = 2 ** (self.num_past_events - 1)
-		weights = [max_weight * (0.5 ** col_idx) for col_idx in range(self.num_past_events)]
+		priority_df = self.get_priority_df(self.compute_priority_scores())
+		priority_df.sort_values(by=self.SCORE_COL_NAME, ascending=True, inplace=True)
+		return priority_df
 
-		score = (bool_attendance_df * weights).sum(axis=1)
+	def compute_priority_scores(self) -> np.ndarray:
+		"""
+		Randomized priority scores in the order of the participants of the attendance history, see compute_priority().
+		"""
+		# Weighted sum of attendance (1 if the participant attended any event that week, 0 otherwise)
+		# across columns to get the attendance score, computed as a single matrix-vector product.
+		# Lower scores mean higher priority
+		score = self.attendance.attended() @ self.get_attendance_weights(self.num_past_events)
 
 		# Add a small random number between 0 and 1 to each score for randomization among similar scores
-		randomized_score = score + np.random.uniform(0, 1, size=self.num_participants)
+		return score + self.rng.uniform(0, 1, size=self.num_participants)
 
-		# Create a new DataFrame with priority scores
-		priority_df = pd.DataFrame({
-			self.PTCPNT_COL_NAME: self.attendance_df.index,
-			self.SCORE_COL_NAME: randomized_score
+	def get_priority_df(self, scores) -> pd.DataFrame:
+		return pd.DataFrame({
+			self.PTCPNT_COL_NAME: self.attendance.participants,
+			self.SCORE_COL_NAME: scores
 		}).set_index(self.PTCPNT_COL_NAME)
-		priority_df.sort_values(by=self.SCORE_COL_NAME, ascending=True, inplace=True)
-		return priority_df
 
-	def compute_flags(self, all_participants):
-		# Create a new DataFrame with the same index
-		flags_df = pd.DataFrame(index=self.priority_df.index)
+	@staticmethod
+	def get_attendance_weights(num_past_events: int, base: float = 2.0) -> np.ndarray:
+		"""
+		Weights for each week of history, most recent week first: 2^(n-1), 2^(n-2), ..., 1.
 
-		flags_df['level_switch'] = None
-		flags_df['multi_signup'] = False
+		:param base: decay base of the weights, only changed to simulate other weightings
+		"""
+		return np.power(float(base), np.arange(num_past_events - 1, -1, -1, dtype=np.float64))
 
-		# todo: need to update the algorithm to only check the last two sessions
-		for name, row in flags_df.iterrows():
-			flags_df.loc[name, 'level_switch'] = ','.join(
-				self.get_diff_event_types(self.event_type, self.attendance_df.loc[name])
-			)
-			if name in all_participants:
-				flags_df.loc[name, 'multi_signup'] = True
+	def compute_flags(self, all_participants, num_recent_sessions=None):
+		"""
+		Flag participants who attended other event types (level_switch) or who signed up for
+		an earlier lottery (multi_signup).
+
+		:param all_participants: 	names of participants of the lotteries that ran before this one, a
+									ParticipantRegistry also tells which earlier lotteries they entered and won
+		:param num_recent_sessions: only look at the most recent n sessions when computing level_switch,
+									None means the whole attendance history
+		:return: 	DataFrame indexed like priority_df with columns ['level_switch', 'multi_signup', 'multi_signup_from'],
+					multi_signup_from lists the earlier lotteries, e.g. 'B(won),AB' (empty without a registry)
+		"""
+		# bitmask of the other event types each participant attended in the recent sessions
+		attended_masks = self.attendance.union(num_recent_sessions)
+		attended_masks &= ~attended_masks.dtype.type(self.attendance.get_bit(self.event_type))
+
+		# format each distinct bitmask once
+		unique_masks, inverse = np.unique(attended_masks, return_inverse=True)
+		unique_level_switches = np.array([
+			','.join(sorted({self.shorten_event_type(event_type) for event_type in event_types}))
+			for event_types in self.attendance.decode(unique_masks, missing=[])
+		], dtype=object)
+		level_switch = pd.Series(unique_level_switches[inverse], index=self.attendance.participants, dtype=object)
+
+		flags_df = pd.DataFrame(index=self.priority_df.index)
+		flags_df['level_switch'] = level_switch.reindex(flags_df.index)
+		flags_df['multi_signup'] = flags_df.index.isin(all_participants)
+		flags_df['multi_signup_from'] = ''
+		if isinstance(all_participants, ParticipantRegistry):
+			flags_df['multi_signup_from'] = [
+				','.join(
+					self.shorten_event_type(lottery_name)
+					+ ('(won)' if lottery_name in all_participants.get_won(name) else '')
+					for lottery_name in all_participants.get_entered(name)
+				)
+				for name in flags_df.index
+			]
 		return flags_df
 
-	def get_participant_df(self):
-		self.participant_df = pd.concat(
+	def get_result(self) -> LotteryResult:
+		"""
+		Ranking of the lottery, computed once per selection, see LotteryResult.
+		"""
+		if self._result is None and self.priority_df is not None:
+			order = self.get_order()
+			groups = None
+			if self.attendee_positions is not None:
+				groups = np.where(np.arange(len(order)) < len(self.attendee_positions), ATTENDEES, WAITLIST)
+			self._result = LotteryResult(
+				names=self.priority_df.index.to_numpy()[order],
+				groups=groups,
+				scores=self.priority_df[self.SCORE_COL_NAME].to_numpy()[order],
+				build_participant_df=self.get_participant_df
+			)
+		return self._result
+
+	@property
+	def participant_df(self) -> pd.DataFrame:
+		"""
+		The wide table of the report (flags, priority score and attendance history of every participant, in lottery
+		order), only built when first needed.
+		"""
+		result = self.get_result()
+		if result is None or self.flags_df is None:
+			return None
+		return result.participant_df
+
+	@participant_df.setter
+	def participant_df(self, participant_df):
+		self.get_result().participant_df = participant_df
+
+	def get_order(self) -> np.ndarray:
+		"""
+		Rows of priority_df in lottery order: the attendees then the waitlist, each by ascending score.
+		"""
+		scores = self.priority_df[self.SCORE_COL_NAME].to_numpy()
+		if self.attendee_positions is None:
+			return np.argsort(scores, kind='stable')
+		waitlist_positions = self.waitlist_positions[np.argsort(scores[self.waitlist_positions], kind='stable')]
+		return np.concatenate([self.attendee_positions, waitlist_positions])
+
+	def get_participant_df(self, result: LotteryResult = None) -> pd.DataFrame:
+		if result is None:
+			result = self.get_result()
+		participant_df = pd.concat(
 			[self.flags_df, self.priority_df, self.attendance_df],
 			axis=1,
 			keys=[self.FLAGS_COL_NAME, self.PRIORITY_COL_NAME, self.ATTENDANCE_COL_NAME])
-
-		self.participant_df.sort_values(
-			by=(self.PRIORITY_COL_NAME, self.SCORE_COL_NAME),
-			ascending=True,
-			inplace=True)
+		participant_df = participant_df.reindex(result.names)
 
 		# Set a new integer index
-		self.participant_df = self.participant_df.reset_index()
-		self.participant_df.index = pd.RangeIndex(start=1, stop=len(self.participant_df) + 1, step=1)
-		self.participant_df.rename(columns={'index': self.PTCPNT_COL_NAME}, inplace=True)
+		participant_df = participant_df.reset_index()
+		participant_df.index = pd.RangeIndex(start=1, stop=len(participant_df) + 1, step=1)
+		participant_df.rename(columns={'index': self.PTCPNT_COL_NAME}, inplace=True)
 
-	def select_and_sort_attendees(self, exclude_from_lottery, all_participants):
-		self.priority_df = self.compute_priority()
-		self.flags_df = self.compute_flags(all_participants)
-		self.deprioritize_participants(exclude_from_lottery, 200)
-		self.deprioritize_participants(all_participants, 100)
+		if result.groups is not None:
+			participant_df[self.GROUP_COL_NAME] = result.groups.astype(object)
+		return participant_df
 
-		self.get_participant_df()
+	def select_and_sort_attendees(self, exclude_from_lottery, all_participants, num_recent_sessions=None):
+		# scores stay in the order of the attendance history, only the attendees are sorted
+		self.priority_df = self.get_priority_df(self.compute_priority_scores())
+		self.flags_df = self.compute_flags(all_participants, num_recent_sessions=num_recent_sessions)
+		self.deprioritize_participants([
+			(exclude_from_lottery, self.EXCLUDED_PRIORITY),
+			(all_participants, self.MULTI_SIGNUP_PRIORITY),
+		])
 		self.select_attendees_and_waitlist(num_participants=self.max_num_attendees)
 
 	def select_attendees_and_waitlist(self, num_participants: int):
 		"""
-		Selects the top num_winners participants based on priority score and returns their names
-		as the lottery attendees and put the rest of the participants on a waitlist.
+		Selects the top num_participants participants based on priority score as the lottery attendees
+		and puts the rest of the participants on a waitlist.
+
+		The attendees are picked with a partial sort (np.argpartition) and only they are sorted,
+		see get_attendees() and get_waitlist().
 
 		:param num_participants: Number of winners to select.
-		:return: List of names of lottery winners.
 		"""
+		scores = self.priority_df[self.SCORE_COL_NAME].to_numpy()
+		num_attendees = min(max(num_participants, 0), len(scores))
+		if 0 < num_attendees < len(scores):
+			positions = np.argpartition(scores, num_attendees - 1)
+		else:
+			positions = np.arange(len(scores))
+		attendee_positions = positions[:num_attendees]
+		self.attendee_positions = attendee_positions[np.argsort(scores[attendee_positions], kind='stable')]
+		self.waitlist_positions = positions[num_attendees:]
+		# the ranking and the report table are rebuilt with the new groups when needed
+		self._result = None
+
+	def get_attendees(self) -> list:
+		"""
+		:return: names of the lottery attendees, by ascending priority score
+		"""
+		return self.priority_df.index[self.attendee_positions].tolist()
 
-		self.participant_df[self.GROUP_COL_NAME] = [
-			ATTENDEES if i <= num_participants else WAITLIST
-			for i in range(1, len(self.participant_df) + 1)
-		]
+	def get_waitlist(self, num_visible=None) -> list:
+		"""
+		:param num_visible: only return (and sort) the first num_visible participants of the waitlist
+		:return: names of the waitlist, by ascending priority score
+		"""
+		scores = self.priority_df[self.SCORE_COL_NAME].to_numpy()
+		positions = self.waitlist_positions
+		if num_visible is not None and num_visible < len(positions):
+			if num_visible <= 0:
+				return []
+			positions = positions[np.argpartition(scores[positions], num_visible - 1)[:num_visible]]
+		positions = positions[np.argsort(scores[positions], kind='stable')]
+		return self.priority_df.index[positions].tolist()
 
 	def get_attendee_list(self):
-		return self.participant_df[self.PTCPNT_COL_NAME].tolist()
+		return self.get_result().get_names()
 
-	def deprioritize_participants(self, participants, priority):
-		if len(participants) == 0:
+	def deprioritize_participants(self, tiers):
+		"""
+		Overwrite the priority score of every participant found in a tier with the tier's fixed score.
+
+		All tiers are applied in one vectorized pass. When a participant belongs to several tiers,
+		the last matching tier wins.
+
+		:param tiers: list of (participants, priority) pairs, e.g. [(excluded, 200), (multi_signup, 100)]
+		"""
+		tiers = [(participants, priority) for participants, priority in tiers if len(participants) > 0]
+		if len(tiers) == 0:
 			return
-		event_participants = self.priority_df.index.tolist()
-		for participant in event_participants:
-			if participant in participants:
-				self.priority_df.loc[participant] = priority
+		participant_index = self.priority_df.index
+		conditions = [participant_index.isin(participants) for participants, _ in reversed(tiers)]
+		priorities = [priority for _, priority in reversed(tiers)]
+		scores = self.priority_df[self.SCORE_COL_NAME].to_numpy()
+		self.priority_df[self.SCORE_COL_NAME] = np.select(conditions, priorities, default=scores)
+		self._result = None
 
 	@staticmethod
 	def shorten_event_type(event_type):
 		return event_type.split('-', maxsplit=1)[1]
-
-	def get_diff_event_types(self, event_type, row):
-		# todo: this would need to be handled in clinic_lottery.py since different events
-		#  needs different ways of handling
-		row = row.dropna()
-		attended_event_types = [item for cell in row for item in (cell if isinstance(cell, list) else [cell])]
-		flattened_values = set([
-			self.shorten_event_type(attended_event_type) for attended_event_type in attended_event_types
-			if attended_event_type != event_type
-		])
-
-		flattened_values = list(flattened_values)
-		return flattened_values
@@ -0,0 +1,230 @@
+"""
+Replay the clinic lotteries week by week over the exported history, feeding every week's simulated winners back
+into the attendance history of the next weeks, to measure how changes to the Lottery scoring or to
+exclude_from_lottery affect how often the same people win.
+
+Usage:
+	python lottery_replay.py <yaml_filename> [--weeks N] [--start-date YYYY-MM-DD] [--seed S]
+							 [--exclude NAME [NAME ...]] [--output <csv>]
+"""
+import argparse
+import collections
+import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+
+from attendance_matrix import AttendanceMatrix
+from clinic_lottery import ClinicLottery, process_yaml_file
+from history import EventParticipationTracker
+from lottery import Lottery
+from participant_registry import ParticipantRegistry
+from sesh import START_DATE, EVENT_TYPE, RSVPER_NAMES, LOTTERY, ATTENDEES, WAITLIST
+from sesh_util import convert_date_str_to_obj
+from logging_config import configure_logging
+
+
+class LotteryReplay:
+	WEEK = 'week'
+	NUM_ENTRANTS = 'entrants'
+	NUM_WINNERS = 'winners'
+	NUM_REPEAT_WINNERS = 'repeat winners'
+
+	def __init__(
+			self,
+			clinic_events: pd.DataFrame,
+			event_configs: dict,
+			exclude_from_lottery=(),
+			attendance_tracker=None,
+			lottery_class=Lottery
+	) -> None:
+		"""
+		The entrants of every replayed event are the people who signed up for it in the export
+		(lottery, attendees and waitlist), the winners are drawn again by lottery_class.
+
+		:param clinic_events: clinic events, see ClinicLottery.load_clinic_events()
+		:param event_configs: lottery settings per event type, the 'events' section of the yaml configuration,
+							  events of other types are not replayed
+		:param exclude_from_lottery: participants excluded from every lottery
+		:param attendance_tracker: EventParticipationTracker of clinic_events providing the real attendance history
+								   before the replay, default: built from clinic_events
+		:param lottery_class: Lottery or a subclass with a different scoring, taking the same arguments
+		"""
+		self.logger = logging.getLogger(self.__class__.__name__)
+		self.clinic_events = clinic_events[clinic_events[EVENT_TYPE].isin(list(event_configs))]
+		self.event_configs = event_configs
+		self.exclude_from_lottery = list(exclude_from_lottery)
+		if attendance_tracker is None:
+			attendance_tracker = EventParticipationTracker(clinic_events, bulk=True)
+		self.attendance_tracker = attendance_tracker
+		self.lottery_class = lottery_class
+
+		# number of weeks of history kept in the rolling matrix, enough for every event type
+		self.num_weeks = max(
+			event_config['attendance_history']['num_past_sessions'] for event_config in event_configs.values()
+		)
+		self.matrix = None
+		self.wins = collections.Counter()
+		self.entrants = set()
+
+	@staticmethod
+	def get_entrants(lottery_event) -> list:
+		"""
+		Everyone who signed up for the event, in order of the lottery list, attendees and waitlist.
+		"""
+		entrants = []
+		for key in (LOTTERY, ATTENDEES, WAITLIST):
+			names = lottery_event.get((RSVPER_NAMES, key))
+			if isinstance(names, list):
+				entrants.extend(names)
+		return list(dict.fromkeys(entrants))
+
+	@staticmethod
+	def get_week_label(date) -> str:
+		return EventParticipationTracker._get_week_label(EventParticipationTracker._get_week_date_range(date))
+
+	def get_initial_history(self, start_date: datetime.date, participants) -> AttendanceMatrix:
+		"""
+		Real attendance history of participants for the num_weeks weeks before start_date, most recent first.
+		"""
+		dates = [start_date - datetime.timedelta(weeks=i) for i in range(1, self.num_weeks + 1)]
+		return self.attendance_tracker.get_history_matrix(dates=dates, attendee_names=participants)
+
+	def run(
+			self,
+			start_date: datetime.date,
+			num_weeks: int = 52,
+			recurring_interval_in_days: datetime.timedelta = datetime.timedelta(7),
+			seed=None
+	) -> pd.DataFrame:
+		"""
+		Replay the lotteries of num_weeks consecutive weeks from start_date.
+
+		Every week, the history of an event is the most recent num_past_sessions weeks of the rolling matrix,
+		which holds the real attendance before start_date and the simulated winners from then on.
+		After the lotteries of a week, its winners are added as the most recent week and the oldest week is dropped.
+
+		:param seed: seed of the replay, every week and lottery draws from its own generator spawned from it,
+					 None for fresh entropy
+		:return: DataFrame with one row per replayed event: week, event type, event date, number of entrants,
+				 winners, and repeat winners (winners who also won a clinic the week before)
+		"""
+		week_seed_sequences = np.random.SeedSequence(seed).spawn(num_weeks)
+		week_starts = [start_date + i * recurring_interval_in_days for i in range(num_weeks)]
+		end_date = start_date + num_weeks * recurring_interval_in_days
+		replayed_events = self.clinic_events[
+			(self.clinic_events[START_DATE] >= start_date) & (self.clinic_events[START_DATE] < end_date)]
+		participants = pd.unique(np.asarray(
+			[name for _, event in replayed_events.iterrows() for name in self.get_entrants(event)], dtype=object))
+
+		self.matrix = self.get_initial_history(start_date, participants)
+		self.wins = collections.Counter()
+		self.entrants = set()
+		results = []
+		for week_start, week_seed_sequence in zip(week_starts, week_seed_sequences):
+			lottery_events = ClinicLottery.select_lottery_events(
+				replayed_events, self.event_configs, week_start, recurring_interval_in_days)
+			event_seed_sequences = week_seed_sequence.spawn(len(lottery_events))
+
+			participant_registry = ParticipantRegistry()
+			winners, winner_event_types = [], []
+			for (_, lottery_event), event_seed_sequence in zip(lottery_events.iterrows(), event_seed_sequences):
+				event_type = lottery_event[EVENT_TYPE]
+				entrants = self.get_entrants(lottery_event)
+				if len(entrants) == 0:
+					continue
+				history = self.matrix.select(
+					participants=entrants, weeks=self.matrix.weeks[:lottery_event['num_past_sessions']])
+
+				lottery = self.lottery_class(
+					event_type=event_type,
+					attendance_df=history,
+					max_num_attendees=lottery_event['max_attendee_count'],
+					rng=np.random.default_rng(event_seed_sequence)
+				)
+				lottery.select_and_sort_attendees(
+					exclude_from_lottery=self.exclude_from_lottery,
+					all_participants=participant_registry,
+					num_recent_sessions=lottery_event['level_switch_sessions'])
+				event_winners = lottery.get_attendees()
+
+				# winners who won any clinic in the previous week
+				last_week = self.matrix.select(participants=event_winners, weeks=self.matrix.weeks[:1])
+				results.append({
+					self.WEEK: self.get_week_label(week_start),
+					EVENT_TYPE: event_type,
+					START_DATE: lottery_event[START_DATE],
+					self.NUM_ENTRANTS: len(entrants),
+					self.NUM_WINNERS: len(event_winners),
+					self.NUM_REPEAT_WINNERS: int(last_week.attended().sum()),
+				})
+
+				participant_registry.register(event_type, entrants=entrants, winners=event_winners)
+				winners.extend(event_winners)
+				winner_event_types.extend([event_type] * len(event_winners))
+				self.wins.update(event_winners)
+				self.entrants.update(entrants)
+
+			self.matrix = self.matrix.push_week(
+				self.get_week_label(week_start), winners, winner_event_types, num_weeks=self.num_weeks)
+
+		return pd.DataFrame(results, columns=[
+			self.WEEK, EVENT_TYPE, START_DATE, self.NUM_ENTRANTS, self.NUM_WINNERS, self.NUM_REPEAT_WINNERS])
+
+	def summarize(self, results_df: pd.DataFrame) -> dict:
+		"""
+		Summary of a replay: the share of winners who also won the week before, and how the wins were spread.
+		"""
+		num_winners = int(results_df[self.NUM_WINNERS].sum())
+		num_repeat_winners = int(results_df[self.NUM_REPEAT_WINNERS].sum())
+		never_won = [name for name in self.entrants if self.wins[name] == 0]
+		return {
+			'events': len(results_df),
+			'winners': num_winners,
+			'repeat_winner_rate': num_repeat_winners / num_winners if num_winners else 0.0,
+			'entrants': len(self.entrants),
+			'never_won_rate': len(never_won) / len(self.entrants) if self.entrants else 0.0,
+			'max_wins': max(self.wins.values(), default=0),
+		}
+
+
+if __name__ == "__main__":
+	configure_logging()
+
+	parser = argparse.ArgumentParser(description="Replay the clinic lotteries week by week over the exported history.")
+	parser.add_argument('filename', type=str, help='The path to the yaml configuration file')
+	parser.add_argument('--weeks', type=int, default=52, help='Number of weeks to replay')
+	parser.add_argument('--start-date', type=convert_date_str_to_obj, default=None,
+						help='First week of the replay (YYYY-MM-DD), default: --weeks before start_date of the yaml file')
+	parser.add_argument('--seed', type=int, default=None, help='Seed of the replay')
+	parser.add_argument('--exclude', type=str, nargs='*', default=None,
+						help='Participants excluded from the lotteries, default: exclude_from_lottery of the yaml file')
+	parser.add_argument('--output', type=str, default=None, help='Write the per-event results to this csv file')
+
+	args = parser.parse_args()
+	config = process_yaml_file(args.filename)
+	start_date = args.start_date
+	if start_date is None:
+		start_date = config['start_date'] - args.weeks * config['recurring_interval_in_days']
+	if isinstance(start_date, datetime.datetime):
+		start_date = start_date.date()
+
+	sesh_data = ClinicLottery.load_sesh_data({**config, 'history_window_in_days': None})
+	replay = LotteryReplay(
+		ClinicLottery.load_clinic_events(sesh_data),
+		config['events'],
+		exclude_from_lottery=config['exclude_from_lottery'] if args.exclude is None else args.exclude
+	)
+	results_df = replay.run(
+		start_date,
+		num_weeks=args.weeks,
+		recurring_interval_in_days=config['recurring_interval_in_days'],
+		seed=args.seed
+	)
+	with pd.option_context('display.max_rows', None, 'display.width', 200):
+		print(results_df)
+	for key, value in replay.summarize(results_df).items():
+		print(f'{key}: {value}')
+	if args.output:
+		results_df.to_csv(args.output, index=False)
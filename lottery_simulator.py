@@ -0,0 +1,228 @@
+"""
+Monte Carlo simulation of the clinic lotteries, to tune max_attendee_count, num_past_sessions and the decay of
+the attendance weights by looking at the win probability of every participant.
+
+Usage:
+	python lottery_simulator.py <yaml_filename> [--trials N] [--seed S] [--event-type TYPE]
+								[--max-attendee-count N] [--num-past-sessions N] [--decay-base B] [--output <csv>]
+"""
+import argparse
+import copy
+
+import numpy as np
+import pandas as pd
+
+from clinic_lottery import ClinicLottery, process_yaml_file
+from lottery import Lottery
+from sesh import START_DATE, EVENT_TYPE
+from logging_config import configure_logging
+
+
+class LotterySimulator:
+	PROBABILITY_COL_NAME = 'Win Probability'
+	WAIT_COL_NAME = 'Expected Wait Weeks'
+
+	# maximum number of random scores drawn at once (trials x participants), 16 MB of float32
+	MAX_BATCH_ELEMENTS = 4_000_000
+
+	def __init__(self, participants, scores, max_num_attendees: int, fixed_scores=None) -> None:
+		"""
+		Draws many lotteries at once: every trial adds uniform noise to the attendance scores like
+		Lottery.compute_priority() and selects the max_num_attendees lowest scores.
+
+		:param participants: names of the lottery participants
+		:param scores: attendance scores of the participants before randomization (lower is better)
+		:param max_num_attendees: number of winners of every lottery
+		:param fixed_scores: fixed score of the deprioritized participants and NaN for everyone else,
+							 replacing the randomized score as in Lottery.deprioritize_participants()
+		"""
+		self.participants = pd.Index(participants)
+		self.scores = np.asarray(scores, dtype=np.float64)
+		self.max_num_attendees = max_num_attendees
+		self.num_participants = len(self.participants)
+		if fixed_scores is None:
+			fixed_scores = np.full(self.num_participants, np.nan)
+		self.fixed_scores = np.asarray(fixed_scores, dtype=np.float64)
+
+	@classmethod
+	def from_lottery(cls, lottery: Lottery, exclude_from_lottery=(), decay_base: float = 2.0, max_num_attendees=None):
+		"""
+		Simulator of the participants and attendance history of a lottery that has been run.
+
+		:param lottery: Lottery after select_and_sort_attendees(), its multi_signup flags are reused
+		:param exclude_from_lottery: participants excluded from the lottery, see ClinicLottery
+		:param decay_base: decay base of the attendance weights, see Lottery.get_attendance_weights()
+		:param max_num_attendees: number of winners, default: the lottery's max_num_attendees
+		"""
+		participants = lottery.attendance.participants
+		weights = Lottery.get_attendance_weights(lottery.num_past_events, base=decay_base)
+		scores = lottery.attendance.attended() @ weights
+
+		multi_signup = []
+		if lottery.flags_df is not None:
+			multi_signup = lottery.flags_df.index[lottery.flags_df['multi_signup'].astype(bool)]
+
+		# same tiers and precedence as Lottery.select_and_sort_attendees(), the last matching tier wins
+		fixed_scores = np.full(len(participants), np.nan)
+		for tier, priority in [
+			(exclude_from_lottery, Lottery.EXCLUDED_PRIORITY),
+			(multi_signup, Lottery.MULTI_SIGNUP_PRIORITY),
+		]:
+			fixed_scores[pd.Index(participants).isin(tier)] = priority
+
+		if max_num_attendees is None:
+			max_num_attendees = lottery.max_num_attendees
+		return cls(participants, scores, max_num_attendees, fixed_scores=fixed_scores)
+
+	def get_bounds(self):
+		"""
+		Lowest and highest randomized score every participant can draw, the noise is uniform in [0, 1).
+		"""
+		is_fixed = ~np.isnan(self.fixed_scores)
+		lower = np.where(is_fixed, self.fixed_scores, self.scores)
+		upper = np.where(is_fixed, self.fixed_scores, self.scores + 1)
+		return lower, upper
+
+	def get_certain_outcomes(self, num_winners: int):
+		"""
+		Participants who win or lose every lottery whatever the noise, only the others need to be simulated.
+
+		A participant surely wins if fewer than num_winners others can draw a score lower than or equal to
+		theirs, and surely loses if at least num_winners others always draw a lower score.
+
+		:return: (boolean array of sure winners, boolean array of sure losers)
+		"""
+		lower, upper = self.get_bounds()
+		# others whose lowest score is <= the participant's highest score (the participant itself included)
+		num_maybe_better = np.searchsorted(np.sort(lower), upper, side='right') - 1
+		# others whose highest score is < the participant's lowest score
+		num_surely_better = np.searchsorted(np.sort(upper), lower, side='left')
+		return num_maybe_better < num_winners, num_surely_better >= num_winners
+
+	def count_wins(self, num_trials: int, seed=None, batch_size=None) -> np.ndarray:
+		"""
+		Run num_trials lotteries, in batches of trials x participants random matrices.
+
+		:param num_trials: number of lotteries to draw
+		:param seed: seed (or SeedSequence) of the random generator, None for a fresh one
+		:param batch_size: number of trials drawn at once, default: bounded by MAX_BATCH_ELEMENTS
+		:return: number of wins of every participant
+		"""
+		num_winners = min(self.max_num_attendees, self.num_participants)
+		wins = np.zeros(self.num_participants, dtype=np.int64)
+		if num_winners <= 0:
+			return wins
+
+		# the sure winners take their places in every trial, the remaining places are drawn among the others
+		sure_winners, sure_losers = self.get_certain_outcomes(num_winners)
+		wins[sure_winners] = num_trials
+		drawn = np.flatnonzero(~sure_winners & ~sure_losers)
+		num_winners -= int(sure_winners.sum())
+		if num_winners <= 0 or len(drawn) == 0:
+			return wins
+		if num_winners >= len(drawn):
+			wins[drawn] = num_trials
+			return wins
+
+		rng = np.random.default_rng(seed)
+		if batch_size is None:
+			batch_size = max(1, self.MAX_BATCH_ELEMENTS // len(drawn))
+		scores = self.scores[drawn].astype(np.float32)
+		is_fixed = ~np.isnan(self.fixed_scores[drawn])
+		fixed_scores = self.fixed_scores[drawn][is_fixed].astype(np.float32)
+
+		drawn_wins = np.zeros(len(drawn), dtype=np.int64)
+		for start in range(0, num_trials, batch_size):
+			num_batch_trials = min(batch_size, num_trials - start)
+			randomized_scores = rng.random((num_batch_trials, len(drawn)), dtype=np.float32)
+			randomized_scores += scores
+			randomized_scores[:, is_fixed] = fixed_scores
+			# the winners of every trial, unordered, without sorting the whole row
+			winners = np.argpartition(randomized_scores, num_winners - 1, axis=1)[:, :num_winners]
+			drawn_wins += np.bincount(winners.ravel(), minlength=len(drawn))
+		wins[drawn] = drawn_wins
+		return wins
+
+	def simulate(self, num_trials: int = 100000, seed=None, batch_size=None) -> pd.DataFrame:
+		"""
+		Estimate the win probability of every participant and the expected number of weeks they wait
+		before winning, (1 - p) / p, assuming they enter a lottery with the same odds every week.
+
+		:return: DataFrame indexed by participant with the score (before randomization), the win probability and
+				 the expected wait weeks (inf if the participant never wins), most likely winners first
+		"""
+		probability = self.count_wins(num_trials, seed=seed, batch_size=batch_size) / num_trials
+		expected_wait = np.divide(
+			1 - probability, probability,
+			out=np.full(self.num_participants, np.inf),
+			where=probability > 0
+		)
+		result_df = pd.DataFrame({
+			Lottery.SCORE_COL_NAME: np.where(np.isnan(self.fixed_scores), self.scores, self.fixed_scores),
+			self.PROBABILITY_COL_NAME: probability,
+			self.WAIT_COL_NAME: expected_wait,
+		}, index=self.participants.rename(Lottery.PTCPNT_COL_NAME))
+		return result_df.sort_values(
+			by=[self.PROBABILITY_COL_NAME, Lottery.SCORE_COL_NAME], ascending=[False, True], kind='stable')
+
+
+def simulate_clinic_lottery(config: dict, num_trials: int = 100000, seed=None, decay_base: float = 2.0,
+							event_types=None) -> pd.DataFrame:
+	"""
+	Simulate every lottery of the lottery period of config, see ClinicLottery.
+
+	:param seed: seed of the simulation, every lottery is simulated with its own seed spawned from it
+	:param event_types: only simulate the lotteries of these event types, None means all
+	:return: DataFrame indexed by (event type, event date, participant), see LotterySimulator.simulate()
+	"""
+	clinic_lottery = ClinicLottery(config, publish=False)
+	seed_sequences = np.random.SeedSequence(seed).spawn(len(clinic_lottery.lotteries))
+	results = {}
+	for (lottery_event, lottery, _), seed_sequence in zip(clinic_lottery.lotteries, seed_sequences):
+		if event_types is not None and lottery_event[EVENT_TYPE] not in event_types:
+			continue
+		simulator = LotterySimulator.from_lottery(
+			lottery,
+			exclude_from_lottery=config['exclude_from_lottery'],
+			decay_base=decay_base
+		)
+		results[lottery_event[EVENT_TYPE], lottery_event[START_DATE]] = simulator.simulate(num_trials, seed=seed_sequence)
+	return pd.concat(results, names=[EVENT_TYPE, START_DATE])
+
+
+if __name__ == "__main__":
+	configure_logging()
+
+	parser = argparse.ArgumentParser(description="Estimate the win probabilities of the clinic lotteries.")
+	parser.add_argument('filename', type=str, help='The path to the yaml configuration file')
+	parser.add_argument('--trials', type=int, default=100000, help='Number of simulated lotteries per event')
+	parser.add_argument('--seed', type=int, default=None, help='Seed of the simulation')
+	parser.add_argument('--event-type', type=str, nargs='+', default=None, help='Only simulate these event types')
+	parser.add_argument('--max-attendee-count', type=int, default=None,
+						help='Override max_attendee_count of the simulated event types')
+	parser.add_argument('--num-past-sessions', type=int, default=None,
+						help='Override num_past_sessions of the simulated event types')
+	parser.add_argument('--decay-base', type=float, default=2.0, help='Decay base of the attendance weights')
+	parser.add_argument('--output', type=str, default=None, help='Write the results to this csv file')
+
+	args = parser.parse_args()
+	config = copy.deepcopy(process_yaml_file(args.filename))
+	for event_type, event_config in config['events'].items():
+		if args.event_type is not None and event_type not in args.event_type:
+			continue
+		if args.max_attendee_count is not None:
+			event_config['lottery']['max_attendee_count'] = args.max_attendee_count
+		if args.num_past_sessions is not None:
+			event_config['attendance_history']['num_past_sessions'] = args.num_past_sessions
+
+	result_df = simulate_clinic_lottery(
+		config,
+		num_trials=args.trials,
+		seed=args.seed,
+		decay_base=args.decay_base,
+		event_types=args.event_type
+	)
+	with pd.option_context('display.max_rows', None, 'display.width', 200):
+		print(result_df)
+	if args.output:
+		result_df.to_csv(args.output)
@@ -0,0 +1,48 @@
+class ParticipantRegistry:
+	"""
+	Participants of the lotteries run so far, in order of first entry, with the lotteries each of them entered and won.
+
+	Membership tests and lookups are dict lookups, so registering the entrants of every lottery of a week and
+	checking them in the next lotteries stays linear in the number of entrants.
+
+	registry = ParticipantRegistry()
+	registry.register('Clinic-B', entrants=['Alice', 'Bob'], winners=['Alice'])
+	'Alice' in registry						# True
+	registry.get_entered('Alice')			# ['Clinic-B']
+	registry.get_won('Bob')					# []
+	"""
+	def __init__(self) -> None:
+		self.entered = {}	# participant name -> lotteries entered, in lottery order
+		self.won = {}		# participant name -> lotteries won, in lottery order
+
+	def register(self, lottery_name, entrants, winners=()) -> None:
+		"""
+		Record the entrants and winners of a lottery. Entering the same lottery twice is recorded once.
+
+		:param lottery_name: name of the lottery, e.g. the event type 'Clinic-B'
+		:param entrants: names of the participants who entered the lottery
+		:param winners: names of the participants who won the lottery
+		"""
+		for name in entrants:
+			lotteries = self.entered.setdefault(name, [])
+			if lottery_name not in lotteries:
+				lotteries.append(lottery_name)
+		for name in winners:
+			lotteries = self.won.setdefault(name, [])
+			if lottery_name not in lotteries:
+				lotteries.append(lottery_name)
+
+	def get_entered(self, name) -> list:
+		return self.entered.get(name, [])
+
+	def get_won(self, name) -> list:
+		return self.won.get(name, [])
+
+	def __contains__(self, name) -> bool:
+		return name in self.entered
+
+	def __iter__(self):
+		return iter(self.entered)
+
+	def __len__(self) -> int:
+		return len(self.entered)
@@ -0,0 +1,98 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class PublishError(Exception):
+    """
+    Raised by Publisher.join() when publishing tasks failed, after every sink has been drained.
+    """
+    def __init__(self, errors):
+        """
+        :param errors: list of (sink name, exception) of the failed tasks
+        """
+        self.errors = errors
+        super().__init__('; '.join(f'{sink}: {error!r}' for sink, error in errors))
+
+
+class Publisher:
+    """
+    Runs the network- and disk-bound outputs of a run in the background while the caller keeps computing.
+
+    Every sink (e.g. 'sheets', 'dashboard_yaml') has its own queue drained by one thread, so the tasks of a
+    sink run in the order they were submitted, which matters for outputs appended to the same file.
+    Different sinks run concurrently, at most max_concurrency tasks at a time.
+    Once a task of a sink fails, the remaining tasks of that sink are skipped and the failure is raised by
+    join() together with the failures of the other sinks.
+
+    with Publisher() as publisher:
+        publisher.submit('sheets', session.commit)
+    """
+    def __init__(self, max_concurrency: int = 4) -> None:
+        """
+        :param max_concurrency: maximum number of tasks running at the same time across all sinks
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.executors = {}     # sink name -> single-threaded executor
+        self.futures = []
+        self.errors = []
+        self.failed_sinks = set()
+        self.lock = threading.Lock()
+
+    def submit(self, sink: str, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) on sink. Arguments must not be modified by the caller afterwards.
+
+        :return: concurrent.futures.Future of the task
+        """
+        if sink not in self.executors:
+            self.executors[sink] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'publish-{sink}')
+        future = self.executors[sink].submit(self._run, sink, fn, args, kwargs)
+        self.futures.append(future)
+        return future
+
+    def _run(self, sink, fn, args, kwargs):
+        with self.lock:
+            if sink in self.failed_sinks:
+                self.logger.warning(f'Skipping {getattr(fn, "__name__", fn)} on {sink} after an earlier failure')
+                return None
+        with self.semaphore:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                self.logger.error(f'Publishing to {sink} failed: {e!r}')
+                with self.lock:
+                    self.failed_sinks.add(sink)
+                    self.errors.append((sink, e))
+                raise
+
+    def join(self) -> None:
+        """
+        Wait until every sink is drained and shut down the threads.
+
+        :raises PublishError: if any task failed
+        """
+        wait(self.futures)
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.executors = {}
+        self.futures = []
+        if self.errors:
+            errors, self.errors = self.errors, []
+            self.failed_sinks = set()
+            raise PublishError(errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.join()
+            return False
+        # the caller failed, still drain what has been queued, but let the caller's exception propagate
+        try:
+            self.join()
+        except PublishError as e:
+            self.logger.error(f'Publishing failed as well: {e}')
+        return False
@@ -1,3 +1,5 @@
+import os
+import time
 import pandas as pd
 import datetime
 import logging
@@ -32,15 +34,108 @@ CANCELLED_EVENT_NAME_REGEX = rf'{SESH_CANCELLED_EVENT_TOKEN}\s+(?:{CANCELLATION_
 
 
 class SeshData:
-    def __init__(self, filename: str) -> None:
+    # columns of the Sesh export which are not used in lottery
+    UNUSED_COLUMNS = [EDIT_LINK, DISCORD_LINK, CHANNEL, AUTHOR]
+    # parse the text columns as strings instead of letting pandas infer their types
+    DTYPES = {EVENT_NAME: str, START_DATE: str, RSVPER_NAMES: str, RSVPER_LINK: str}
+
+    def __init__(self,
+                 filename: str,
+                 start_date: datetime.date = None,
+                 end_date: datetime.date = None,
+                 event_type_pattern: str = None,
+                 chunksize: int = None,
+                 cache=None) -> None:
+        """
+        :param filename: Sesh export in .csv format
+        :param start_date: only keep events on or after this date, None means no lower bound
+        :param end_date: only keep events before this date, None means no upper bound
+        :param event_type_pattern: only keep events whose type matches this regex (case-insensitive), None keeps all
+        :param chunksize: read the .csv file this many rows at a time, None reads the whole file at once
+        :param cache: optional SeshSnapshotCache, loads the parsed events from it instead of parsing the .csv file
+                      again if the same file has been parsed with the same options before
+        """
         self.logger = logging.getLogger(self.__class__.__name__)
         if not filename.endswith('.csv'):
             raise Exception('incorrect file type, please enter a csv filename that ends with .csv')
 
+        start_time = time.perf_counter()
+        self.df = None
+        if cache is not None:
+            if not os.path.exists(filename):
+                raise FileNotFoundError(f"File '{filename}' not found. Please check the file path.")
+            cache_key = cache.get_key(
+                filename, start_date=start_date, end_date=end_date, event_type_pattern=event_type_pattern)
+            self.df = cache.load(cache_key)
+
+        if self.df is not None:
+            log_dataframe_info(self.df, 'Events (warm start from cache)', time.perf_counter() - start_time)
+            return
+
         self.logger.info(f'Reading from {filename}')
-        # Load the CSV file into a DataFrame
+        chunks = list(self.iter_events(filename, start_date, end_date, event_type_pattern, chunksize))
+        self.df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        self.logger.info(f'Finished loading event data from .csv file into a Dataframe')
+
+        self.logger.info(f'Sort events in descending order based on dates')
+        self.df = self.df.sort_values(by=START_DATE, ascending=False)
+        log_dataframe_info(self.df, 'Events (cold start from .csv)', time.perf_counter() - start_time)
+
+        if cache is not None:
+            cache.save(cache_key, self.df)
+
+    @classmethod
+    def iter_events(cls,
+                    filename: str,
+                    start_date: datetime.date = None,
+                    end_date: datetime.date = None,
+                    event_type_pattern: str = None,
+                    chunksize: int = None):
+        """
+        Read the Sesh export chunk by chunk and yield the parsed events of each chunk.
+        Events outside of the date window or not matching event_type_pattern are dropped
+        before their rsvpers strings are parsed, which is the expensive step.
+        Every yielded DataFrame has the same columns, even if no event of the chunk is kept.
+        """
+        logger = logging.getLogger(cls.__name__)
+        has_date_window = start_date is not None or end_date is not None
+        for chunk in cls._read_csv_chunks(filename, chunksize):
+            num_rows = len(chunk)
+            chunk[START_DATE] = pd.to_datetime(chunk[START_DATE], errors='coerce')
+            chunk[START_DATE] = chunk[START_DATE].dt.date   # convert datetime to date (time is not necessary)
+            if has_date_window:
+                keep = chunk[START_DATE].notna()
+                if start_date is not None:
+                    keep &= chunk[START_DATE] >= start_date
+                if end_date is not None:
+                    keep &= chunk[START_DATE] < end_date
+                chunk = chunk[keep]
+
+            chunk = chunk.assign(**{EVENT_TYPE: SeshEventTypeClassifier.classify_many(chunk[EVENT_NAME])})
+            if event_type_pattern is not None:
+                chunk = chunk[chunk[EVENT_TYPE].str.contains(event_type_pattern, case=False, na=False)]
+
+            # sometimes the values attendee and attendees are used interchangeably, change all to attendees
+            chunk = chunk.assign(**{
+                RSVPER_NAMES: SeshRSVPParser.parse_many(chunk[RSVPER_NAMES]).map(cls.rename_attendee_key)
+            })
+            #todo: need to keep a mapping of full names and names
+            logger.debug(f'Kept {len(chunk)} of {num_rows} events from chunk')
+            yield chunk
+
+    @classmethod
+    def _read_csv_chunks(cls, filename: str, chunksize: int = None):
         try:
-            self.df = pd.read_csv(filename)
+            reader = pd.read_csv(
+                filename,
+                usecols=lambda column: column not in cls.UNUSED_COLUMNS,
+                dtype=cls.DTYPES,
+                chunksize=chunksize
+            )
+            if chunksize is None:
+                yield reader
+            else:
+                yield from reader
         except FileNotFoundError:
             raise FileNotFoundError(f"File '{filename}' not found. Please check the file path.")
         except pd.errors.EmptyDataError:
@@ -49,29 +144,6 @@ class SeshData:
             raise ValueError(f"Error parsing '{filename}'. Ensure it's a valid CSV.")
         except Exception as e:
             raise RuntimeError(f"An unexpected error occurred: {e}")
-        self.logger.info(f'Finished loading event data from .csv file into a Dataframe')
-
-        self.logger.info("Removing columns 'channel', 'author', 'edit_link', 'discord_link' which are not used in lottery")
-        self.df.drop([EDIT_LINK, DISCORD_LINK, CHANNEL, AUTHOR], axis=1, inplace=True)
-        log_dataframe_info(self.df)
-        self.logger.info(f'Converting event dates from string to datetime.date objects')
-        self.df[START_DATE] = pd.to_datetime(self.df[START_DATE], errors='coerce')
-        self.df[START_DATE] = self.df[START_DATE].dt.date   # convert datetime to date (time is not necessary)
-
-        self.logger.info(f'Parsing Rsvper_names string and convert it into a dictionary')
-        self.df[RSVPER_NAMES] = self.df[RSVPER_NAMES].apply(lambda x: SeshRSVPParser.parse(x))
-        #todo: need to keep a mapping of full names and names
-        # self.df[RSVPER_NAMES] = self.df[FULL_RSVPER_NAMES].apply(lambda x: SeshRSVPPARSER.remove_nicknames(x))
-
-        # sometimes the values attendee and attendees are used interchangeably, change all to attendees
-        self.df[RSVPER_NAMES] = self.df[RSVPER_NAMES].apply(lambda x: self.rename_attendee_key(x))
-
-        self.logger.info(f'Identifying the types of events based on event name')
-        self.df[EVENT_TYPE] = self.df[EVENT_NAME].apply(lambda x: SeshEventTypeClassifier.classify(x))
-
-        self.logger.info(f'Sort events in descending order based on dates')
-        self.df = self.df.sort_values(by=START_DATE, ascending=False)
-        log_dataframe_info(self.df)
 
     @staticmethod
     def rename_attendee_key(d: dict) -> dict:
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from sesh import START_DATE, RSVPER_NAMES
+
+
+class SeshSnapshotCache:
+    """
+    Parsed Sesh exports cached on local disk as uncompressed Feather files.
+
+    A snapshot is keyed by the sha256 of the .csv file content together with the options it was parsed with,
+    so an updated export or different options never load a stale snapshot.
+    The rsvpers dictionaries are stored as a single map column (section header -> list of names), which Arrow
+    converts back to one dictionary per event when loaded.
+    """
+    # bump whenever parsing or the snapshot layout changes, so snapshots written by an older version are not loaded
+    VERSION = 2
+    RSVPERS_TYPE = pa.map_(pa.string(), pa.list_(pa.string()))
+
+    def __init__(self, cache_dir: str) -> None:
+        """
+        :param cache_dir: directory of the snapshots, created if it does not exist
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def get_key(cls, filename: str, **options) -> str:
+        """
+        :param filename: Sesh export in .csv format
+        :param options: options the export is parsed with, values must be representable as strings
+        :return: hex digest identifying the content of filename parsed with options
+        """
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(json.dumps({'version': cls.VERSION, **options}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get_filename(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.feather')
+
+    def load(self, key: str):
+        """
+        :return: DataFrame of the snapshot stored under key, None if there is none
+        """
+        filename = self.get_filename(key)
+        if not os.path.exists(filename):
+            return None
+        table = feather.read_table(filename)
+        # the map column becomes one dictionary per event in Arrow, only its arrays of names are made lists
+        rsvpers = table.column(RSVPER_NAMES).to_pandas(maps_as_pydicts='strict')
+        rsvpers = [{header: names.tolist() for header, names in d.items()} for d in rsvpers]
+
+        df = table.drop_columns([RSVPER_NAMES]).to_pandas()
+        # missing strings come back as None, restore the NaN read_csv produces
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].fillna(np.nan)
+        rsvpers = pd.Series(rsvpers, index=df.index, dtype=object)
+        df.insert(table.column_names.index(RSVPER_NAMES), RSVPER_NAMES, rsvpers)
+        df[START_DATE] = df[START_DATE].dt.date
+        self.logger.info(f'Loaded parsed Sesh export from {filename}')
+        return df
+
+    def save(self, key: str, df: pd.DataFrame) -> None:
+        """
+        Store df as the snapshot under key. A DataFrame that cannot be represented in Feather is not cached.
+        """
+        filename = self.get_filename(key)
+        try:
+            table = pa.Table.from_pandas(df.drop(columns=[RSVPER_NAMES]).assign(**{
+                START_DATE: pd.to_datetime(df[START_DATE]),
+            }))
+            rsvpers = pa.array(df[RSVPER_NAMES].map(lambda d: list(d.items())), type=self.RSVPERS_TYPE)
+            table = table.add_column(df.columns.get_loc(RSVPER_NAMES), RSVPER_NAMES, rsvpers)
+        except (pa.ArrowException, ValueError) as e:
+            self.logger.warning(f'Not caching parsed Sesh export: {e}')
+            return
+        # write to a temporary file first, so a concurrent or interrupted run never sees a partial snapshot
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        feather.write_feather(table, tmp_filename, compression='uncompressed')
+        os.replace(tmp_filename, filename)
+        self.logger.info(f'Saved parsed Sesh export to {filename}')
+
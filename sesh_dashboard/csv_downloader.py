@@ -6,10 +6,12 @@ from .selenium_utils import (
     create_chrome_driver_with_logging,
     check_login_status,
     wait_for_element,
+    wait_for_page_ready,
     hide_tooltips,
     check_rate_limit,
     retry_with_rate_limit_check
 )
+from .utils import PhaseTimer
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
@@ -20,7 +22,8 @@ class CSVDownloader:
     def __init__(self, server_id,
                  profile_path="/tmp/selenium-profile",  # macOS example
                  download_dir="/Users/qingyuan/Downloads",
-                 timeout=30):
+                 timeout=30,
+                 timer=None):
 
         self.server_id = server_id
         self.url = f'https://sesh.fyi/dashboard/{self.server_id}/events?view=list'
@@ -28,6 +31,8 @@ class CSVDownloader:
         self.timeout = timeout
         self.profile_path = profile_path
         self.logger = logging.getLogger(__name__)
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.download_started_at = None  # time of the Download CSV click, older files are not the download
 
     def _setup_driver(self, profile_path):
         """Setup Chrome driver with proper configuration"""
@@ -38,7 +43,7 @@ class CSVDownloader:
         })
         return driver
 
-    def wait_for_file_size_stable(self, file_path, stability_time=3, check_interval=0.5, timeout=30):
+    def wait_for_file_size_stable(self, file_path, stability_time=1, check_interval=0.2, timeout=30):
         """
         Wait for file size to remain stable for a specified duration.
         
@@ -76,7 +81,8 @@ class CSVDownloader:
     def wait_and_rename_download(self,
                                original_suffix=".csv",
                                timeout=30,
-                               stability_time=3):
+                               stability_time=1,
+                               check_interval=0.2):
         """Wait for download to complete and rename the file"""
         date_str = datetime.now().strftime("%Y-%m-%d")
         new_filename = f"events_{self.server_id}_{date_str}.csv"
@@ -86,11 +92,15 @@ class CSVDownloader:
         while time.time() - start_time < timeout:
             files = [f for f in os.listdir(self.download_dir) if
                      f.endswith(original_suffix) and not f.endswith(".crdownload")]
+            if self.download_started_at is not None:
+                # files already in the download directory before the click are not the download
+                files = [f for f in files
+                         if os.path.getmtime(os.path.join(self.download_dir, f)) >= self.download_started_at]
             if files:
                 # Sort files by modification time (newest first)
                 files.sort(key=lambda x: os.path.getmtime(os.path.join(self.download_dir, x)), reverse=True)
                 old_path = os.path.join(self.download_dir, files[0])
-                if self.wait_for_file_size_stable(old_path, stability_time):
+                if self.wait_for_file_size_stable(old_path, stability_time, check_interval=check_interval):
                     new_path = os.path.join(self.download_dir, new_filename)
                     os.rename(old_path, new_path)
                     print(f"✅ Renamed file to: {new_filename}")
@@ -98,7 +108,7 @@ class CSVDownloader:
                 else:
                     self.logger.error("File size did not stabilize within timeout")
                     return None
-            time.sleep(1)
+            time.sleep(check_interval)
         
         self.logger.error("❌ Timed out waiting for download to complete")
         return None
@@ -115,8 +125,9 @@ class CSVDownloader:
         )
         self.logger.info("Found Download CSV button")
         hide_tooltips(driver)  # Hide any tooltips before clicking
+        # the download is picked up by wait_and_rename_download() as soon as it lands, no fixed pause
+        self.download_started_at = time.time() - 1  # file times may be rounded to the second
         export_button.click()
-        time.sleep(5)  # Wait for download to start
         return True
 
     def run(self):
@@ -127,7 +138,8 @@ class CSVDownloader:
             self.logger.info(f"Opening URL: {self.url}")
             driver.get(self.url)
             self.logger.info("Waiting for page to load...")
-            time.sleep(5)
+            with self.timer.wait(self.server_id, replaced_sleep=5):
+                wait_for_page_ready(driver, timeout=self.timeout)
             self.logger.info(f"Current page title: {driver.title}")
             self.logger.info(f"Current URL: {driver.current_url}")
 
@@ -146,7 +158,9 @@ class CSVDownloader:
                     self.logger.info(f"Button text: {button.text}")
                 raise
 
-            result_path = self.wait_and_rename_download()
+            # replaces the 5 s pause after the click and the 3 s size stability check
+            with self.timer.wait(self.server_id, replaced_sleep=5 + 3):
+                result_path = self.wait_and_rename_download(timeout=self.timeout)
             if result_path:
                 return {"success": True, "file_path": result_path}
             else:
@@ -173,3 +187,4 @@ if __name__ == '__main__':
     )
     result = csv_downloader.run()
     print(f'Download result: {result}')
+    print(csv_downloader.timer.report())
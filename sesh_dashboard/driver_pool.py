@@ -0,0 +1,106 @@
+import contextlib
+import logging
+import queue
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+from sesh_dashboard.selenium_utils import create_chrome_driver_with_logging
+from sesh_dashboard.utils import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """
+    Chrome drivers shared by the dashboard uploads, launched on first use and reused for every event.
+
+    The ChromeDriver is resolved once per process (see get_chromedriver_path()), and a driver stays
+    logged in to sesh.fyi between events, so only the first event pays for the launch.
+
+    Drivers attached to an already running Chrome (attach_to_debugger, the default of
+    create_chrome_driver_with_logging()) belong to the user's own browser session: close() only drops them,
+    it only quits the browsers the pool launched itself.
+
+    with DriverPool(size=1) as pool:
+        for event in events:
+            with pool.driver() as driver:
+                SeshDashboardEvent(server_id, driver=driver).add_attendees_to_event(...)
+    """
+    def __init__(self, size=1, timer=None, driver_factory=create_chrome_driver_with_logging, profile_paths=None,
+                 **driver_options):
+        """
+        Args:
+            size (int): Maximum number of drivers launched, 1 reuses a single driver for everything
+            timer (PhaseTimer): Records the 'launch' phase of every driver, default: a new PhaseTimer
+            driver_factory: Function launching a driver from driver_options, default: create_chrome_driver_with_logging
+            profile_paths (list): Chrome profile of every driver, in launch order, so that the drivers do not share a
+                                  profile, default: profile_path of driver_options for all of them
+            **driver_options: Arguments of driver_factory, e.g. profile_path, headless, attach_to_debugger
+                              (True unless given, as in create_chrome_driver_with_logging)
+        """
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        if profile_paths is not None and len(profile_paths) < size:
+            raise ValueError(f'{size} drivers need {size} profile paths, got {len(profile_paths)}')
+        self.size = size
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.driver_factory = driver_factory
+        self.driver_options = driver_options
+        self.profile_paths = profile_paths
+        self.attach_to_debugger = driver_options.get('attach_to_debugger', True)
+        self.drivers = []  # every driver launched, idle or in use
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Returns:
+            An idle driver, a newly launched one if fewer than size are running, otherwise the next one released
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self.drivers) < self.size:
+                driver_options = dict(self.driver_options)
+                if self.profile_paths is not None:
+                    driver_options['profile_path'] = self.profile_paths[len(self.drivers)]
+                with self.timer.phase('launch'):
+                    driver = self.driver_factory(**driver_options)
+                self.drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def release(self, driver):
+        self._idle.put(driver)
+
+    @contextlib.contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """Quit every browser launched by the pool, and let go of the drivers attached to the user's Chrome."""
+        with self._lock:
+            if self.attach_to_debugger:
+                # quitting an attached session can close the windows of the user's own Chrome
+                logger.info(f"Leaving {len(self.drivers)} attached Chrome session(s) open")
+            else:
+                for driver in self.drivers:
+                    try:
+                        driver.quit()
+                    except WebDriverException as e:
+                        logger.warning(f"Could not quit Chrome driver: {e}")
+            self.drivers = []
+            self._idle = queue.Queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
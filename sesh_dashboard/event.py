@@ -11,29 +11,96 @@
 # /Applications/Google\ Chrome.app/Contents/MacOS/Google\ Chrome --remote-debugging-port=9222 --user-data-dir="$HOME/Library/Application Support/Google/Chrome/SeleniumProfile"
 # go to sesh.fyi and login
 
-import time
+import contextlib
+import logging
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from sesh_dashboard.selenium_utils import (
     create_chrome_driver_with_logging,
     check_login_status,
     wait_for_element,
+    wait_for_page_ready,
+    wait_for_modal_closed,
+    wait_for_element_count,
+    wait_for_dropdown_options,
     hide_tooltips,
     check_rate_limit,
     retry_with_rate_limit_check
 )
-from sesh_dashboard.utils import chunk_list
+from sesh_dashboard.driver_pool import DriverPool
+from sesh_dashboard.rate_controller import RateController
+from sesh_dashboard.utils import PhaseTimer
 
 
 class SeshDashboardEvent:
-    def __init__(self, server_id):
-        self.base_url = f'https://sesh.fyi/dashboard/{server_id}'
+    # upper bounds (in seconds) of the condition waits
+    TIMEOUTS = {
+        'page': 15,         # page loaded and network idle
+        'modal': 10,        # Add Users modal open
+        'options': 10,      # search dropdown loaded
+        'selection': 5,     # selected user shown in the modal
+        'submit': 10,       # modal closed after submitting
+    }
+
+    # the lists of the event page: one element per list, titled by its first span ('Attendee', 'Lottery' ...,
+    # possibly followed by a count like 'Attendee (12)'), holding one element per user
+    LIST_SELECTOR = "div.attendee-list"
+    USER_SELECTOR = ".attendee-list__name"
+
+    # reads the users of every list of the page in one round trip, only the lists found on the page are returned
+    READ_LISTS_SCRIPT = """
+        const [listNames, listSelector, userSelector] = arguments;
+        const lists = {};
+        document.querySelectorAll(listSelector).forEach(list => {
+            const title = list.querySelector('span');
+            if (!title) {
+                return;
+            }
+            const name = title.textContent.trim().replace(/\\s*\\(\\d+\\)$/, '');
+            if (listNames.includes(name)) {
+                lists[name] = lists[name] || [];
+                list.querySelectorAll(userSelector).forEach(user => lists[name].push(user.textContent.trim()));
+            }
+        });
+        return lists;
+    """
+
+    DASHBOARD_URL = 'https://sesh.fyi/dashboard'
+
+    def __init__(self, server_id, driver=None, timer=None, timeouts=None, rate_controller=None, dashboard_url=None,
+                 interactive=True, logger=None):
+        """
+        Args:
+            server_id: Discord server ID of the events
+            driver: Chrome driver to use, e.g. from a DriverPool shared by several events,
+                    default: a new driver launched for this object
+            timer (PhaseTimer): Records the time spent in each phase (navigate, modal, submit), default: a new one
+            timeouts (dict): Overrides of TIMEOUTS, e.g. {'page': 30}
+            rate_controller (RateController): Decides how many users are added per submission and how long to
+                                              back off when throttled, default: a new one, not persisted
+            dashboard_url: URL of the Sesh dashboard, e.g. of a local stub page, default: DASHBOARD_URL
+            interactive (bool): Ask which option to select when several match a user but none exactly,
+                                False to skip that user instead, e.g. in a headless worker
+            logger (logging.Logger): Where the steps of the upload are logged, e.g. the log of a worker,
+                                     default: the logger of this module
+        """
+        self.base_url = f'{dashboard_url or self.DASHBOARD_URL}/{server_id}'
         self.profile_path = "/tmp/selenium-profile"  # macOS example
-        self.driver = create_chrome_driver_with_logging(profile_path=self.profile_path)
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.timeouts = {**self.TIMEOUTS, **(timeouts or {})}
+        self.rate_controller = rate_controller if rate_controller is not None else RateController()
+        self.event_id = None  # event being updated, the condition waits are reported per event
+        self.interactive = interactive
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.skipped = {}  # list name -> users not selected in the modal, see select_users()
+        if driver is None:
+            with self.timer.phase('launch'):
+                driver = create_chrome_driver_with_logging(profile_path=self.profile_path)
+        self.driver = driver
 
     def is_logged_into_sesh(self):
         """Check if user is logged in to sesh.fyi"""
@@ -52,10 +119,10 @@ class SeshDashboardEvent:
             logs = self.driver.get_log("browser")
             for entry in logs:
                 if any(word in entry['message'].lower() for word in ["429", "throttle", "too many"]):
-                    print("🚫 Detected rate limit from browser log:", entry['message'])
+                    self.logger.warning(f"🚫 Detected rate limit from browser log: {entry['message']}")
                     return True
         except:
-            print("ℹ️ Could not access browser logs (possibly unsupported driver)")
+            self.logger.debug("ℹ️ Could not access browser logs (possibly unsupported driver)")
         return False
 
     def check_UI_warning_for_rate_limit(self):
@@ -65,9 +132,9 @@ class SeshDashboardEvent:
         for w in warnings:
             if w.is_displayed():
                 text = w.text.lower()
-                print(f"⚠️ UI Warning: {text}")
+                self.logger.warning(f"⚠️ UI Warning: {text}")
                 if any(keyword in text for keyword in warning_keywords):
-                    print("🚫 Detected possible rate limiting.")
+                    self.logger.warning("🚫 Detected possible rate limiting.")
                     return True
         return False
 
@@ -85,7 +152,7 @@ class SeshDashboardEvent:
         if modal_name not in ['Attendee', 'Lottery']:
             raise Exception(f'unknown group {modal_name}')
 
-        print(f"Looking for Add button for {modal_name} list...")
+        self.logger.info(f"Looking for Add button for {modal_name} list...")
         
         # Try different selectors for the Add button
         selectors = [
@@ -98,7 +165,7 @@ class SeshDashboardEvent:
         add_span = None
         for selector in selectors:
             try:
-                print(f"Trying selector: {selector}")
+                self.logger.debug(f"Trying selector: {selector}")
                 add_span = wait_for_element(
                     self.driver,
                     selector,
@@ -107,21 +174,20 @@ class SeshDashboardEvent:
                     timeout=5
                 )
                 if add_span:
-                    print(f"Found Add button with selector: {selector}")
+                    self.logger.info(f"Found Add button with selector: {selector}")
                     break
             except TimeoutException:
                 continue
 
         if not add_span:
-            print("❌ Could not find Add button. Available elements:")
+            self.logger.error("❌ Could not find Add button. Available elements:")
             elements = self.driver.find_elements(By.XPATH, "//*[contains(text(), 'Add') or contains(text(), 'Attendee') or contains(text(), 'Lottery')]")
             for elem in elements:
-                print(f"Element text: {elem.text}")
+                self.logger.info(f"Element text: {elem.text}")
             raise TimeoutException("Could not find Add button")
 
         # 2. Hover over the span (to trigger tooltips, dropdowns, or React events)
         ActionChains(self.driver).move_to_element(add_span).perform()
-        time.sleep(0.5)  # Small pause for any hover UI
 
         # 3. Hide any tooltips that may have appeared
         hide_tooltips(self.driver)
@@ -133,13 +199,14 @@ class SeshDashboardEvent:
             }));
         """, add_span)
 
-        # 5. Wait for the modal to open and become active
-        modal = wait_for_element(
-            self.driver,
-            "div.modal.is-active",
-            timeout=10
-        )
-        print("✅ Modal Opened Successfully!")
+        # 5. Wait for the modal to open and become active, no pause is needed for the hover UI
+        with self.timer.wait(self.event_id, replaced_sleep=0.5):
+            modal = wait_for_element(
+                self.driver,
+                "div.modal.is-active",
+                timeout=self.timeouts['modal']
+            )
+        self.logger.info("✅ Modal Opened Successfully!")
         return modal
 
     def prompt_to_select_multiple_options(self, option_texts):
@@ -172,8 +239,24 @@ class SeshDashboardEvent:
         4. Select the matching user
         Repeat as needed
         """
-        print(users)
-        modal = self.open_add_user_modal(list_name)
+        self.logger.info(f"Users to select: {users}")
+        with self.timer.phase('modal'):
+            modal = self.open_add_user_modal(list_name)
+            skipped = self.select_users(modal, users)
+        if skipped:
+            self.skipped.setdefault(list_name, []).extend(skipped)
+
+        self.submit_and_close_modal()
+        return skipped
+
+    def select_users(self, modal, users):
+        """
+        Type every user into the open modal and select the matching dropdown option.
+
+        Returns:
+            list: Users not selected, as no option matched them exactly (and, when not interactive,
+                  several options matched them)
+        """
 
         # Find the input box inside the modal
         input_box = wait_for_element(
@@ -183,60 +266,73 @@ class SeshDashboardEvent:
         )
         self.driver.execute_script("arguments[0].focus();", input_box)
 
+        chip_selector = ".sesh-dropdown__multi-value__label"
+        num_selected = len(modal.find_elements(By.CSS_SELECTOR, chip_selector))
+        skipped = []
         for user in users:
             # 1. Clear search text
             input_box.clear()
-            time.sleep(0.2)
+            with self.timer.wait(self.event_id, replaced_sleep=0.2):
+                WebDriverWait(self.driver, self.timeouts['options'], poll_frequency=0.05).until(
+                    lambda _: input_box.get_attribute('value') == '')
 
             # 2. Type a user's name
             input_box.send_keys(user)
-            print(f'Entered user: {user}')
+            self.logger.info(f'Entered user: {user}')
 
-            # 3. Wait for the dropdown option(s) to appear
+            # 3. Wait for the dropdown to finish searching
             try:
-                options = wait_for_element(
-                    self.driver,
-                    "div.sesh-dropdown__option",
-                    timeout=10
-                )
+                options = wait_for_dropdown_options(self.driver, timeout=self.timeouts['options'])
             except TimeoutException:
-                print(f"❌ No dropdown options available (zero matches) for {user}")
+                self.logger.error(f"❌ No dropdown options available (zero matches) for {user}")
                 raise
-
-            # Find all dropdown options
-            options = self.driver.find_elements(By.CSS_SELECTOR, "div.sesh-dropdown__option")
             option_texts = [opt.text.strip() for opt in options]
 
             # Handle different cases
+            selected = False
             if not options:
-                print(f"❌ No options available for {user}")
+                self.logger.error(f"❌ No options available for {user}")
             elif len(options) == 1:
                 if option_texts[0] == user:
-                    print(f"✅ Selected: {option_texts[0]}")
+                    self.logger.info(f"✅ Selected: {option_texts[0]}")
                     options[0].click()
+                    selected = True
                 else:
-                    print(f"⚠️ No exact match for '{user}', "
-                          f"selecting first option: {option_texts[0]}")
+                    self.logger.warning(f"⚠️ No exact match for '{user}', "
+                                        f"not selecting the only option: {option_texts[0]}")
             else:   # multiple options
-                found_match = False
                 for i, option_text in enumerate(option_texts):
                     if option_text == user:
                         options[i].click()
-                        found_match = True
+                        selected = True
                         break
 
-                if not found_match:
+                if not selected and self.interactive:
                     # print all the options and ask the user to select
                     self.prompt_to_select_multiple_options(option_texts)
+                    selected = True
+                elif not selected:
+                    self.logger.warning(f"⚠️ {len(options)} options match '{user}' but none exactly, skipping: "
+                                        f"{', '.join(option_texts)}")
+
+            # 4. Wait for the selected user to show up in the modal before typing the next one
+            if selected:
+                num_selected += 1
+                wait_for_element_count(modal, chip_selector, num_selected, timeout=self.timeouts['selection'])
+            else:
+                skipped.append(user)
 
         # Visually confirm by printing selected users
         selected = modal.find_elements(By.CSS_SELECTOR, ".sesh-dropdown__multi-value__label")
-        print([s.text for s in selected])
+        self.logger.info(f"Selected users: {[s.text for s in selected]}")
+        return skipped
 
-        self.submit_and_close_modal()
+    def submit_and_close_modal(self):
+        with self.timer.phase('submit'):
+            self._submit_and_close_modal()
 
     @retry_with_rate_limit_check
-    def submit_and_close_modal(self):
+    def _submit_and_close_modal(self):
         # Find the modal
         modal = wait_for_element(
             self.driver,
@@ -252,53 +348,211 @@ class SeshDashboardEvent:
             clickable=True
         )
 
-        # Click the button via JavaScript
+        # Click the button via JavaScript and wait for the modal to close
         self.driver.execute_script("arguments[0].click();", add_user_button)
-        time.sleep(1)  # Wait for the modal to close
+        with self.timer.wait(self.event_id, replaced_sleep=1):
+            wait_for_modal_closed(self.driver, timeout=self.timeouts['submit'])
+
+    def open_event_page(self, event_id):
+        self.event_id = event_id
+        with self.timer.phase('navigate'):
+            self.driver.get(f"{self.base_url}/events/attendees/{event_id}")
+            with self.timer.wait(event_id, replaced_sleep=2):
+                wait_for_page_ready(self.driver, timeout=self.timeouts['page'])
+
+    def get_current_lists(self, event_id, list_names=('Attendee', 'Lottery')):
+        """
+        Read the users already on the lists of an event, all lists in one read of the event page.
+
+        Returns:
+            dict: list name -> names of its users, in page order
+
+        Raises:
+            NoSuchElementException: If a list is not on the page, e.g. when LIST_SELECTOR no longer matches it,
+                                    rather than reading it as empty and adding everyone again
+        """
+        self.open_event_page(event_id)
+        with self.timer.phase('read'):
+            lists = self.driver.execute_script(
+                self.READ_LISTS_SCRIPT, list(list_names), self.LIST_SELECTOR, self.USER_SELECTOR)
+        missing = [list_name for list_name in list_names if list_name not in lists]
+        if missing:
+            raise NoSuchElementException(
+                f"List(s) {', '.join(missing)} not found on the page of event {event_id} "
+                f"(list selector {self.LIST_SELECTOR!r}, titled by their first span)")
+        return lists
+
+    @staticmethod
+    def get_missing_users(desired, current):
+        """
+        Users of desired not on the current list, in desired order, compared ignoring case and extra spaces.
+        """
+        def normalize(name):
+            return ' '.join(name.split()).casefold()
+
+        seen = {normalize(name) for name in current}
+        missing = []
+        for name in desired:
+            if normalize(name) not in seen:
+                seen.add(normalize(name))
+                missing.append(name)
+        return missing
+
+    def sync_event(self, event_id, desired_lists, debug=True):
+        """
+        Add only the users missing from the lists of an event, so that re-running after a partial failure
+        only does the remaining work.
+
+        Args:
+            event_id: Sesh event ID
+            desired_lists (dict): list name ('Lottery', 'Attendee') -> users who should be on it
+
+        Returns:
+            dict: list name -> users added, without the users skipped in the modal (see self.skipped)
+        """
+        desired_lists = {list_name: users for list_name, users in desired_lists.items() if users}
+        if not desired_lists:
+            return {}
+        current_lists = self.get_current_lists(event_id, list_names=list(desired_lists))
+        added = {}
+        for list_name, users in desired_lists.items():
+            missing = self.get_missing_users(users, current_lists.get(list_name, []))
+            if debug:
+                self.logger.info(f"{list_name} list of event {event_id}: "
+                                 f"{len(users) - len(missing)} of {len(users)} users already added")
+            added[list_name] = []
+            if missing:
+                added[list_name] = self.add_attendees_to_event(
+                    event_id=event_id, attendees=missing, list_name=list_name, debug=debug)
+        return added
 
     def add_users_to_list(self, event_id, list_name, users, debug=True):
-        """Add users to a specific list in an event"""
+        """Add users to a specific list in an event, returns the users skipped"""
         if debug:
-            print(f"Adding {len(users)} users to {list_name} list in event {event_id}")
+            self.logger.info(f"Adding {len(users)} users to {list_name} list in event {event_id}")
         
         # Navigate to the event page
-        self.driver.get(f"{self.base_url}/events/attendees/{event_id}")
-        time.sleep(2)  # Wait for page load
+        self.open_event_page(event_id)
         
         # Add users through the modal
-        self.add_users_from_modal(list_name, users)
+        return self.add_users_from_modal(list_name, users)
 
     def add_attendees_to_event(self, event_id, attendees, list_name='Attendee', debug=True):
-        """Add attendees to an event"""
+        """Add attendees to an event, returns the attendees added (not skipped in the modal)"""
         if debug:
-            print(f"Adding {len(attendees)} attendees to event {event_id}")
+            self.logger.info(f"Adding {len(attendees)} attendees to event {event_id}")
         
-        # Add attendees in chunks to avoid rate limiting
-        for chunk in chunk_list(attendees, 5):
-            self.add_users_to_list(event_id, list_name, chunk, debug)
-            time.sleep(2)  # Small delay between chunks
+        # Add attendees in chunks sized by the rate controller, a chunk starts once the previous modal has closed
+        added = []
+        for chunk in self.rate_controller.batches(attendees):
+            skipped = self.add_users_to_list(event_id, list_name, chunk, debug)
+            added.extend(user for user in chunk if user not in skipped)
+            self.rate_controller.on_success(len(chunk))
+            self.timer.add_wait(event_id, 0.0, replaced_sleep=2)
+        return added
+
+
+def upload_event(event, driver, timer=None, rate_controller=None, sync=False, dashboard_url=None, interactive=True,
+                 logger=None):
+    """
+    Add the lottery and attendee lists of one event of the dashboard yaml file.
+
+    Args:
+        event (dict): Document of the dashboard yaml file, with server_id, event_id, add_to_lottery and add_to_attendee
+        driver: Chrome driver to use
+        timer (PhaseTimer): Records the time spent in each phase
+        rate_controller (RateController): Batch size and backoff shared by the uploads
+        sync (bool): Read the lists of the event first and only add the users missing from them
+        dashboard_url: URL of the Sesh dashboard, see SeshDashboardEvent
+        interactive (bool): Ask which option to select for ambiguous names, False to skip them, see SeshDashboardEvent
+        logger (logging.Logger): Where the steps of the upload are logged, see SeshDashboardEvent
+
+    Returns:
+        dict: added and skipped, each list name -> users
+    """
+    sesh_event = SeshDashboardEvent(
+        server_id=event['server_id'], driver=driver, timer=timer, rate_controller=rate_controller,
+        dashboard_url=dashboard_url, interactive=interactive, logger=logger)
+    desired_lists = {'Lottery': event['add_to_lottery'] or [], 'Attendee': event['add_to_attendee'] or []}
+    if sync:
+        added = sesh_event.sync_event(event_id=event['event_id'], desired_lists=desired_lists)
+    else:
+        added = {}
+        for list_name, users in desired_lists.items():
+            added[list_name] = []
+            if users:
+                added[list_name] = sesh_event.add_attendees_to_event(
+                    event_id=event['event_id'],
+                    attendees=users,
+                    list_name=list_name
+                )
+    return {'added': added, 'skipped': sesh_event.skipped}
+
+
+def upload_events(events, pool=None, timer=None, rate_controller=None, sync=False):
+    """
+    Upload every event of the dashboard yaml file, reusing the drivers of pool.
+
+    Args:
+        events (list): Documents of the dashboard yaml file
+        pool (DriverPool): Drivers to upload with, default: a single driver attached to the Chrome of port 9222,
+                           left open at the end
+        timer (PhaseTimer): Records the time spent in each phase, default: the timer of the pool
+        rate_controller (RateController): Batch size and backoff shared by the uploads, its learned safe batch size
+                                          is saved at the end, default: a new one, not persisted
+        sync (bool): Only add the users missing from the lists of each event, see SeshDashboardEvent.sync_event()
+
+    Returns:
+        PhaseTimer: The timings of the upload
+    """
+    with contextlib.ExitStack() as stack:
+        if pool is None:
+            pool = stack.enter_context(DriverPool(size=1, timer=timer))
+        if timer is None:
+            timer = pool.timer
+        if rate_controller is None:
+            rate_controller = RateController()
+        stack.callback(rate_controller.save)
+        for event in events:
+            with pool.driver() as driver:
+                upload_event(event, driver, timer=timer, rate_controller=rate_controller, sync=sync)
+    return timer
 
 
 if __name__ == '__main__':
+    import argparse
     import yaml
 
-    with open("output/Clinic_sesh_dashboard_data.yaml", "r") as f:
-        events = list(yaml.safe_load_all(f))
-        for event in events:
-            server_id = event['server_id']
-            event_id = event['event_id']
-            add_to_lottery = event['add_to_lottery']
-            add_to_attendee = event['add_to_attendee']
-            sesh_event_add_attendees = SeshDashboardEvent(server_id=server_id)
-            if add_to_lottery:
-                sesh_event_add_attendees.add_attendees_to_event(
-                    event_id=event_id, 
-                    attendees=add_to_lottery,
-                    list_name='Lottery'
-                )
-            if add_to_attendee:
-                sesh_event_add_attendees.add_attendees_to_event(
-                    event_id=event_id,
-                    attendees=add_to_attendee,
-                    list_name='Attendee'
-                )
+    parser = argparse.ArgumentParser(description="Add the lottery results to the events of the Sesh dashboard.")
+    parser.add_argument('filename', type=str, nargs='?', default="output/Clinic_sesh_dashboard_data.yaml",
+                        help='The dashboard yaml file written by clinic_lottery.py')
+    parser.add_argument('--sync', action='store_true',
+                        help='Read the lists of every event first and only add the users missing from them')
+    parser.add_argument('--rate-state', type=str, default="output/sesh_dashboard_rate.json",
+                        help='JSON file keeping the learned safe batch size between runs')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of headless browsers uploading different events at once')
+    parser.add_argument('--headless', action='store_true',
+                        help='Launch headless browsers instead of attaching to the Chrome of port 9222')
+    parser.add_argument('--profile-path', type=str, default="/tmp/selenium-profile",
+                        help='Chrome profile logged in to sesh.fyi, copied for every headless browser')
+    parser.add_argument('--log-dir', type=str, default=None, help='Directory of the logs of every worker')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    with open(args.filename, "r") as f:
+        events = [event for event in yaml.safe_load_all(f) if event]
+    if args.workers > 1 or args.headless:
+        from sesh_dashboard.parallel_upload import ParallelUploader
+
+        uploader = ParallelUploader(
+            num_workers=args.workers,
+            rate_controller=RateController.load(args.rate_state, max_concurrency=args.workers),
+            sync=args.sync,
+            profile_path=args.profile_path,
+            log_dir=args.log_dir
+        )
+        print(uploader.report(uploader.run(events)))
+    else:
+        timer = upload_events(events, rate_controller=RateController.load(args.rate_state), sync=args.sync)
+        print(timer.report())
@@ -0,0 +1,168 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from sesh_dashboard.driver_pool import DriverPool
+from sesh_dashboard.event import upload_event
+from sesh_dashboard.rate_controller import RateController
+from sesh_dashboard.selenium_utils import create_chrome_driver_with_logging
+from sesh_dashboard.utils import PhaseTimer
+
+
+class ParallelUploader:
+    """
+    Upload the events of the dashboard yaml file with several headless Chrome workers at once.
+
+    Every worker has its own browser and profile and takes the next event from a shared queue. The number of
+    events uploaded at once is bounded by the slots of the rate controller, so it drops when Sesh throttles.
+    Nobody answers prompts in a worker: users matching several options but none exactly are skipped and reported.
+
+    uploader = ParallelUploader(num_workers=3, log_dir='output/upload_logs')
+    results = uploader.run(events)
+    print(uploader.report(results))
+    """
+    def __init__(self,
+                 num_workers=2,
+                 rate_controller=None,
+                 timer=None,
+                 sync=False,
+                 headless=True,
+                 profile_path="/tmp/selenium-profile",
+                 dashboard_url=None,
+                 log_dir=None,
+                 driver_factory=create_chrome_driver_with_logging):
+        """
+        Args:
+            num_workers (int): Number of browsers uploading at once, at most
+            rate_controller (RateController): Batch size, backoff and concurrency shared by the workers,
+                                              default: a new one allowing num_workers uploads at once
+            timer (PhaseTimer): Records the time spent in each phase by all workers
+            sync (bool): Only add the users missing from the lists of each event, see SeshDashboardEvent.sync_event()
+            headless (bool): Run the browsers without a window
+            profile_path (str): Chrome profile logged in to sesh.fyi, every worker starts from a copy of it
+            dashboard_url: URL of the Sesh dashboard, e.g. of StubSeshServer, see SeshDashboardEvent
+            log_dir (str): Directory of the worker logs (worker-1.log ...), None to only log to the root logger
+            driver_factory: Function launching a browser, see DriverPool
+        """
+        self.num_workers = num_workers
+        if rate_controller is None:
+            rate_controller = RateController(max_concurrency=num_workers)
+        self.rate_controller = rate_controller
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.sync = sync
+        self.headless = headless
+        self.profile_path = profile_path
+        self.dashboard_url = dashboard_url
+        self.log_dir = log_dir
+        self.driver_factory = driver_factory
+        self._log_handlers = []  # (logger, handler) of the worker log files, closed at the end of run()
+
+    def get_worker_profile_path(self, worker):
+        """
+        Profile of a worker, copied from profile_path (without its lock files) the first time, so that the workers
+        keep the login of profile_path without sharing a profile directory.
+        """
+        worker_profile_path = f'{self.profile_path}-worker-{worker}'
+        if not os.path.exists(worker_profile_path) and os.path.isdir(self.profile_path):
+            shutil.copytree(self.profile_path, worker_profile_path, ignore=shutil.ignore_patterns('Singleton*'))
+        return worker_profile_path
+
+    def get_worker_logger(self, worker):
+        logger = logging.getLogger(f'{__name__}.worker-{worker}')
+        logger.setLevel(logging.INFO)
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            log_filename = os.path.abspath(os.path.join(self.log_dir, f'worker-{worker}.log'))
+            handler = logging.FileHandler(log_filename)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            logger.addHandler(handler)
+            self._log_handlers.append((logger, handler))
+        return logger
+
+    def close_worker_logs(self):
+        for logger, handler in self._log_handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        self._log_handlers = []
+
+    def work(self, worker, pool, events, results):
+        logger = self.get_worker_logger(worker)
+        driver = None
+        while True:
+            try:
+                index, event = events.get_nowait()
+            except queue.Empty:
+                break
+            result = {'event_id': event['event_id'], 'worker': worker}
+            with self.rate_controller.slot():
+                start_time = time.perf_counter()
+                try:
+                    if driver is None:
+                        driver = pool.acquire()
+                    logger.info(f"Uploading event {event['event_id']}")
+                    result.update(upload_event(
+                        event, driver, timer=self.timer, rate_controller=self.rate_controller, sync=self.sync,
+                        dashboard_url=self.dashboard_url, interactive=False, logger=logger))
+                    result['status'] = 'ok'
+                except Exception as e:
+                    logger.error(f"Event {event['event_id']} failed: {e!r}")
+                    result['status'] = 'failed'
+                    result['error'] = repr(e)
+                result['seconds'] = time.perf_counter() - start_time
+            logger.info(f"Event {event['event_id']}: {result['status']} in {result['seconds']:.1f} s")
+            results[index] = result
+
+    def run(self, events):
+        """
+        Upload every event, and save the learned safe batch size of the rate controller at the end.
+
+        Returns:
+            list: One dict per event, in the order of events: event_id, worker, status ('ok' or 'failed'),
+                  added and skipped (list name -> users) or error, and seconds
+        """
+        num_workers = max(1, min(self.num_workers, len(events)))
+        pending = queue.Queue()
+        for index, event in enumerate(events):
+            pending.put((index, event))
+        results = [None] * len(events)
+
+        profile_paths = [self.get_worker_profile_path(worker) for worker in range(1, num_workers + 1)]
+        try:
+            with DriverPool(size=num_workers, timer=self.timer, driver_factory=self.driver_factory,
+                            profile_paths=profile_paths, headless=self.headless, attach_to_debugger=False) as pool:
+                workers = [
+                    threading.Thread(target=self.work, args=(worker, pool, pending, results), name=f'worker-{worker}')
+                    for worker in range(1, num_workers + 1)
+                ]
+                for thread in workers:
+                    thread.start()
+                for thread in workers:
+                    thread.join()
+        finally:
+            self.close_worker_logs()
+        self.rate_controller.save()
+        return results
+
+    def report(self, results):
+        """Summary of an upload: one line per event, the totals and the phase timings."""
+        lines = [f"{'event':<22}{'worker':>8}{'status':>8}{'added':>8}{'skipped':>8}{'seconds':>10}"]
+        num_skipped = 0
+        for result in results:
+            num_added = sum(len(users) for users in result.get('added', {}).values())
+            num_event_skipped = sum(len(users) for users in result.get('skipped', {}).values())
+            num_skipped += num_event_skipped
+            lines.append(f"{str(result['event_id']):<22}{result['worker']:>8}{result['status']:>8}"
+                         f"{num_added:>8}{num_event_skipped:>8}{result['seconds']:>10.1f}")
+            for list_name, users in result.get('skipped', {}).items():
+                lines.append(f"    skipped on {list_name} list (no exact match): {', '.join(users)}")
+            if 'error' in result:
+                lines.append(f"    {result['error']}")
+        num_failed = sum(result['status'] != 'ok' for result in results)
+        lines.append(f"{len(results) - num_failed} of {len(results)} events uploaded, {num_failed} failed, "
+                     f"{num_skipped} users skipped")
+        lines.append('')
+        lines.append(self.timer.report())
+        return '\n'.join(lines)
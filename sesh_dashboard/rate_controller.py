@@ -0,0 +1,167 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RateController:
+    """
+    Adaptive batch size of the dashboard uploads (AIMD): the number of users added per modal submission grows
+    by additive_increase after every successful submission and is cut by multiplicative_decrease when Sesh
+    throttles, after an exponentially growing, jittered backoff.
+
+    The largest batch that went through since the last throttle is the learned safe rate,
+    it is saved to state_filename so the next run starts from it.
+
+    Parallel uploads take a slot() around every event: the number of events uploaded at once follows the same
+    rule, halved when throttled and grown back by one after every successful submission, up to max_concurrency.
+
+    controller = RateController.load('output/sesh_dashboard_rate.json')
+    for chunk in controller.batches(users):
+        add_users(chunk)
+        controller.on_success(len(chunk))
+    controller.save()
+    """
+    def __init__(self,
+                 batch_size=5,
+                 min_batch_size=1,
+                 max_batch_size=20,
+                 additive_increase=1,
+                 multiplicative_decrease=0.5,
+                 base_backoff=5.0,
+                 max_backoff=120.0,
+                 state_filename=None,
+                 rng=None,
+                 max_concurrency=1):
+        """
+        Args:
+            batch_size (int): Initial number of users per submission
+            min_batch_size (int): Smallest batch size after decreases
+            max_batch_size (int): Largest batch size after increases
+            additive_increase (float): Batch size added after every successful submission
+            multiplicative_decrease (float): Factor the batch size is multiplied by when throttled
+            base_backoff (float): Backoff after the first throttle (in seconds), doubled for every further throttle
+                                  in a row, half of it is random jitter
+            max_backoff (float): Upper bound of the backoff (in seconds)
+            state_filename (str): JSON file the learned safe batch size is saved to, None to not persist it
+            rng (random.Random): Random generator of the jitter
+            max_concurrency (int): Largest number of slots taken at once
+        """
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state_filename = state_filename
+        self.rng = rng if rng is not None else random.Random()
+
+        self.batch_size = float(self.clip(batch_size))
+        self.safe_batch_size = int(self.batch_size)
+        self.num_throttles = 0  # throttles in a row, the exponent of the backoff
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency  # slots that may be taken at once
+        self.active = 0  # slots taken
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+
+    @classmethod
+    def load(cls, state_filename, **kwargs):
+        """
+        Controller starting from the safe batch size saved in state_filename, if it exists.
+        """
+        if os.path.exists(state_filename):
+            try:
+                with open(state_filename) as f:
+                    kwargs['batch_size'] = json.load(f)['safe_batch_size']
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable rate state {state_filename}: {e}")
+        return cls(state_filename=state_filename, **kwargs)
+
+    def clip(self, batch_size):
+        return min(max(batch_size, self.min_batch_size), self.max_batch_size)
+
+    def get_batch_size(self):
+        with self._lock:
+            return int(self.batch_size)
+
+    def batches(self, items):
+        """
+        Split items into batches, each as large as the batch size at the time it is taken.
+        """
+        start = 0
+        while start < len(items):
+            batch_size = self.get_batch_size()
+            yield items[start:start + batch_size]
+            start += batch_size
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Wait until fewer than concurrency slots are taken, and hold one."""
+        with self._slot_released:
+            while self.active >= self.concurrency:
+                self._slot_released.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._slot_released:
+                self.active -= 1
+                self._slot_released.notify_all()
+
+    def on_success(self, batch_size):
+        """
+        A batch went through: remember its size as safe and, if it was a full batch, grow the next one.
+        A shorter batch, e.g. the last users of a list, says nothing about the current batch size.
+
+        Args:
+            batch_size (int): Number of users of the batch
+        """
+        with self._lock:
+            self.num_throttles = 0
+            self.safe_batch_size = max(self.safe_batch_size, batch_size)
+            if batch_size >= int(self.batch_size):
+                self.batch_size = float(self.clip(self.batch_size + self.additive_increase))
+            if self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._slot_released.notify_all()
+
+    def on_rate_limited(self):
+        """
+        Sesh throttled: shrink the batch size and compute how long to back off.
+
+        Returns:
+            float: Seconds to wait before retrying
+        """
+        with self._lock:
+            self.num_throttles += 1
+            self.batch_size = float(self.clip(self.batch_size * self.multiplicative_decrease))
+            self.safe_batch_size = int(self.batch_size)
+            self.concurrency = max(1, self.concurrency // 2)
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.num_throttles - 1))
+        backoff = backoff / 2 + self.rng.uniform(0, backoff / 2)
+        logger.warning(f"⏸️ Rate limited, batch size down to {int(self.batch_size)}, "
+                       f"{self.concurrency} uploads at once, backing off {backoff:.1f} s")
+        return backoff
+
+    def save(self):
+        """Write the learned safe batch size to state_filename."""
+        if not self.state_filename:
+            return
+        with self._lock:
+            state = {
+                'safe_batch_size': self.safe_batch_size,
+                'updated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            }
+        directory = os.path.dirname(self.state_filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_filename = f'{self.state_filename}.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_filename, self.state_filename)
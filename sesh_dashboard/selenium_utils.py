@@ -2,6 +2,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
+import functools
 import logging
 import time
 from selenium import webdriver
@@ -12,6 +13,17 @@ from webdriver_manager.chrome import ChromeDriverManager
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def get_chromedriver_path() -> str:
+    """
+    Resolve (and download if needed) the ChromeDriver matching the installed Chrome, once per process.
+
+    Returns:
+        str: Path to the ChromeDriver executable
+    """
+    return ChromeDriverManager().install()
+
+
 def create_chrome_driver_with_logging(
         profile_path: str = "/tmp/selenium-profile",
         headless: bool = False,
@@ -53,8 +65,8 @@ def create_chrome_driver_with_logging(
         # Enable browser log collection
         options.set_capability("goog:loggingPrefs", {"browser": "ALL"})
 
-        # Install and setup ChromeDriver
-        service = Service(ChromeDriverManager().install())
+        # Install and setup ChromeDriver, resolved once and reused by every later driver
+        service = Service(get_chromedriver_path())
         driver = webdriver.Chrome(service=service, options=options)
 
         # Log version information
@@ -109,6 +121,84 @@ def wait_for_element(driver, selector, by=By.CSS_SELECTOR, timeout=10, clickable
     condition = EC.element_to_be_clickable if clickable else EC.presence_of_element_located
     return wait.until(condition((by, selector)))
 
+def wait_for_page_ready(driver, timeout=15, idle_time=0.5, poll_frequency=0.1):
+    """
+    Wait until the page has loaded and the network is idle: document.readyState is 'complete' and no new
+    resource (XHR, script, image ...) was fetched for idle_time seconds.
+
+    Args:
+        driver: Selenium WebDriver instance
+        timeout: Upper bound of the wait (in seconds)
+        idle_time: How long no new request may start for the network to count as idle (in seconds)
+        poll_frequency: How often the page is checked (in seconds)
+
+    Raises:
+        TimeoutException: If the page is not ready within timeout
+    """
+    state = {'count': -1, 'since': time.monotonic()}
+
+    def network_idle(driver):
+        ready_state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length];")
+        now = time.monotonic()
+        if ready_state != 'complete' or count != state['count']:
+            state['count'], state['since'] = count, now
+            return False
+        return now - state['since'] >= idle_time
+
+    WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(network_idle)
+
+
+def wait_for_modal_closed(driver, selector="div.modal.is-active", timeout=10):
+    """
+    Wait until the active modal is gone (closed or hidden).
+
+    Raises:
+        TimeoutException: If the modal is still open after timeout seconds
+    """
+    WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        EC.invisibility_of_element_located((By.CSS_SELECTOR, selector)))
+
+
+def wait_for_element_count(driver, selector, count, by=By.CSS_SELECTOR, timeout=10):
+    """
+    Wait until at least count elements match selector, e.g. the selected users of a modal.
+
+    Args:
+        driver: Selenium WebDriver instance, or a WebElement to search in
+
+    Returns:
+        list: The matching elements
+    """
+    def enough_elements(_):
+        elements = driver.find_elements(by, selector)
+        return elements if len(elements) >= count else False
+
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(enough_elements)
+
+
+def wait_for_dropdown_options(driver, timeout=10):
+    """
+    Wait until the search dropdown has finished loading and shows its options, or says there are none.
+
+    Returns:
+        list: The option elements, empty if no option matches the search
+    """
+    # the options are wrapped in a tuple, as WebDriverWait keeps waiting while the condition returns an empty list
+    def options_loaded(driver):
+        if driver.find_elements(By.CSS_SELECTOR, ".sesh-dropdown__menu-notice--loading"):
+            return False
+        options = driver.find_elements(By.CSS_SELECTOR, "div.sesh-dropdown__option")
+        if options:
+            return (options,)
+        if driver.find_elements(By.CSS_SELECTOR, ".sesh-dropdown__menu-notice--no-options"):
+            return ([],)
+        return False
+
+    options, = WebDriverWait(driver, timeout, poll_frequency=0.1).until(options_loaded)
+    return options
+
+
 def hide_tooltips(driver):
     """
     Hide any tooltips that might be blocking interactions.
@@ -161,11 +251,14 @@ def check_rate_limit(driver_or_event):
 def retry_with_rate_limit_check(func, max_retries=2, delay=30):
     """
     Decorator to retry a function with rate limit checking.
+
+    When the object has a rate_controller (RateController), it decides the backoff and shrinks the batch size,
+    otherwise the retry waits a flat delay.
     
     Args:
         func: Function to retry
         max_retries: Maximum number of retry attempts
-        delay: Delay between retries in seconds
+        delay: Delay between retries in seconds, without a rate_controller
     
     Returns:
         The result of the function if successful
@@ -177,8 +270,12 @@ def retry_with_rate_limit_check(func, max_retries=2, delay=30):
             except TimeoutException as e:
                 if check_rate_limit(self.driver):
                     if attempt < max_retries:
-                        logger.warning(f"⏸️ Rate limited, waiting {delay} seconds before retry...")
-                        time.sleep(delay)
+                        rate_controller = getattr(self, 'rate_controller', None)
+                        if rate_controller is not None:
+                            time.sleep(rate_controller.on_rate_limited())
+                        else:
+                            logger.warning(f"⏸️ Rate limited, waiting {delay} seconds before retry...")
+                            time.sleep(delay)
                         continue
                 raise e
     return wrapper 
\ No newline at end of file
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_PAGE_FILENAME = os.path.join(os.path.dirname(__file__), 'stub', 'event_page.html')
+EVENT_PATH = re.compile(r'^/dashboard/(?P<server_id>[^/]+)/events/attendees/(?P<event_id>[^/]+)(?P<add>/add)?$')
+
+
+class StubSeshServer:
+    """
+    Local stand-in for the Sesh dashboard, serving the stub event page (stub/event_page.html) so the uploader
+    can run without the real site, e.g. in CI.
+
+    Every event has an Attendee and a Lottery list kept in memory, the Add Users modal of the page posts to it.
+
+    with StubSeshServer(directory=['Alice', 'Bob']) as server:
+        SeshDashboardEvent(server_id='1', driver=driver, dashboard_url=server.dashboard_url)
+        server.get_lists('42')  # {'Attendee': [...], 'Lottery': [...]}
+    """
+    LIST_NAMES = ('Attendee', 'Lottery')
+
+    def __init__(self, directory, lists=None, host='127.0.0.1', port=0):
+        """
+        Args:
+            directory (list): Users the search dropdown of the modal finds
+            lists (dict): Initial lists, event ID -> {list name -> users}
+            host: Address to listen on
+            port (int): Port to listen on, 0 picks a free one
+        """
+        self.directory = list(directory)
+        self.lists = {
+            str(event_id): {list_name: list(event_lists.get(list_name, [])) for list_name in self.LIST_NAMES}
+            for event_id, event_lists in (lists or {}).items()
+        }
+        self.num_adds = 0  # Add Users submissions received
+        self._lock = threading.Lock()
+        with open(STUB_PAGE_FILENAME) as f:
+            self.page_template = f.read()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def dashboard_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/dashboard'
+
+    def get_lists(self, event_id):
+        with self._lock:
+            event_lists = self.lists.setdefault(str(event_id), {list_name: [] for list_name in self.LIST_NAMES})
+            return {list_name: list(users) for list_name, users in event_lists.items()}
+
+    def add_users(self, event_id, list_name, users):
+        with self._lock:
+            self.num_adds += 1
+            event_lists = self.lists.setdefault(str(event_id), {name: [] for name in self.LIST_NAMES})
+            event_list = event_lists.setdefault(list_name, [])
+            event_list.extend(user for user in users if user not in event_list)
+        return self.get_lists(event_id)
+
+    def render(self, event_id):
+        state = {'event_id': event_id, 'lists': self.get_lists(event_id), 'directory': self.directory}
+        return self.page_template.replace('/*STATE*/', json.dumps(state))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = EVENT_PATH.match(self.path)
+                if match is None or match['add']:
+                    self.send_error(404)
+                    return
+                self._send(server.render(match['event_id']), 'text/html')
+
+            def do_POST(self):
+                match = EVENT_PATH.match(self.path)
+                if match is None or not match['add']:
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                event_lists = server.add_users(match['event_id'], body['list_name'], body['users'])
+                self._send(json.dumps({'lists': event_lists}), 'application/json')
+
+            def _send(self, content, content_type):
+                content = content.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -8,5 +8,94 @@
 # Write scripts that automatically import the exported CSV files into your database.
 # identify the chrome session
 
+import collections
+import contextlib
+import threading
+import time
+
+
 def chunk_list(users, chunk_size=5):
     return [users[i:i + chunk_size] for i in range(0, len(users), chunk_size)]
+
+
+class PhaseTimer:
+    """
+    Wall-clock time spent in each phase of the dashboard automation, e.g. launch, navigate, modal, submit.
+
+    timer = PhaseTimer()
+    with timer.phase('navigate'):
+        driver.get(url)
+    print(timer.report())
+    """
+    def __init__(self):
+        self.durations = collections.defaultdict(list)  # phase name -> seconds of every run, in order
+        self.waits = collections.defaultdict(lambda: [0.0, 0.0])  # event -> [seconds waited, fixed sleeps replaced]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.durations[name].append(seconds)
+
+    @contextlib.contextmanager
+    def wait(self, key, replaced_sleep):
+        """
+        Time a condition wait that replaced a fixed sleep of replaced_sleep seconds, see savings().
+
+        Args:
+            key: What the wait is counted for, e.g. the event ID
+            replaced_sleep: Seconds of the fixed sleep the wait replaced
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_wait(key, time.perf_counter() - start, replaced_sleep)
+
+    def add_wait(self, key, seconds, replaced_sleep):
+        with self._lock:
+            self.waits[key][0] += seconds
+            self.waits[key][1] += replaced_sleep
+
+    def savings(self):
+        """
+        Returns:
+            dict: key -> {'waited', 'replaced', 'saved'} in seconds, the time spent in condition waits,
+                  the fixed sleeps they replaced and the difference
+        """
+        with self._lock:
+            return {
+                key: {'waited': waited, 'replaced': replaced, 'saved': replaced - waited}
+                for key, (waited, replaced) in self.waits.items()
+            }
+
+    def summary(self):
+        """
+        Returns:
+            dict: phase name -> {'count', 'total', 'mean'} in seconds, in the order the phases first ran
+        """
+        with self._lock:
+            return {
+                name: {'count': len(seconds), 'total': sum(seconds), 'mean': sum(seconds) / len(seconds)}
+                for name, seconds in self.durations.items()
+            }
+
+    def report(self):
+        lines = [f"{'phase':<12}{'count':>8}{'total (s)':>12}{'mean (s)':>12}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<12}{stats['count']:>8}{stats['total']:>12.2f}{stats['mean']:>12.2f}")
+        savings = self.savings()
+        if savings:
+            lines.append('')
+            lines.append(f"{'event':<22}{'waited (s)':>12}{'fixed sleeps (s)':>18}{'saved (s)':>12}")
+            for key, stats in savings.items():
+                lines.append(
+                    f"{str(key):<22}{stats['waited']:>12.2f}{stats['replaced']:>18.2f}{stats['saved']:>12.2f}")
+        return '\n'.join(lines)
@@ -1,6 +1,9 @@
+import functools
 import re
 from datetime import datetime
 
+import pandas as pd
+
 
 def convert_date_str_to_obj(date_str):
 	# Convert to datetime object
@@ -30,26 +33,53 @@ OTHER = 'other'
 
 
 class SeshEventTypeClassifier:
+	# classification rules in order of precedence: (group name, pattern, event type)
+	# an event type of None means the matched text itself is the event type
+	RULES = [
+		('adv_int_clinic', r'Advanced Intermediate Clinic', ADV_INT_CLINIC),
+		('int_clinic', r'Intermediate Clinic', INT_CLINIC),
+		('adv_beg_clinic', r'Advanced Beginner Clinic', ADV_BEG_CLINIC),
+		('beg_clinic', r'Beginner Clinic', BEG_CLINIC),
+		('round_robin', r'Round Robin - \d\.\d+ to \d\.\d+', None),
+		('dupr_matches', r'DUPR Matches', DUPR_MATCHES),
+		('getting_started', r'Getting Started', GETTING_STARTED),
+		('ball_machine_session', r'Ball Machine Session\s*\([0-9.,\s]+\)', BALL_MACHINE_SESSION),
+	]
+
+	# A single alternation of lookaheads anchored at the start of the name: the first rule that matches
+	# anywhere in the name wins, which preserves the precedence of the rules regardless of match position.
+	PATTERN = re.compile(
+		'^(?:' + '|'.join(rf'(?=.*?(?P<{group}>{pattern}))' for group, pattern, _ in RULES) + ')',
+		re.IGNORECASE | re.DOTALL
+	)
+	EVENT_TYPES = {group: event_type for group, _, event_type in RULES}
+
 	@staticmethod
+	@functools.lru_cache(maxsize=None)
 	def classify(event_name: str) -> str:
-		if re.search(r'Advanced Intermediate Clinic', event_name, re.IGNORECASE):
-			return ADV_INT_CLINIC
-		elif re.search(r'Intermediate Clinic', event_name, re.IGNORECASE):
-			return INT_CLINIC
-		elif re.search(r'Advanced Beginner Clinic', event_name, re.IGNORECASE):
-			return ADV_BEG_CLINIC
-		elif re.search(r'Beginner Clinic', event_name, re.IGNORECASE):
-			return BEG_CLINIC
-		elif re.search(r'Round Robin - \d\.\d+ to \d\.\d+', event_name, re.IGNORECASE):
-			return re.findall(r'Round Robin - \d\.\d+ to \d\.\d+', event_name, re.IGNORECASE)[0]
-		elif re.search(r'DUPR Matches', event_name, re.IGNORECASE):
-			return DUPR_MATCHES
-		elif re.search(r'Getting Started', event_name, re.IGNORECASE):
-			return GETTING_STARTED
-		elif re.search(r'Ball Machine Session\s*\([0-9.,\s]+\)', event_name, re.IGNORECASE):
-			return BALL_MACHINE_SESSION
-		else:
+		match = SeshEventTypeClassifier.PATTERN.match(event_name)
+		if match is None:
 			return OTHER
+		group = match.lastgroup
+		return SeshEventTypeClassifier.EVENT_TYPES[group] or match.group(group)
+
+	@classmethod
+	def classify_many(cls, event_names: pd.Series) -> pd.Series:
+		"""
+		Classify a Series of event names at once. Recurring events repeat the same names every week,
+		so each distinct name is only matched once.
+
+		:param event_names: Series of event names
+		:return: Series of event types with the same index
+		"""
+		unique_names = pd.Series(event_names.dropna().unique(), dtype=object)
+		matches = unique_names.str.extract(cls.PATTERN)
+		unique_event_types = pd.Series(OTHER, index=unique_names.index, dtype=object)
+		for group, event_type in cls.EVENT_TYPES.items():
+			matched = matches[group].notna()
+			unique_event_types[matched] = matches.loc[matched, group] if event_type is None else event_type
+		event_types = event_names.map(dict(zip(unique_names, unique_event_types)))
+		return event_types.fillna(OTHER).astype(object)
 
 
 class SeshRSVPParser:
@@ -78,6 +108,12 @@ class SeshRSVPParser:
 		(?=\s*(?:,\s*{next_section_header_pattern})|$)  	# Lookahead for the next section header or end of string
 		"""
 
+	# compiled once, instead of on every call
+	section_regex = re.compile(section_pattern, re.VERBOSE)
+	name_separator_regex = re.compile(r'\s*,\s*')
+	nickname_regex = re.compile(nickname_pattern)
+	nickname_quote_regex = re.compile(r'[“"”]')
+
 	@classmethod
 	def parse(cls, rsvpers_str: str) -> dict:
 		"""
@@ -90,21 +126,162 @@ class SeshRSVPParser:
 		if not isinstance(rsvpers_str, str):
 			return {}
 
-		result = {}
-		sections = re.findall(cls.section_pattern, rsvpers_str, flags=re.VERBOSE)
+		# the cached result is immutable, callers get a fresh dictionary they are free to modify
+		return {section_header: list(names) for section_header, names in cls._parse_sections(rsvpers_str)}
 
-		# Step 2: Find all matches using the pattern
-		for section_header, section_value in sections:
+	@classmethod
+	def parse_many(cls, rsvpers_strs: pd.Series) -> pd.Series:
+		"""
+		Parse a Series of rsvpers strings, see parse().
+
+		:param rsvpers_strs: Series of rsvpers strings (non-strings are parsed as empty dictionaries)
+		:return: Series of dictionaries with the same index
+		"""
+		return rsvpers_strs.map(cls.parse)
+
+	@staticmethod
+	@functools.lru_cache(maxsize=65536)
+	def _parse_sections(rsvpers_str: str) -> tuple:
+		"""
+		Parse rsvpers_str into a tuple of (section header, tuple of names), memoized per distinct string.
+		"""
+		result = []
+		for section_header, section_value in SeshRSVPParser.find_sections(rsvpers_str):
 			cleaned_section_value = section_value.strip(' ,"')
-			full_names = re.split(r'\s*,\s*', cleaned_section_value)
-			names = cls.remove_nicknames(full_names)
-			result[section_header] = names
-		return result
+			full_names = SeshRSVPParser.name_separator_regex.split(cleaned_section_value)
+			names = SeshRSVPParser.remove_nicknames(full_names)
+			result.append((section_header, tuple(names)))
+		return tuple(result)
+
+	@classmethod
+	def find_sections_regex(cls, rsvpers_str: str) -> list:
+		"""
+		Reference implementation of find_sections(), which must return the same sections (see test.py).
+
+		:return: list of (section header, section value) tuples
+		"""
+		return cls.section_regex.findall(rsvpers_str)
+
+	# end of a section header: a colon, or a closing quote followed by a colon
+	header_end_regex = re.compile(r':|"(?=\s*:)')
+
+	@classmethod
+	def find_sections(cls, rsvpers_str: str) -> list:
+		"""
+		Single-scan equivalent of find_sections_regex(rsvpers_str).
+
+		Instead of trying the next-section lookahead at every character, the scan jumps between the
+		positions where a section header can end and only checks the commas right before them,
+		which keeps it linear in the length of the string. Parsing a Sesh export with a cold cache is
+		several times faster than with the regular expression, see bench_parse_rsvpers() in benchmark.py.
+
+		:return: list of (section header, section value) tuples
+		"""
+		s = rsvpers_str
+		n = len(s)
+		if '\n' in s:
+			# '.' and '$' treat newlines specially, leave those rare strings to the regular expression
+			return cls.find_sections_regex(s)
+
+		def skip_whitespace(p):
+			while p < n and s[p].isspace():
+				p += 1
+			return p
+
+		def next_special(p):
+			# position of the next '"' or ':' at or after p, n if there is none
+			quote, colon = s.find('"', p), s.find(':', p)
+			if quote < 0:
+				return n if colon < 0 else colon
+			return quote if colon < 0 else min(quote, colon)
+
+		def ends_header(k):
+			# whether a header text ending at k is followed by an optional closing quote and a colon
+			if k >= n:
+				return False
+			if s[k] == ':':
+				return True
+			if s[k] == '"':
+				colon = skip_whitespace(k + 1)
+				return colon < n and s[colon] == ':'
+			return False
+
+		def match_header(i):
+			# match (?:"\s*)?([^":]+)(?:"\s*)?(?:\s*:\s*) at i, return (header start, header end) or None
+			if s[i] == '"':
+				j = skip_whitespace(i + 1)
+				k = next_special(j)
+				if ends_header(k):
+					if k > j:
+						return j, k
+					if j > i + 1:
+						# backtrack a whitespace character into the otherwise empty header
+						return j - 1, k
+				return None
+			if s[i] == ':':
+				return None
+			k = next_special(i)
+			return (i, k) if ends_header(k) else None
+
+		def next_header_after_comma(r0):
+			# lookahead ,\s*(?:"\s*)?[^":]+(?:"\s*)?\s*: right after the comma at r0 - 1
+			r = skip_whitespace(r0)
+			if r > r0 and ends_header(next_special(r)):
+				return True
+			if r >= n or s[r] == ':':
+				return False
+			if s[r] == '"':
+				j = skip_whitespace(r + 1)
+				k = next_special(j)
+				return ends_header(k) and (k > j or j > r + 1)
+			return ends_header(next_special(r))
+
+		def find_value_end(v):
+			# end of the non-greedy value starting at v: before the first comma (and the whitespace
+			# preceding it) that is followed by the next section header, or the end of the string
+			target = v
+			while True:
+				match = cls.header_end_regex.search(s, target)
+				if match is None:
+					return n
+				k = match.start()
+				# only commas after the last special character before k can reach it,
+				# or after the one before that if it is a quote right behind the comma
+				last_special = max(s.rfind('"', v, k), s.rfind(':', v, k))
+				if last_special >= 0 and s[last_special] == '"':
+					last_special = max(s.rfind('"', v, last_special), s.rfind(':', v, last_special))
+				comma = s.find(',', max(v, last_special + 1), k)
+				while comma >= 0:
+					if next_header_after_comma(comma + 1):
+						end = comma
+						while end > v and s[end - 1].isspace():
+							end -= 1
+						return end
+					comma = s.find(',', comma + 1, k)
+				target = k + 1
+
+		sections = []
+		i = 0
+		while i < n:
+			header = match_header(i)
+			if header is None:
+				if s[i] in '":':
+					i += 1
+				else:
+					i = next_special(i)
+				continue
+			header_start, header_end = header
+			colon = header_end if s[header_end] == ':' else skip_whitespace(header_end + 1)
+			value_start = skip_whitespace(colon + 1)
+			value_end = find_value_end(value_start)
+			sections.append((s[header_start:header_end], s[value_start:value_end]))
+			i = value_end
+		return sections
 
 	@classmethod
 	def remove_nicknames(cls, names):
-		names = [
-			re.sub(cls.nickname_pattern, ' ', name.strip())
-			for name in names if len(name) > 0 and not name.isspace()
+		names = [name.strip() for name in names if len(name) > 0 and not name.isspace()]
+		return [
+			cls.nickname_regex.sub(' ', name) if cls.nickname_quote_regex.search(name) else name
+			for name in names
 		]
-		return names
@@ -1,13 +1,41 @@
+import collections
+import copy
+import json
+import logging
 import os
+import random
+import shutil
 import unittest
 import tempfile
+import threading
+import time
+import urllib.request
+import numpy as np
 import pandas as pd
 from utils import generate_unique_filename  # Replace with the actual module name
 from sesh import SeshData, ATTENDEES, WAITLIST, EVENT_NAME, EVENT_TYPE, START_DATE, RSVPER_NAMES
 from history import EventParticipationTracker
+from history_store import AttendanceHistoryStore
+from sesh_cache import SeshSnapshotCache
+from attendance_matrix import AttendanceMatrix
 from lottery import Lottery  # Assuming Lottery class is saved in lottery.py
+from lottery_simulator import LotterySimulator
+from lottery_replay import LotteryReplay
+from participant_registry import ParticipantRegistry
 import datetime
-from sesh_util import convert_date_str_to_obj, SeshRSVPParser
+from sesh_util import convert_date_str_to_obj, SeshRSVPParser, SeshEventTypeClassifier
+from gsheet_util import SheetsSession
+from publisher import Publisher, PublishError
+from batch_lottery import run_batch
+from clinic_lottery import ClinicLottery
+from sesh_dashboard.driver_pool import DriverPool
+from sesh_dashboard.utils import PhaseTimer
+from sesh_dashboard.rate_controller import RateController
+from sesh_dashboard.event import SeshDashboardEvent
+from sesh_dashboard.parallel_upload import ParallelUploader
+from sesh_dashboard.stub_server import StubSeshServer
+from sesh_dashboard.selenium_utils import wait_for_page_ready, wait_for_dropdown_options
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 
 # Unit test_data class for parse_rsvpers_string
@@ -77,6 +105,65 @@ class TestParseRsvpersString(unittest.TestCase):
         }
         self.assertEqual(SeshRSVPParser.parse(input_str), expected_output)
 
+    def test_find_sections_matches_regex(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20000):
+            input_str = ''.join(rng.choice(list('"":,, \tab'), size=rng.integers(0, 14)))
+            self.assertEqual(SeshRSVPParser.find_sections(input_str),
+                             SeshRSVPParser.find_sections_regex(input_str), repr(input_str))
+
+    def test_find_sections_matches_regex_on_rsvpers(self):
+        rng = np.random.default_rng(0)
+        names = ['Doug Felt', 'Hui (Helen) Li', 'Mora "Mo" Kan', 'Jay “J” Gitterman', 'Ivy Tam', ' ', '']
+        headers = ['Lottery', 'Attendees', 'Attendees Waitlist', ' Maybe ']
+
+        def section(header):
+            opening_quote, closing_quote, end_quote = rng.choice(['', '"'], size=3)
+            names_str = rng.choice([',', ', ', '\n,']).join(rng.choice(names, size=rng.integers(0, 5)))
+            return f'{opening_quote}{header}{closing_quote}{rng.choice([":", " : "])}{names_str}{end_quote}'
+
+        for _ in range(2000):
+            sections = [section(header) for header in rng.choice(headers, size=rng.integers(1, 4), replace=False)]
+            input_str = rng.choice([',', ', ', ',\n']).join(sections)
+            self.assertEqual(SeshRSVPParser.find_sections(input_str),
+                             SeshRSVPParser.find_sections_regex(input_str), repr(input_str))
+
+    def test_parse_many_returns_independent_results(self):
+        rsvpers = pd.Series(['"Lottery: Doug Felt"', '"Lottery: Doug Felt"', np.nan])
+        parsed = SeshRSVPParser.parse_many(rsvpers)
+        self.assertEqual(parsed.tolist(), [{'Lottery': ['Doug Felt']}, {'Lottery': ['Doug Felt']}, {}])
+        parsed[0]['Lottery'].append('Jane Smith')
+        self.assertEqual(SeshRSVPParser.parse('"Lottery: Doug Felt"'), {'Lottery': ['Doug Felt']})
+
+
+class TestSeshEventTypeClassifier(unittest.TestCase):
+    def setUp(self):
+        self.expected = {
+            'Advanced Intermediate Clinic (3.5)': 'Clinic-AI',
+            'intermediate clinic (3.25)': 'Clinic-I',
+            'Advanced Beginner Clinic (2.75 to 3.0)': 'Clinic-AB',
+            'Beginner Clinic (2.0 to 2.5)': 'Clinic-B',
+            # rule precedence wins over the position of the match in the name
+            'Beginner Clinic followed by Intermediate Clinic': 'Clinic-I',
+            'round robin - 3.25 to 3.75 (Round Robin - 2.5 to 3.0)': 'round robin - 3.25 to 3.75',
+            'Round Robins - NO EVENT THIS WEEK': 'other',
+            'DUPR Matches 2.75 to 3.75': 'DUPR',
+            'Getting Started': 'GS',
+            'Ball Machine Session (3.0, 3.25)': 'Ball Machine Session',
+            'Ball Machine Session(All levels)': 'other',
+            'Youth Pickleball Meetup': 'other',
+        }
+
+    def test_classify(self):
+        for event_name, event_type in self.expected.items():
+            self.assertEqual(SeshEventTypeClassifier.classify(event_name), event_type, event_name)
+
+    def test_classify_many(self):
+        event_names = pd.Series(list(self.expected) * 2 + [float('nan')], index=range(10, 35))
+        event_types = SeshEventTypeClassifier.classify_many(event_names)
+        self.assertEqual(event_types.index.tolist(), event_names.index.tolist())
+        self.assertEqual(event_types.tolist(), list(self.expected.values()) * 2 + ['other'])
+
 
 class TestRemoveCanceledEvent(unittest.TestCase):
 
@@ -234,6 +321,16 @@ class TestRemoveCanceledEvent(unittest.TestCase):
         pd.testing.assert_frame_equal(self.df.reset_index(drop=True), expected_df.reset_index(drop=True))
 
 
+def get_small_df(attendance_df, attendee_names):
+    """
+    History of attendee_names in attendance_df, with a row of missing history for the attendees not in it.
+    """
+    attendance_df = attendance_df[attendance_df.index.isin(attendee_names)]
+    missing_attendees = list(set(attendee_names) - set(attendance_df.index))
+    attendance_df = attendance_df.reindex(attendance_df.index.tolist() + missing_attendees)
+    return attendance_df['History']
+
+
 class TestLottery(unittest.TestCase):
 
     def setUp(self):
@@ -298,7 +395,7 @@ class TestLottery(unittest.TestCase):
         # Test behavior when fewer than 16 attendees are in the DataFrame
         small_attendance_df = self.attendance_df.head(small_attendance_size)  # Only 2 attendees
         attendee_names = ['Alice', 'Bob', 'Charlie', 'Mary']
-        df = EventParticipationTracker._get_small_df(attendance_df=small_attendance_df, attendee_names=attendee_names)
+        df = get_small_df(attendance_df=small_attendance_df, attendee_names=attendee_names)
         small_lottery = Lottery(attendance_df=df)
         small_lottery.select_attendees_and_waitlist(num_participants=num_winners)
         attendees = small_lottery.result[ATTENDEES]
@@ -313,7 +410,7 @@ class TestLottery(unittest.TestCase):
         # Test case where all attendees have zero attendance
         zero_attendance_df = pd.DataFrame(False, index=self.attendance_df.index, columns=self.attendance_df.columns)
         attendee_names = ['Alice', 'Bob', 'Charlie', 'Mary', 'James']
-        df = EventParticipationTracker._get_small_df(attendance_df=zero_attendance_df, attendee_names=attendee_names)
+        df = get_small_df(attendance_df=zero_attendance_df, attendee_names=attendee_names)
         zero_lottery = Lottery(attendance_df=df)
         zero_lottery.select_attendees_and_waitlist(num_participants=num_winners)
         attendees = zero_lottery.result[ATTENDEES]
@@ -330,6 +427,183 @@ class TestLottery(unittest.TestCase):
             self.assertEqual(len(waitlist), len(attendee_names) - num_winners)
 
 
+class TestVectorizedPriority(unittest.TestCase):
+    def setUp(self):
+        self.attendance_df = pd.DataFrame({
+            '2024-10-21 to 2024-10-27': [['Clinic-I'], float('nan'), ['Clinic-AB', 'Clinic-I'], []],
+            '2024-10-14 to 2024-10-20': [['Clinic-I'], ['Clinic-I'], float('nan'), float('nan')],
+            '2024-10-07 to 2024-10-13': [float('nan'), ['Clinic-AI'], ['Clinic-I'], ['Clinic-I']],
+        }, index=pd.Index(['Alice', 'Bob', 'Charlie', 'David']))
+
+    def test_attendance_matrix(self):
+        expected = [[1, 1, 0], [0, 1, 1], [1, 0, 1], [0, 0, 1]]
+        self.assertEqual(AttendanceMatrix.from_frame(self.attendance_df).attended().tolist(), expected)
+
+    def test_scores_match_weighted_sum_for_fixed_seed(self):
+        lottery = Lottery(event_type='Clinic-I', attendance_df=self.attendance_df, max_num_attendees=2)
+        np.random.seed(42)
+        priority_df = lottery.compute_priority()
+
+        np.random.seed(42)
+        noise = np.random.uniform(0, 1, size=4)
+        expected = pd.Series([4 + 2 + noise[0], 2 + 1 + noise[1], 4 + 1 + noise[2], 1 + noise[3]],
+                             index=self.attendance_df.index)
+        for name, score in priority_df[Lottery.SCORE_COL_NAME].items():
+            self.assertEqual(score, expected[name])
+
+
+class TestLotteryRng(unittest.TestCase):
+    def test_same_seed_same_order(self):
+        attendance_df = pd.DataFrame({'week': [float('nan')] * 20}, index=pd.Index([f'P{i}' for i in range(20)]))
+        orders = []
+        for _ in range(2):
+            lottery = Lottery(event_type='Clinic-I', attendance_df=attendance_df, max_num_attendees=5,
+                              rng=np.random.default_rng(np.random.SeedSequence(7).spawn(1)[0]))
+            np.random.seed(len(orders))     # the global random state is not used
+            orders.append(lottery.compute_priority().index.tolist())
+        self.assertEqual(orders[0], orders[1])
+
+
+class TestDeprioritizeParticipants(unittest.TestCase):
+    def test_tiers_applied_in_order(self):
+        attendance_df = pd.DataFrame({'week': [float('nan')] * 4}, index=pd.Index(['Alice', 'Bob', 'Charlie', 'David']))
+        lottery = Lottery(event_type='Clinic-I', attendance_df=attendance_df, max_num_attendees=2)
+        lottery.priority_df = lottery.compute_priority()
+        lottery.deprioritize_participants([
+            (['Alice', 'Bob', 'Mary'], Lottery.EXCLUDED_PRIORITY),
+            ({'Bob', 'Charlie'}, Lottery.MULTI_SIGNUP_PRIORITY),
+            ([], 300),
+        ])
+        scores = lottery.priority_df[Lottery.SCORE_COL_NAME]
+        self.assertEqual(scores['Alice'], Lottery.EXCLUDED_PRIORITY)
+        self.assertEqual(scores['Bob'], Lottery.MULTI_SIGNUP_PRIORITY)
+        self.assertEqual(scores['Charlie'], Lottery.MULTI_SIGNUP_PRIORITY)
+        self.assertLess(scores['David'], 1)
+
+
+class TestTopKSelection(unittest.TestCase):
+    def setUp(self):
+        names = [f'P{i}' for i in range(50)]
+        attendance_df = pd.DataFrame({
+            'week 2': [['Clinic-I'] if i % 3 == 0 else float('nan') for i in range(50)],
+            'week 1': [['Clinic-B'] if i % 4 == 0 else float('nan') for i in range(50)],
+        }, index=pd.Index(names))
+        self.lottery = Lottery(event_type='Clinic-I', attendance_df=attendance_df, max_num_attendees=8,
+                               rng=np.random.default_rng(3))
+        self.lottery.select_and_sort_attendees(exclude_from_lottery=['P1'], all_participants=['P2'])
+
+    def test_report_table_is_built_on_demand(self):
+        result = self.lottery.get_result()
+        attendees = self.lottery.get_attendees()
+        self.assertEqual(len(attendees), 8)
+        self.assertEqual(result.get_names(ATTENDEES), attendees)
+        self.assertEqual(self.lottery.get_attendee_list(), attendees + self.lottery.get_waitlist())
+        self.assertIsNone(result._participant_df)
+
+        participant_df = self.lottery.participant_df
+        groups = participant_df[Lottery.GROUP_COL_NAME]
+        self.assertEqual(participant_df.loc[groups == ATTENDEES, Lottery.PTCPNT_COL_NAME].tolist(), attendees)
+        self.assertEqual(participant_df.loc[groups == WAITLIST, Lottery.PTCPNT_COL_NAME].tolist(),
+                         self.lottery.get_waitlist())
+        self.assertTrue(participant_df[(Lottery.PRIORITY_COL_NAME, Lottery.SCORE_COL_NAME)].is_monotonic_increasing)
+        self.assertEqual(participant_df[Lottery.PTCPNT_COL_NAME].iloc[-1], 'P1')
+        self.assertIs(self.lottery.participant_df, participant_df)
+
+    def test_new_selection_resets_the_result(self):
+        participant_df = self.lottery.participant_df
+        self.lottery.select_attendees_and_waitlist(num_participants=4)
+        self.assertIsNot(self.lottery.participant_df, participant_df)
+        self.assertEqual(self.lottery.get_result().get_names(ATTENDEES), self.lottery.get_attendees())
+        self.assertEqual(len(self.lottery.get_attendees()), 4)
+
+    def test_waitlist_head(self):
+        self.assertEqual(self.lottery.get_waitlist(num_visible=5), self.lottery.get_waitlist()[:5])
+        self.assertEqual(self.lottery.get_waitlist(num_visible=0), [])
+
+
+class TestComputeFlags(unittest.TestCase):
+    def setUp(self):
+        nan = float('nan')
+        attendance_df = pd.DataFrame({
+            '2024-10-21 to 2024-10-27': [['Clinic-I'], nan, ['Clinic-AB', 'Clinic-I'], []],
+            '2024-10-14 to 2024-10-20': [['Clinic-B'], ['Clinic-I'], nan, nan],
+            '2024-10-07 to 2024-10-13': [nan, ['Clinic-AI'], ['Clinic-B'], ['Clinic-I']],
+        }, index=pd.Index(['Alice', 'Bob', 'Charlie', 'David']))
+        self.lottery = Lottery(event_type='Clinic-I', attendance_df=attendance_df, max_num_attendees=2)
+        self.lottery.priority_df = self.lottery.compute_priority()
+
+    def test_level_switch_and_multi_signup(self):
+        flags_df = self.lottery.compute_flags(all_participants=['Bob', 'Mary'])
+        self.assertEqual(flags_df['level_switch'].to_dict(), {'Alice': 'B', 'Bob': 'AI', 'Charlie': 'AB,B', 'David': ''})
+        self.assertEqual(flags_df['multi_signup'].to_dict(), {'Alice': False, 'Bob': True, 'Charlie': False, 'David': False})
+        self.assertEqual(flags_df.index.tolist(), self.lottery.priority_df.index.tolist())
+
+    def test_level_switch_recent_sessions_only(self):
+        flags_df = self.lottery.compute_flags(all_participants=[], num_recent_sessions=1)
+        self.assertEqual(flags_df['level_switch'].to_dict(), {'Alice': '', 'Bob': '', 'Charlie': 'AB', 'David': ''})
+
+    def test_multi_signup_from_registry(self):
+        registry = ParticipantRegistry()
+        registry.register('Clinic-B', entrants=['Bob', 'Mary', 'Bob'], winners=['Bob'])
+        registry.register('Clinic-AB', entrants=['Bob', 'David'], winners=['David'])
+        self.assertEqual(list(registry), ['Bob', 'Mary', 'David'])
+        self.assertEqual(registry.get_entered('Bob'), ['Clinic-B', 'Clinic-AB'])
+        self.assertNotIn('Alice', registry)
+
+        flags_df = self.lottery.compute_flags(all_participants=registry)
+        self.assertEqual(flags_df['multi_signup'].to_dict(), {'Alice': False, 'Bob': True, 'Charlie': False, 'David': True})
+        self.assertEqual(flags_df['multi_signup_from'].to_dict(),
+                         {'Alice': '', 'Bob': 'B(won),AB', 'Charlie': '', 'David': 'AB(won)'})
+
+    def test_report_merges_flags(self):
+        registry = ParticipantRegistry()
+        registry.register('Clinic-B', entrants=['Bob'], winners=['Bob'])
+        self.lottery.select_and_sort_attendees(exclude_from_lottery=[], all_participants=registry)
+        self.lottery.flags_df.loc['David', 'multi_signup'] = True
+
+        report_df = ClinicLottery.build_report(self.lottery)
+        self.assertEqual(report_df.columns[:3].tolist(), [
+            (Lottery.PTCPNT_COL_NAME, ''), (Lottery.FLAGS_COL_NAME, ''), (Lottery.PRIORITY_COL_NAME, Lottery.SCORE_COL_NAME)])
+        self.assertEqual(report_df.columns[3:].get_level_values(0).unique().tolist(), [Lottery.ATTENDANCE_COL_NAME])
+        flags = dict(zip(report_df[Lottery.PTCPNT_COL_NAME], report_df[(Lottery.FLAGS_COL_NAME, '')]))
+        self.assertEqual(flags, {'Alice': 'B', 'Bob': 'AI,multi:B(won)', 'Charlie': 'AB,B', 'David': 'multi'})
+        self.assertEqual(report_df.index.tolist(), [1, 2, 3, 4])
+
+    def test_merge_flags_without_multi_signup_from(self):
+        self.lottery.select_and_sort_attendees(exclude_from_lottery=[], all_participants=['Bob'])
+        self.lottery.participant_df = self.lottery.participant_df.drop(
+            columns=[(Lottery.FLAGS_COL_NAME, 'multi_signup_from')])
+        flags = ClinicLottery.merge_flags(self.lottery)
+        self.assertEqual(dict(zip(self.lottery.participant_df[Lottery.PTCPNT_COL_NAME], flags)),
+                         {'Alice': 'B', 'Bob': 'AI,multi', 'Charlie': 'AB,B', 'David': ''})
+
+
+class TestLotterySimulator(unittest.TestCase):
+    def test_win_probabilities(self):
+        simulator = LotterySimulator(['Alice', 'Bob', 'Charlie', 'David'], [0, 0.5, 3, 3], max_num_attendees=1)
+        result_df = simulator.simulate(num_trials=200000, seed=0)
+        probability = result_df[LotterySimulator.PROBABILITY_COL_NAME]
+        # P(u1 < 0.5 + u2) for independent uniform noise u1, u2
+        self.assertAlmostEqual(probability['Alice'], 0.875, delta=0.005)
+        self.assertAlmostEqual(probability.sum(), 1)
+        self.assertEqual(probability[['Charlie', 'David']].tolist(), [0, 0])
+        self.assertEqual(result_df[LotterySimulator.WAIT_COL_NAME]['David'], np.inf)
+        self.assertEqual(result_df.index.tolist()[:2], ['Alice', 'Bob'])
+
+    def test_from_lottery_applies_deprioritization(self):
+        attendance_df = pd.DataFrame({
+            'week 1': [['Clinic-I'], float('nan'), ['Clinic-I'], float('nan'), float('nan')],
+        }, index=pd.Index(['Alice', 'Bob', 'Charlie', 'David', 'Eve']))
+        lottery = Lottery(event_type='Clinic-I', attendance_df=attendance_df, max_num_attendees=3)
+        lottery.select_and_sort_attendees(exclude_from_lottery=['Bob'], all_participants=['David'])
+        simulator = LotterySimulator.from_lottery(lottery, exclude_from_lottery=['Bob'])
+        result_df = simulator.simulate(num_trials=1000, seed=0)
+        self.assertEqual(result_df[Lottery.SCORE_COL_NAME].to_dict(),
+                         {'Eve': 0, 'Alice': 1, 'Charlie': 1, 'David': 100, 'Bob': 200})
+        self.assertEqual(result_df[LotterySimulator.PROBABILITY_COL_NAME].to_dict(),
+                         {'Eve': 1, 'Alice': 1, 'Charlie': 1, 'David': 0, 'Bob': 0})
+
+
 class TestCompleteLottery(unittest.TestCase):
     def setUp(self) -> None:
         self.sesh_data = SeshData('test_data/test.csv')
@@ -383,6 +657,836 @@ class TestCompleteLottery(unittest.TestCase):
         self._test_using_old_records(event_date, event_type)
 
 
+class TestEventParticipationTracker(unittest.TestCase):
+    def setUp(self):
+        self.events_df = pd.DataFrame({
+            START_DATE: [datetime.date(2024, 10, 22), datetime.date(2024, 10, 21),
+                         datetime.date(2024, 10, 8), datetime.date(2024, 10, 1)],
+            EVENT_TYPE: ['Clinic-I', 'Clinic-AB', 'Clinic-I', 'Clinic-I'],
+            (RSVPER_NAMES, ATTENDEES): [['Alice', 'Bob'], ['Alice'], ['Bob'], ['Alice']],
+        })
+        self.dates = [datetime.date(2024, 10, 22), datetime.date(2024, 10, 15), datetime.date(2024, 10, 8)]
+
+    def test_bulk_and_per_week_history_match(self):
+        for bulk in (False, True):
+            tracker = EventParticipationTracker(self.events_df, bulk=bulk)
+            history_df = tracker.get_history(self.dates, ['Alice', 'Bob', 'Mary'])
+            self.assertEqual(history_df.columns.tolist(), [
+                '2024-10-21 to 2024-10-27', '2024-10-14 to 2024-10-20', '2024-10-07 to 2024-10-13'])
+            self.assertEqual(history_df.loc['Alice', '2024-10-21 to 2024-10-27'], ['Clinic-AB', 'Clinic-I'])
+            self.assertEqual(history_df.loc['Bob', '2024-10-07 to 2024-10-13'], ['Clinic-I'])
+            # a week without any event is still returned
+            self.assertTrue(history_df['2024-10-14 to 2024-10-20'].isna().all())
+            self.assertTrue(history_df.loc['Mary'].isna().all())
+
+    def test_cached_weeks_are_not_regenerated(self):
+        tracker = EventParticipationTracker(self.events_df)
+        tracker.get_history(self.dates[:1], ['Alice'])
+        tracker.get_history(self.dates, ['Alice'])
+        self.assertEqual(tracker.matrix.weeks.tolist(), [
+            '2024-10-21 to 2024-10-27', '2024-10-14 to 2024-10-20', '2024-10-07 to 2024-10-13'])
+
+
+class TestAttendanceMatrix(unittest.TestCase):
+    def setUp(self):
+        self.matrix = AttendanceMatrix.from_long(
+            participants=['Alice', 'Alice', 'Bob', 'Alice', 'Charlie'],
+            weeks=['week 2', 'week 2', 'week 1', 'week 1', 'week 2'],
+            event_types=['Clinic-I', 'Clinic-AB', 'Clinic-I', 'Clinic-I', 'Clinic-I'],
+            all_weeks=['week 2', 'week 1'])
+
+    def test_bitmask_codes(self):
+        self.assertEqual(self.matrix.event_types, ['Clinic-AB', 'Clinic-I'])
+        self.assertEqual(self.matrix.codes.dtype, np.uint16)
+        self.assertEqual(self.matrix.codes.tolist(), [[3, 2], [0, 2], [2, 0]])
+        self.assertEqual(self.matrix.union(1).tolist(), [3, 0, 2])
+
+    def test_frame_round_trip(self):
+        attendance_df = self.matrix.to_frame()
+        self.assertEqual(attendance_df.loc['Alice', 'week 2'], ['Clinic-AB', 'Clinic-I'])
+        self.assertTrue(pd.isna(attendance_df.loc['Bob', 'week 2']))
+        round_trip = AttendanceMatrix.from_frame(attendance_df)
+        self.assertEqual(round_trip.codes.tolist(), self.matrix.codes.tolist())
+
+    def test_select_unknown_labels(self):
+        selected = self.matrix.select(participants=['Bob', 'Mary'], weeks=['week 1', 'week 0'])
+        self.assertEqual(selected.participants.tolist(), ['Bob', 'Mary'])
+        self.assertEqual(selected.codes.tolist(), [[2, 0], [0, 0]])
+
+    def test_push_week_drops_oldest(self):
+        pushed = self.matrix.push_week('week 3', participants=['Bob', 'Mary'], event_types=['Clinic-AB', 'Clinic-I'])
+        self.assertEqual(pushed.weeks.tolist(), ['week 3', 'week 2'])
+        self.assertEqual(pushed.participants.tolist(), ['Alice', 'Bob', 'Charlie', 'Mary'])
+        self.assertEqual(pushed.codes.tolist(), [[0, 3], [1, 0], [0, 2], [2, 0]])
+        self.assertEqual(self.matrix.weeks.tolist(), ['week 2', 'week 1'])
+
+
+class TestLotteryReplay(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        csv_filename = os.path.join(self.test_dir.name, 'events.csv')
+        pd.DataFrame({
+            EVENT_NAME: ['Intermediate Clinic (3.25)'] * 3,
+            START_DATE: ['2024-10-22 18:00', '2024-10-29 18:00', '2024-11-05 18:00'],
+            RSVPER_NAMES: ['"Lottery: Alice,Bob,Charlie","Attendees: "'] * 3,
+            'rsvper_link': ['link'] * 3,
+            'edit_link': ['edit'] * 3,
+            'discord_link': ['discord'] * 3,
+            'channel': ['channel'] * 3,
+            'author': ['author'] * 3,
+        }).to_csv(csv_filename, index=False)
+        sesh_data = SeshData(csv_filename)
+        self.clinic_events = sesh_data.remove_canceled_event(sesh_data.get_clinic_events())
+        self.event_configs = {'Clinic-I': {'lottery': {'order': 1, 'max_attendee_count': 2},
+                                           'attendance_history': {'num_past_sessions': 1}}}
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_winners_feed_the_next_week(self):
+        replay = LotteryReplay(self.clinic_events, self.event_configs)
+        results_df = replay.run(datetime.date(2024, 10, 21), num_weeks=3, seed=0)
+        self.assertEqual(results_df[LotteryReplay.NUM_WINNERS].tolist(), [2, 2, 2])
+        # the loser of a week has the only clean history the week after, so one winner repeats every week
+        self.assertEqual(results_df[LotteryReplay.NUM_REPEAT_WINNERS].tolist(), [0, 1, 1])
+        self.assertEqual(replay.matrix.weeks.tolist(), ['2024-11-04 to 2024-11-10'])
+        self.assertEqual(sum(replay.wins.values()), 6)
+        self.assertEqual(replay.summarize(results_df)['repeat_winner_rate'], 2 / 6)
+
+    def test_excluded_participant_never_wins(self):
+        replay = LotteryReplay(self.clinic_events, self.event_configs, exclude_from_lottery=['Alice'])
+        replay.run(datetime.date(2024, 10, 21), num_weeks=3, seed=0)
+        self.assertEqual(replay.wins, collections.Counter({'Bob': 3, 'Charlie': 3}))
+
+
+class TestSeshDataChunkedIngest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.csv_filename = os.path.join(self.test_dir.name, 'events.csv')
+        pd.DataFrame({
+            EVENT_NAME: ['Intermediate Clinic (3.25)', 'Round Robin - 3.25 to 3.75', 'Beginner Clinic (2.0 to 2.5)',
+                         'Intermediate Clinic (3.25)', 'Advanced Beginner Clinic (2.75 to 3.0)'],
+            START_DATE: ['2024-10-29 18:00', '2024-10-22 18:00', '2024-10-21 18:00', '2024-09-10 18:00',
+                         '2024-11-05 18:00'],
+            RSVPER_NAMES: ['"Lottery: Alice,Bob"', '"Attendees: Alice"', '"Attendee: Bob"', '"Attendees: Mary"',
+                           '"Lottery: Mary"'],
+            'rsvper_link': ['link'] * 5,
+            'edit_link': ['edit'] * 5,
+            'discord_link': ['discord'] * 5,
+            'channel': ['channel'] * 5,
+            'author': ['author'] * 5,
+        }).to_csv(self.csv_filename, index=False)
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_window_and_type_filter_match_full_read(self):
+        start_date, end_date = datetime.date(2024, 10, 1), datetime.date(2024, 11, 1)
+        full_df = SeshData(self.csv_filename).df
+        expected_df = full_df[
+            (full_df[START_DATE] >= start_date) & (full_df[START_DATE] < end_date) &
+            full_df[EVENT_TYPE].str.contains('clinic', case=False)]
+        chunked_df = SeshData(self.csv_filename, start_date=start_date, end_date=end_date,
+                              event_type_pattern='clinic', chunksize=2).df
+        pd.testing.assert_frame_equal(chunked_df.reset_index(drop=True), expected_df.reset_index(drop=True))
+        self.assertEqual(chunked_df[RSVPER_NAMES].tolist(), [{'Lottery': ['Alice', 'Bob']}, {ATTENDEES: ['Bob']}])
+        self.assertNotIn('author', chunked_df.columns)
+
+    def test_snapshot_cache_round_trip(self):
+        cache = SeshSnapshotCache(os.path.join(self.test_dir.name, 'cache'))
+        expected_df = SeshData(self.csv_filename).df
+        cold_df = SeshData(self.csv_filename, cache=cache).df
+        self.assertEqual(len(os.listdir(cache.cache_dir)), 1)
+        warm_df = SeshData(self.csv_filename, cache=cache).df
+        pd.testing.assert_frame_equal(cold_df, expected_df)
+        pd.testing.assert_frame_equal(warm_df, expected_df)
+
+        # a different window is a different snapshot
+        SeshData(self.csv_filename, start_date=datetime.date(2024, 10, 1), cache=cache)
+        self.assertEqual(len(os.listdir(cache.cache_dir)), 2)
+
+
+class TestBatchLottery(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        csv_filename = os.path.join(self.test_dir.name, 'events.csv')
+        pd.DataFrame({
+            EVENT_NAME: ['Intermediate Clinic (3.25)'] * 3,
+            START_DATE: ['2024-10-22 18:00', '2024-10-29 18:00', '2024-11-05 18:00'],
+            RSVPER_NAMES: ['"Lottery: ","Attendees: Alice,Bob"',
+                           '"Lottery: Alice,Bob,Mary","Attendees: "',
+                           '"Lottery: Bob,Mary","Attendees: "'],
+            'rsvper_link': ['https://sesh.fyi/dashboard/1/events/edit/10',
+                            'https://sesh.fyi/dashboard/1/events/edit/11',
+                            'https://sesh.fyi/dashboard/1/events/edit/12'],
+            'edit_link': ['edit'] * 3,
+            'discord_link': ['discord'] * 3,
+            'channel': ['channel'] * 3,
+            'author': ['author'] * 3,
+        }).to_csv(csv_filename, index=False)
+        self.config = {
+            'csv_filename': csv_filename,
+            'output_dir': self.test_dir.name,
+            'start_date': datetime.date(2024, 10, 28),
+            'recurring_interval_in_days': datetime.timedelta(7),
+            'exclude_from_lottery': [],
+            'events': {'Clinic-I': {'lottery': {'order': 1, 'max_attendee_count': 2},
+                                    'attendance_history': {'num_past_sessions': 2}}},
+        }
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_windows_are_reported_in_order(self):
+        results = run_batch([self.config], weeks=3, max_workers=2)
+        self.assertEqual([result['start_date'] for result in results], ['2024-10-28', '2024-11-04', '2024-11-11'])
+
+        # Alice and Bob attended the week before, so Mary wins the first window
+        event = results[0]['events'][0]
+        self.assertEqual((event['event_date'], event['event_id']), ('2024-10-29', '11'))
+        self.assertIn('Mary', event[ATTENDEES])
+        self.assertEqual(len(event[ATTENDEES]), 2)
+        self.assertEqual(len(event[WAITLIST]), 1)
+
+        self.assertEqual(results[1]['events'][0]['event_id'], '12')
+        # no events in the last window
+        self.assertEqual(results[2]['events'], [])
+        self.assertNotIn('error', results[2])
+
+    def test_seeded_batch_does_not_depend_on_workers(self):
+        in_process = run_batch([self.config], weeks=2, max_workers=1, seed=7)
+        in_pool = run_batch([self.config], weeks=2, max_workers=2, seed=7)
+        self.assertEqual(in_process, in_pool)
+        self.assertEqual(in_process[0]['events'][0]['seed'], 'seed=7 spawn_key=[0, 0]')
+
+
+class TestAttendanceHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.db_filename = os.path.join(self.test_dir.name, 'history.sqlite')
+        self.events_df = pd.DataFrame({
+            START_DATE: [datetime.date(2024, 10, 29), datetime.date(2024, 10, 22),
+                         datetime.date(2024, 10, 21), datetime.date(2024, 10, 16), datetime.date(2024, 10, 15)],
+            EVENT_TYPE: ['Clinic-I', 'Clinic-I', 'Clinic-AB', 'Clinic-AI', 'Clinic-I'],
+            (RSVPER_NAMES, ATTENDEES): [['Alice'], ['Alice', 'Bob'], ['Alice'], float('nan'), ['Bob']],
+        })
+        self.dates = [datetime.date(2024, 10, 22), datetime.date(2024, 10, 15)]
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_history_matches_in_memory_tracker(self):
+        store = AttendanceHistoryStore(self.db_filename)
+        tracker = EventParticipationTracker(self.events_df, store=store, ingest_until=datetime.date(2024, 10, 28))
+        history_df = tracker.get_history(self.dates, ['Alice', 'Bob', 'Mary'])
+        expected_df = EventParticipationTracker(self.events_df).get_history(self.dates, ['Alice', 'Bob', 'Mary'])
+        self.assertEqual(history_df.columns.tolist(), ['2024-10-21 to 2024-10-27', '2024-10-14 to 2024-10-20'])
+        self.assertEqual(history_df.loc['Alice', '2024-10-21 to 2024-10-27'], ['Clinic-AB', 'Clinic-I'])
+        self.assertEqual(history_df.loc['Bob', '2024-10-21 to 2024-10-27'], ['Clinic-I'])
+        self.assertTrue(history_df.loc['Mary'].isna().all())
+        pd.testing.assert_frame_equal(
+            history_df.astype(str), expected_df.reindex(history_df.index).astype(str), check_names=False)
+        store.close()
+
+    def test_ingest_only_events_after_high_water_mark(self):
+        store = AttendanceHistoryStore(self.db_filename, reingest_days=0)
+        self.assertEqual(store.ingest(self.events_df, until=datetime.date(2024, 10, 22)), 2)
+        self.assertEqual(store.high_water_mark, datetime.date(2024, 10, 21))
+        self.assertEqual(store.ingest(self.events_df, until=datetime.date(2024, 10, 22)), 0)
+        store.close()
+
+        store = AttendanceHistoryStore(self.db_filename, reingest_days=0)
+        self.assertEqual(store.ingest(self.events_df), 3)
+        self.assertEqual(store.high_water_mark, datetime.date(2024, 10, 29))
+        store.close()
+
+    def test_high_water_mark_stops_at_the_newest_ingested_event(self):
+        store = AttendanceHistoryStore(self.db_filename, reingest_days=0)
+        self.assertEqual(store.ingest(self.events_df.iloc[3:], until=datetime.date(2024, 10, 28)), 1)
+        self.assertEqual(store.high_water_mark, datetime.date(2024, 10, 16))
+        # the events of the 21st and 22nd only show up in the next export, before until
+        self.assertEqual(store.ingest(self.events_df, until=datetime.date(2024, 10, 28)), 3)
+        self.assertEqual(store.high_water_mark, datetime.date(2024, 10, 22))
+        store.close()
+
+    def test_events_entered_late_are_reingested(self):
+        store = AttendanceHistoryStore(self.db_filename)
+        store.ingest(self.events_df, until=datetime.date(2024, 10, 28))
+        self.assertEqual(store.high_water_mark, datetime.date(2024, 10, 22))
+
+        # a second clinic on the day of the mark shows up, and Bob replaces Alice in the clinic of the 21st
+        late_events_df = pd.DataFrame({
+            START_DATE: self.events_df[START_DATE].tolist() + [datetime.date(2024, 10, 22)],
+            EVENT_TYPE: self.events_df[EVENT_TYPE].tolist() + ['Clinic-B'],
+            (RSVPER_NAMES, ATTENDEES): [['Alice'], ['Alice', 'Bob'], ['Bob'], float('nan'), ['Bob'], ['Mary']],
+        })
+        self.assertEqual(store.ingest(late_events_df, until=datetime.date(2024, 10, 28)), 5)
+        history_df = store.get_history_matrix(self.dates, ['Alice', 'Bob', 'Mary']).to_frame()
+        week = '2024-10-21 to 2024-10-27'
+        self.assertEqual(history_df.loc['Alice', week], ['Clinic-I'])
+        self.assertEqual(history_df.loc['Bob', week], ['Clinic-AB', 'Clinic-I'])
+        self.assertEqual(history_df.loc['Mary', week], ['Clinic-B'])
+        self.assertEqual(history_df.loc['Bob', '2024-10-14 to 2024-10-20'], ['Clinic-I'])
+        store.close()
+
+
+class FakeSpreadsheet:
+    """
+    In-memory stand-in for a gspread Spreadsheet, counting the requests sent to the Sheets API.
+    """
+    def __init__(self, title, sheet_titles=('Sheet1',)):
+        self.id = f'{title}-id'
+        self.title = title
+        self.sheets = {
+            sheet_title: {'properties': {'sheetId': i, 'title': sheet_title,
+                                         'gridProperties': {'rowCount': 1000, 'columnCount': 26}},
+                          'values': []}
+            for i, sheet_title in enumerate(sheet_titles)
+        }
+        self.request_counts = collections.Counter()
+
+    def fetch_sheet_metadata(self, params=None):
+        self.request_counts['fetch_sheet_metadata'] += 1
+        return {'sheets': [{'properties': copy.deepcopy(sheet['properties'])} for sheet in self.sheets.values()]}
+
+    def get_sheet(self, sheet_id):
+        return next(sheet for sheet in self.sheets.values() if sheet['properties']['sheetId'] == sheet_id)
+
+    def batch_update(self, body):
+        self.request_counts['batch_update'] += 1
+        for request in body['requests']:
+            if 'addSheet' in request:
+                properties = copy.deepcopy(request['addSheet']['properties'])
+                self.sheets[properties['title']] = {'properties': properties, 'values': []}
+            elif 'updateSheetProperties' in request:
+                properties = request['updateSheetProperties']['properties']
+                self.get_sheet(properties['sheetId'])['properties']['gridProperties'].update(
+                    properties['gridProperties'])
+            elif 'updateCells' in request:
+                self.get_sheet(request['updateCells']['range']['sheetId'])['values'] = []
+
+    def values_batch_update(self, params=None, body=None):
+        self.request_counts['values_batch_update'] += 1
+        for value_range in body['data']:
+            # tables are always written from the top left cell
+            sheet_title, cell = value_range['range'].rsplit('!', 1)
+            assert cell == 'A1'
+            self.sheets[sheet_title.strip("'").replace("''", "'")]['values'] = value_range['values']
+
+
+class FakeSheetsClient:
+    def __init__(self, spreadsheets):
+        self.spreadsheets = {spreadsheet.title: spreadsheet for spreadsheet in spreadsheets}
+        self.request_counts = collections.Counter()
+
+    def open(self, title):
+        self.request_counts['open'] += 1
+        return self.spreadsheets[title]
+
+
+class FakeDriveService:
+    """
+    In-memory stand-in for the Drive v3 service, supporting files().get() and files().update().
+    """
+    def __init__(self):
+        self.request_counts = collections.Counter()
+        self.parents = {}
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields):
+        self.request_counts['get'] += 1
+        return FakeDriveRequest({'parents': self.parents.get(fileId, ['root'])})
+
+    def update(self, fileId, addParents, removeParents, fields):
+        self.request_counts['update'] += 1
+        self.parents[fileId] = [addParents]
+        return FakeDriveRequest({'id': fileId, 'parents': [addParents]})
+
+
+class FakeDriveRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class TestSheetsSession(unittest.TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet('Clinics_2024-10-28', sheet_titles=('Sheet1', 'Clinic-I_2024-10-29'))
+        self.spreadsheet.sheets['Clinic-I_2024-10-29']['values'] = [['stale']] * 40
+        self.client = FakeSheetsClient([self.spreadsheet])
+        self.drive_service = FakeDriveService()
+        self.tables = {
+            f'{event_type}_2024-10-29': pd.DataFrame({
+                ('Participant', ''): ['Alice', 'Bob'],
+                ('Priority', 'score'): [np.float64(1.5), np.float64(0.25)],
+                ('Attendance', '2024-10-21 to 2024-10-27'): [['Clinic-I'], np.nan],
+            })
+            for event_type in ['Clinic-B', 'Clinic-AB', 'Clinic-I', 'Clinic-AI']
+        }
+
+    def test_single_batch_per_run(self):
+        session = SheetsSession('Clinics_2024-10-28', folder_id='folder',
+                                client=self.client, drive_service=self.drive_service)
+        for worksheet_title, df in self.tables.items():
+            session.add_table(df, worksheet_title)
+        session.commit()
+
+        self.assertEqual(self.client.request_counts, {'open': 1})
+        self.assertEqual(self.spreadsheet.request_counts,
+                         {'fetch_sheet_metadata': 1, 'batch_update': 1, 'values_batch_update': 1})
+        self.assertEqual(self.drive_service.request_counts, {'get': 1, 'update': 1})
+        self.assertEqual(self.drive_service.parents, {'Clinics_2024-10-28-id': ['folder']})
+
+        self.assertEqual(list(self.spreadsheet.sheets), ['Sheet1', 'Clinic-I_2024-10-29', 'Clinic-B_2024-10-29',
+                                                         'Clinic-AB_2024-10-29', 'Clinic-AI_2024-10-29'])
+        self.assertEqual(self.spreadsheet.sheets['Clinic-I_2024-10-29']['values'], [
+            ['Participant', 'Priority', 'Attendance'],
+            ['', 'score', '2024-10-21 to 2024-10-27'],
+            ['Alice', 1.5, "['Clinic-I']"],
+            ['Bob', 0.25, ''],
+        ])
+        sheet_ids = [sheet['properties']['sheetId'] for sheet in self.spreadsheet.sheets.values()]
+        self.assertEqual(len(set(sheet_ids)), len(sheet_ids))
+
+    def test_notes_below_table(self):
+        session = SheetsSession('Clinics_2024-10-28', folder_id=None, client=self.client)
+        session.add_table(self.tables['Clinic-I_2024-10-29'], 'Clinic-I_2024-10-29', notes=[['Seed', 'seed=7']])
+        session.commit()
+        self.assertEqual(self.spreadsheet.sheets['Clinic-I_2024-10-29']['values'][-2:], [[''], ['Seed', 'seed=7']])
+
+    def test_nothing_staged(self):
+        session = SheetsSession('Clinics_2024-10-28', client=self.client, drive_service=self.drive_service)
+        session.commit()
+        self.assertEqual(self.client.request_counts, {})
+        self.assertEqual(self.spreadsheet.request_counts, {})
+        self.assertEqual(self.drive_service.request_counts, {})
+
+
+class TestPublisher(unittest.TestCase):
+    def test_sinks_run_concurrently_in_order(self):
+        sinks = ['sheets', 'dashboard_yaml', 'whosin']
+        written = collections.defaultdict(list)
+        # the first task of every sink only gets past the barrier once the three of them run at the same time,
+        # otherwise the barrier breaks and the publisher raises a PublishError
+        barrier = threading.Barrier(len(sinks), timeout=5)
+
+        def write(sink, item):
+            if item == 0:
+                barrier.wait()
+            written[sink].append(item)
+
+        with Publisher(max_concurrency=3) as publisher:
+            for item in range(3):
+                for sink in sinks:
+                    publisher.submit(sink, write, sink, item)
+
+        self.assertEqual(dict(written), {sink: [0, 1, 2] for sink in sinks})
+
+    def test_errors_are_raised_after_draining(self):
+        written = []
+
+        def fail():
+            raise ValueError('quota exceeded')
+
+        publisher = Publisher()
+        publisher.submit('sheets', fail)
+        publisher.submit('sheets', written.append, 'skipped')
+        publisher.submit('dashboard_yaml', written.append, 'written')
+        with self.assertRaises(PublishError) as context:
+            publisher.join()
+        self.assertEqual(written, ['written'])
+        self.assertEqual([sink for sink, _ in context.exception.errors], ['sheets'])
+        self.assertIsInstance(context.exception.errors[0][1], ValueError)
+
+
+class TestDriverPool(unittest.TestCase):
+    class FakeDriver:
+        def __init__(self, **options):
+            self.options = options
+            self.quit_count = 0
+
+        def quit(self):
+            self.quit_count += 1
+
+    def test_one_driver_is_launched_and_reused(self):
+        timer = PhaseTimer()
+        with DriverPool(size=1, timer=timer, driver_factory=self.FakeDriver, headless=True,
+                        attach_to_debugger=False) as pool:
+            with pool.driver() as first:
+                pass
+            with pool.driver() as second:
+                pass
+            self.assertIs(first, second)
+            self.assertEqual(first.options, {'headless': True, 'attach_to_debugger': False})
+        self.assertEqual(first.quit_count, 1)
+        self.assertEqual(pool.drivers, [])
+        self.assertEqual(timer.summary()['launch']['count'], 1)
+
+    def test_pool_launches_up_to_size(self):
+        pool = DriverPool(size=2, driver_factory=self.FakeDriver, attach_to_debugger=False)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNot(first, second)
+        pool.release(second)
+        self.assertIs(pool.acquire(), second)
+        pool.close()
+        self.assertEqual([first.quit_count, second.quit_count], [1, 1])
+
+    def test_attached_drivers_are_not_quit(self):
+        with DriverPool(size=1, driver_factory=self.FakeDriver) as pool:
+            with pool.driver() as driver:
+                pass
+        self.assertEqual(driver.quit_count, 0)
+        self.assertEqual(pool.drivers, [])
+
+    def test_phase_timer(self):
+        timer = PhaseTimer()
+        for _ in range(2):
+            with timer.phase('navigate'):
+                pass
+        timer.add('submit', 1.5)
+        summary = timer.summary()
+        self.assertEqual(list(summary), ['navigate', 'submit'])
+        self.assertEqual(summary['navigate']['count'], 2)
+        self.assertEqual(summary['submit']['mean'], 1.5)
+        self.assertIn('submit', timer.report())
+
+    def test_wait_savings(self):
+        timer = PhaseTimer()
+        with timer.wait('event 1', replaced_sleep=2):
+            pass
+        timer.add_wait('event 1', 0.5, replaced_sleep=1)
+        savings = timer.savings()['event 1']
+        self.assertEqual(savings['replaced'], 3)
+        self.assertAlmostEqual(savings['saved'], 3 - savings['waited'])
+        self.assertIn('event 1', timer.report())
+
+
+class TestDashboardWaits(unittest.TestCase):
+    class FakePage:
+        def __init__(self, states=(), elements=None):
+            self.states = list(states)
+            self.elements = elements or {}
+
+        def execute_script(self, script):
+            return self.states.pop(0) if len(self.states) > 1 else self.states[0]
+
+        def find_elements(self, by, selector):
+            return self.elements.get(selector, [])
+
+    def test_page_ready_once_network_is_idle(self):
+        page = self.FakePage(states=[['loading', 1], ['complete', 4], ['complete', 6], ['complete', 6]])
+        start_time = time.perf_counter()
+        wait_for_page_ready(page, timeout=2, idle_time=0.05, poll_frequency=0.01)
+        self.assertLess(time.perf_counter() - start_time, 1)
+        self.assertEqual(page.states, [['complete', 6]])
+
+    def test_page_ready_times_out(self):
+        page = self.FakePage(states=[['loading', 0]])
+        with self.assertRaises(TimeoutException):
+            wait_for_page_ready(page, timeout=0.1, poll_frequency=0.01)
+
+    def test_dropdown_options(self):
+        options = ['Alice', 'Alice B']
+        page = self.FakePage(elements={'div.sesh-dropdown__option': options})
+        self.assertEqual(wait_for_dropdown_options(page, timeout=1), options)
+        page = self.FakePage(elements={'.sesh-dropdown__menu-notice--no-options': ['No options']})
+        self.assertEqual(wait_for_dropdown_options(page, timeout=1), [])
+        page = self.FakePage(elements={'.sesh-dropdown__menu-notice--loading': ['Loading...']})
+        with self.assertRaises(TimeoutException):
+            wait_for_dropdown_options(page, timeout=0.2)
+
+
+class TestDashboardSync(unittest.TestCase):
+    class FakeDriver:
+        def __init__(self, lists):
+            self.lists = lists
+            self.urls = []
+            self.num_reads = 0
+
+        def get(self, url):
+            self.urls.append(url)
+
+        def execute_script(self, script, *args):
+            if not args:
+                return ['complete', 0]
+            self.num_reads += 1
+            return {name: self.lists[name] for name in args[0] if name in self.lists}
+
+    class RecordingEvent(SeshDashboardEvent):
+        def add_attendees_to_event(self, event_id, attendees, list_name='Attendee', debug=True):
+            self.adds.append((list_name, attendees))
+            return attendees
+
+    class FakeModal:
+        """Add Users modal whose search dropdown lists the users of directory containing the typed text."""
+        class Element:
+            def __init__(self, text='', on_click=None):
+                self.text = text
+                self.value = ''
+                self.on_click = on_click
+
+            def is_displayed(self):
+                return True
+
+            def is_enabled(self):
+                return True
+
+            def clear(self):
+                self.value = ''
+
+            def send_keys(self, text):
+                self.value += text
+
+            def get_attribute(self, name):
+                return self.value
+
+            def click(self):
+                self.on_click(self.text)
+
+        def __init__(self, directory):
+            self.directory = directory
+            self.input_box = self.Element()
+            self.chips = []
+
+        def select(self, user):
+            self.chips.append(self.Element(user))
+            self.input_box.clear()
+
+        def execute_script(self, script, *args):
+            pass
+
+        def find_element(self, by, selector):
+            return self.input_box
+
+        def find_elements(self, by, selector):
+            matches = [user for user in self.directory if self.input_box.value and self.input_box.value in user]
+            if selector == 'div.sesh-dropdown__option':
+                return [self.Element(user, on_click=self.select) for user in matches]
+            if selector == '.sesh-dropdown__menu-notice--no-options':
+                return [] if matches else [self.Element('No options')]
+            if selector == '.sesh-dropdown__multi-value__label':
+                return self.chips
+            return []
+
+    class PromptlessEvent(SeshDashboardEvent):
+        """Event whose driver is a FakeModal, failing if it prompts."""
+        def open_add_user_modal(self, modal_name, retries=2):
+            return self.driver
+
+        def submit_and_close_modal(self):
+            pass
+
+        def prompt_to_select_multiple_options(self, option_texts):
+            raise AssertionError(f'prompted to choose between {option_texts}')
+
+    def test_missing_users(self):
+        self.assertEqual(
+            SeshDashboardEvent.get_missing_users(['Alice', 'bob  smith', 'Carol', 'Carol'], ['Bob Smith', 'Dave']),
+            ['Alice', 'Carol'])
+
+    def test_only_missing_users_are_added(self):
+        driver = self.FakeDriver({'Lottery': ['Alice', 'Bob', 'Carol'], 'Attendee': ['Alice']})
+        sesh_event = self.RecordingEvent(server_id='1', driver=driver)
+        sesh_event.adds = []
+        added = sesh_event.sync_event('42', {'Lottery': ['Alice', 'Bob', 'Carol'], 'Attendee': ['Alice', 'Bob']},
+                                      debug=False)
+        self.assertEqual(added, {'Lottery': [], 'Attendee': ['Bob']})
+        self.assertEqual(sesh_event.adds, [('Attendee', ['Bob'])])
+        self.assertEqual(driver.num_reads, 1)
+        self.assertEqual(driver.urls, ['https://sesh.fyi/dashboard/1/events/attendees/42'])
+
+    def test_ambiguous_users_are_skipped_when_not_interactive(self):
+        modal = self.FakeModal(['Alice', 'Alice B', 'Bob'])
+        sesh_event = self.PromptlessEvent(server_id='1', driver=modal, interactive=False)
+        self.assertEqual(sesh_event.add_users_from_modal('Lottery', ['Alice B', 'Al', 'Bob', 'Carol']),
+                         ['Al', 'Carol'])
+        self.assertEqual([chip.text for chip in modal.chips], ['Alice B', 'Bob'])
+        self.assertEqual(sesh_event.skipped, {'Lottery': ['Al', 'Carol']})
+
+    def test_list_not_found_is_an_error(self):
+        sesh_event = self.RecordingEvent(server_id='1', driver=self.FakeDriver({'Lottery': ['Alice']}))
+        sesh_event.adds = []
+        with self.assertRaises(NoSuchElementException):
+            sesh_event.sync_event('42', {'Lottery': ['Alice'], 'Attendee': ['Alice']}, debug=False)
+        self.assertEqual(sesh_event.adds, [])
+
+
+CHROME_AVAILABLE = any(
+    shutil.which(binary) for binary in ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser'])
+
+
+class TestParallelUploader(unittest.TestCase):
+    EVENTS = [
+        {'server_id': '1', 'event_id': str(event_id), 'add_to_lottery': ['Alice', 'Bob', 'Carol'],
+         'add_to_attendee': ['Alice', 'Bob']}
+        for event_id in range(40, 45)
+    ]
+
+    class ListedDriver(TestDashboardSync.FakeDriver):
+        """Event page on which every user is already listed, except on event 43 which fails to load."""
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def __init__(self, **options):
+            super().__init__({'Lottery': ['Alice', 'Bob', 'Carol'], 'Attendee': ['Alice', 'Bob']})
+            self.options = options
+
+        def get(self, url):
+            if url.endswith('/43'):
+                raise TimeoutException('page did not load')
+            with self.lock:
+                type(self).active += 1
+                type(self).max_active = max(type(self).max_active, type(self).active)
+            time.sleep(0.05)
+            with self.lock:
+                type(self).active -= 1
+            super().get(url)
+
+        def quit(self):
+            pass
+
+    def test_workers_share_the_events(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            uploader = ParallelUploader(
+                num_workers=3,
+                rate_controller=RateController(max_concurrency=2),
+                sync=True,
+                profile_path=os.path.join(temp_dir, 'profile'),
+                log_dir=os.path.join(temp_dir, 'logs'),
+                driver_factory=self.ListedDriver
+            )
+            results = uploader.run(self.EVENTS)
+            log_filenames = sorted(os.listdir(os.path.join(temp_dir, 'logs')))
+            self.assertEqual(len(log_filenames), 3)
+            log = ''
+            for log_filename in log_filenames:
+                with open(os.path.join(temp_dir, 'logs', log_filename)) as f:
+                    log += f.read()
+
+        self.assertIn('Lottery list of event 40: 3 of 3 users already added', log)
+        for worker in range(1, 4):
+            self.assertEqual(logging.getLogger(f'sesh_dashboard.parallel_upload.worker-{worker}').handlers, [])
+
+        self.assertEqual([result['event_id'] for result in results], ['40', '41', '42', '43', '44'])
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'ok', 'failed', 'ok'])
+        self.assertEqual(results[0]['added'], {'Lottery': [], 'Attendee': []})
+        self.assertLessEqual(self.ListedDriver.max_active, 2)
+        self.assertIn('4 of 5 events uploaded, 1 failed', uploader.report(results))
+
+    def test_stub_server(self):
+        with StubSeshServer(directory=['Alice', 'Bob'], lists={'42': {'Lottery': ['Alice']}}) as server:
+            with urllib.request.urlopen(f'{server.dashboard_url}/1/events/attendees/42') as response:
+                page = response.read().decode()
+            self.assertIn('"Lottery": ["Alice"]', page)
+            self.assertIn('sesh-dropdown__input', page)
+            request = urllib.request.Request(
+                f'{server.dashboard_url}/1/events/attendees/42/add',
+                data=json.dumps({'list_name': 'Attendee', 'users': ['Bob', 'Bob']}).encode(),
+                headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request) as response:
+                self.assertEqual(json.load(response)['lists'], {'Attendee': ['Bob'], 'Lottery': ['Alice']})
+
+    @unittest.skipUnless(CHROME_AVAILABLE, 'Chrome is not installed')
+    def test_headless_upload_against_stub_page(self):
+        with StubSeshServer(directory=['Alice', 'Alice B', 'Bob', 'Carol']) as server, \
+                tempfile.TemporaryDirectory() as temp_dir:
+            uploader = ParallelUploader(
+                num_workers=2,
+                profile_path=os.path.join(temp_dir, 'profile'),
+                dashboard_url=server.dashboard_url
+            )
+            results = uploader.run(self.EVENTS[:3])
+            self.assertEqual([result['status'] for result in results], ['ok'] * 3, uploader.report(results))
+            for event in self.EVENTS[:3]:
+                self.assertEqual(server.get_lists(event['event_id']),
+                                 {'Lottery': ['Alice', 'Bob', 'Carol'], 'Attendee': ['Alice', 'Bob']})
+
+            # a synced re-run finds everyone on the lists and submits nothing
+            num_adds = server.num_adds
+            uploader.sync = True
+            results = uploader.run(self.EVENTS[:3])
+            self.assertEqual([result['added'] for result in results], [{'Lottery': [], 'Attendee': []}] * 3)
+            self.assertEqual(server.num_adds, num_adds)
+
+
+class TestRateController(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        controller = RateController(batch_size=4, max_batch_size=6, rng=random.Random(0))
+        self.assertEqual([len(batch) for batch in controller.batches(list(range(20)))], [4, 4, 4, 4, 4])
+        for batch_size in [4, 5, 6]:
+            controller.on_success(batch_size)
+        self.assertEqual(controller.get_batch_size(), 6)
+        self.assertEqual(controller.safe_batch_size, 6)
+
+        backoffs = [controller.on_rate_limited() for _ in range(3)]
+        self.assertEqual(controller.get_batch_size(), 1)
+        self.assertEqual(controller.safe_batch_size, 1)
+        for backoff, ceiling in zip(backoffs, [5, 10, 20]):
+            self.assertGreaterEqual(backoff, ceiling / 2)
+            self.assertLessEqual(backoff, ceiling)
+
+        controller.on_success(1)
+        self.assertEqual(controller.num_throttles, 0)
+        self.assertEqual(controller.get_batch_size(), 2)
+
+    def test_short_batches_are_credited_by_their_size(self):
+        controller = RateController(batch_size=8, rng=random.Random(0))
+        controller.on_rate_limited()
+        controller.on_success(4)
+        self.assertEqual((controller.get_batch_size(), controller.safe_batch_size), (5, 4))
+        controller.on_success(2)
+        self.assertEqual((controller.get_batch_size(), controller.safe_batch_size), (5, 4))
+
+    def test_batches_follow_the_batch_size(self):
+        controller = RateController(batch_size=2)
+        sizes = []
+        for batch in controller.batches(list(range(12))):
+            sizes.append(len(batch))
+            controller.on_success(len(batch))
+        self.assertEqual(sizes, [2, 3, 4, 3])
+
+    def test_slots_follow_the_concurrency(self):
+        controller = RateController(max_concurrency=4, rng=random.Random(0))
+        controller.on_rate_limited()
+        self.assertEqual(controller.concurrency, 2)
+        active, max_active = [0], [0]
+        lock = threading.Lock()
+
+        def upload():
+            with controller.slot():
+                with lock:
+                    active[0] += 1
+                    max_active[0] = max(max_active[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=upload) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max_active[0], 2)
+        controller.on_success(controller.get_batch_size())
+        self.assertEqual(controller.concurrency, 3)
+
+    def test_safe_batch_size_is_persisted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_filename = os.path.join(temp_dir, 'rate', 'state.json')
+            self.assertEqual(RateController.load(state_filename).get_batch_size(), 5)
+            controller = RateController.load(state_filename, batch_size=8)
+            controller.on_success(8)
+            controller.on_rate_limited()
+            controller.on_success(4)
+            controller.save()
+            self.assertEqual(RateController.load(state_filename).get_batch_size(), 4)
+
+
 class TestGenerateUniqueFilename(unittest.TestCase):
     def setUp(self):
         """